@@ -0,0 +1,294 @@
+import json
+import os
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import WatercareConstants as WC
+import StageMetrics as SM
+
+
+INDEX_DIR = 'Cache/Address'
+KEYS_FILE = 'keys.parquet'
+VOCABULARY_FILE = 'vocabulary.parquet'
+META_FILE = 'meta.json'
+
+#Address fields of the index (columns of the work orders and of the assets)
+FIELDS = [WC.STR_TYPE, WC.STR_NAME, WC.SUBURB]
+
+#Tokens replaced by the normalisation (whole words) per field
+STREET_TYPES = {'ROAD': 'RD', 'STREET': 'ST', 'AVENUE': 'AVE', 'AV': 'AVE', 'DRIVE': 'DR', 'PLACE': 'PL',
+                'CRESCENT': 'CRES', 'CR': 'CRES', 'TERRACE': 'TCE', 'COURT': 'CT', 'CLOSE': 'CL', 'GROVE': 'GR',
+                'HIGHWAY': 'HWY', 'PARADE': 'PDE', 'SQUARE': 'SQ', 'BOULEVARD': 'BLVD', 'LN': 'LANE'}
+SUBURB_TOKENS = {'MT': 'MOUNT', 'PT': 'POINT', 'STH': 'SOUTH', 'NTH': 'NORTH'}
+TOKENS = {WC.STR_TYPE: STREET_TYPES, WC.STR_NAME: {}, WC.SUBURB: SUBURB_TOKENS}
+
+#Quality of the match of an address field, from best to worst (Missing: the field is empty in the failure or the asset)
+EXACT, FUZZY, MISSING, MISMATCH = 'Exact', 'Fuzzy', 'Missing', 'Mismatch'
+MATCH_QUALITY = pd.CategoricalDtype([EXACT, FUZZY, MISSING, MISMATCH], ordered=True)
+ADDRESS_MATCH = 'Address match'
+
+#Max edit distance of a fuzzy match, and characters of the shorter value per allowed edit (codes of 2 or 3 letters,
+#e.g. ST and RD, only match exactly)
+MAX_DISTANCE = 2
+CHARS_PER_EDIT = 4
+
+
+class AddressIndex(NamedTuple):
+    """
+        Normalised address of the assets as integer codes per field (-1 is missing), keyed by COMPKEY. The code of a
+        field is the position of the normalised value in its vocabulary.
+    """
+    keys: pd.DataFrame
+    vocabulary: dict[str, pd.Index]
+
+
+def normalise(values:pd.Series, field:str)->tuple[np.ndarray, np.ndarray]:
+    """
+        Normalises an address field (upper case, only letters and digits, single spaces and the tokens of the field
+        replaced). The string work is done once per unique value.
+    Args:
+        values (pd.Series): Values of the field.
+        field (str): Field (FIELDS).
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Position of each value in the normalised uniques (-1 is missing) and the
+        normalised uniques (empty values are NaN).
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    uniques = pd.Series(np.asarray(uniques, dtype='object'), dtype='str')
+
+    uniques = uniques.str.upper().str.replace(r'[^A-Z0-9]+', ' ', regex=True).str.strip()
+    for token, replacement in TOKENS[field].items():
+        uniques = uniques.str.replace(r'\b' + token + r'\b', replacement, regex=True)
+
+    return codes, uniques.replace('', np.nan).to_numpy(dtype='object')
+
+def encode(values:pd.Series, field:str, vocabulary:pd.Index)->tuple[np.ndarray, pd.Index]:
+    """
+        Codes of the normalised values of a field in a vocabulary. Values that are not in the vocabulary are added at
+        its end.
+    Args:
+        values (pd.Series): Values of the field.
+        field (str): Field (FIELDS).
+        vocabulary (pd.Index): Normalised values of the field.
+    Returns:
+        tuple[np.ndarray, pd.Index]: Code of each value (-1 is missing) and the vocabulary with the new values.
+    """
+    codes, uniques = normalise(values, field)
+
+    known = pd.notna(uniques)
+    new = pd.Index(uniques[known]).difference(vocabulary)
+    vocabulary = vocabulary.append(new) if new.size else vocabulary
+
+    uniqueCodes = np.where(known, vocabulary.get_indexer(np.where(known, uniques, '')), -1)
+    codes = np.where(codes >= 0, uniqueCodes[codes], -1) if uniqueCodes.size else np.full(codes.size, -1)
+
+    return codes.astype('int32'), vocabulary
+
+def buildAddressIndex(assets:pd.DataFrame)->AddressIndex:
+    """
+        Address index of the assets (getAssetsRecords). Fields that are not in the assets are missing.
+    Args:
+        assets (pd.DataFrame): Assets indexed by COMPKEY with the address fields.
+    Returns:
+        AddressIndex: Codes per COMPKEY and vocabulary per field.
+    """
+    keys, vocabulary = {}, {}
+    for field in FIELDS:
+        if field in assets.columns:
+            keys[field], vocabulary[field] = encode(assets[field], field, pd.Index([], dtype='object'))
+        else:
+            keys[field], vocabulary[field] = np.full(assets.shape[0], -1, dtype='int32'), pd.Index([], dtype='object')
+
+    keys = pd.DataFrame(keys, index=assets.index.rename(WC.COMPKEY))
+    keys = keys[~keys.index.duplicated()]
+
+    return AddressIndex(keys, vocabulary)
+
+def getAssetsHash(assets:pd.DataFrame)->str:
+    """
+        Hash of the COMPKEYs and address fields of the assets, to know if a saved index is still valid.
+    """
+    cols = [f for f in FIELDS if f in assets.columns]
+    hashes = pd.util.hash_pandas_object(assets[cols].astype('object'), index=True)
+
+    return str(int(hashes.sum()) & 0xFFFFFFFFFFFFFFFF) + '-' + str(assets.shape[0])
+
+def saveAddressIndex(index:AddressIndex, indexDir:str=INDEX_DIR, assetsHash:str=None):
+    """
+        Saves the address index (codes and vocabulary in parquet). The metadata is written last so an interrupted save
+        is not taken as a valid index.
+    """
+    os.makedirs(indexDir, exist_ok=True)
+    index.keys.to_parquet(os.path.join(indexDir, KEYS_FILE), index=True)
+
+    vocabulary = pd.concat([pd.DataFrame({'Field': field, 'Value': values.to_numpy(dtype='object')})
+                            for field, values in index.vocabulary.items()], ignore_index=True)
+    vocabulary.to_parquet(os.path.join(indexDir, VOCABULARY_FILE), index=False)
+
+    with open(os.path.join(indexDir, META_FILE) + '.tmp', 'w') as f:
+        json.dump({'assetsHash': assetsHash, 'fields': FIELDS}, f)
+    os.replace(os.path.join(indexDir, META_FILE) + '.tmp', os.path.join(indexDir, META_FILE))
+
+def loadAddressIndex(indexDir:str=INDEX_DIR)->tuple[AddressIndex, str]:
+    """
+        Loads an address index saved with saveAddressIndex.
+    Returns:
+        tuple[AddressIndex, str]: Index and hash of the assets it was built from. None if there is no index.
+    """
+    fMeta = os.path.join(indexDir, META_FILE)
+    if not os.path.exists(fMeta):
+        return None, None
+
+    with open(fMeta) as f:
+        meta = json.load(f)
+
+    keys = pd.read_parquet(os.path.join(indexDir, KEYS_FILE))
+    vocabulary = pd.read_parquet(os.path.join(indexDir, VOCABULARY_FILE))
+    vocabulary = {field: pd.Index(vocabulary.loc[vocabulary['Field'] == field, 'Value'].to_numpy(dtype='object'))
+                  for field in meta['fields']}
+
+    return AddressIndex(keys, vocabulary), meta['assetsHash']
+
+@SM.instrumented()
+def getAddressIndex(assets:pd.DataFrame, indexDir:str=INDEX_DIR)->AddressIndex:
+    """
+        Persisted address index of the assets: it is loaded if it was built from the same assets, otherwise it is
+        built and saved again.
+    """
+    assetsHash = getAssetsHash(assets)
+    index, savedHash = loadAddressIndex(indexDir)
+
+    if index is None or savedHash != assetsHash:
+        SM.logRows(assets.shape[0], 'Building the address index of {rows} assets')
+        index = buildAddressIndex(assets)
+        saveAddressIndex(index, indexDir, assetsHash)
+
+    return index
+
+def toCodePoints(values:np.ndarray)->tuple[np.ndarray, np.ndarray]:
+    """
+        Characters (unicode code points) of the strings as a padded matrix and the length of each string.
+    """
+    values = np.asarray(values, dtype='str')
+    width = max(1, values.dtype.itemsize // 4)
+    chars = np.ascontiguousarray(values.astype('U' + str(width))).view('uint32').reshape(values.size, width)
+
+    return chars, np.char.str_len(values)
+
+def getEditDistances(a:np.ndarray, b:np.ndarray, maxDistance:int=MAX_DISTANCE)->np.ndarray:
+    """
+        Levenshtein distance of each pair of strings, bounded to maxDistance + 1. The dynamic programming table of all
+        the pairs is filled at once (one row per character of a).
+    Args:
+        a, b (np.ndarray): Strings of the pairs.
+        maxDistance (int): Distances above it are returned as maxDistance + 1.
+    Returns:
+        np.ndarray: Bounded distance of each pair.
+    """
+    distances = np.full(len(a), maxDistance + 1, dtype='int32')
+    if len(a) == 0:
+        return distances
+
+    charsA, lenA = toCodePoints(a)
+    charsB, lenB = toCodePoints(b)
+    rows = np.arange(len(a))
+
+    #pairs whose lengths differ more than the bound cannot match
+    todo = np.abs(lenA - lenB) <= maxDistance
+    charsA, charsB, lenA, lenB, rows = charsA[todo], charsB[todo], lenA[todo], lenB[todo], rows[todo]
+
+    prev = np.tile(np.arange(charsB.shape[1] + 1, dtype='int32'), (rows.size, 1))
+    found = np.where(lenA == 0, prev[np.arange(rows.size), lenB], maxDistance + 1)
+
+    for i in range(1, charsA.shape[1] + 1):
+        cur = np.empty_like(prev)
+        cur[:, 0] = i
+        cost = (charsA[:, i - 1, None] != charsB).astype('int32')
+        subs = prev[:, :-1] + cost
+        dels = prev[:, 1:] + 1
+        best = np.minimum(subs, dels)
+        for j in range(1, charsB.shape[1] + 1):
+            cur[:, j] = np.minimum(best[:, j - 1], cur[:, j - 1] + 1)
+        done = lenA == i
+        found[done] = cur[done, lenB[done]]
+        prev = np.minimum(cur, maxDistance + 1)
+
+    distances[rows] = np.minimum(found, maxDistance + 1)
+
+    return distances
+
+def getMaxDistances(a:np.ndarray, b:np.ndarray, maxDistance:int=MAX_DISTANCE)->np.ndarray:
+    """
+        Max edit distance of a fuzzy match of each pair of strings: one edit per CHARS_PER_EDIT characters of the shorter
+        string, up to maxDistance.
+    """
+    shorter = np.minimum(np.char.str_len(np.asarray(a, dtype='str')), np.char.str_len(np.asarray(b, dtype='str')))
+
+    return np.minimum(shorter // CHARS_PER_EDIT, maxDistance).astype('int32')
+
+def matchField(failureCodes:np.ndarray, assetCodes:np.ndarray, vocabulary:pd.Index,
+               maxDistance:int=MAX_DISTANCE)->tuple[np.ndarray, np.ndarray]:
+    """
+        Match quality of one field of the failures against the field of their assets. The edit distances are only
+        calculated for the unique pairs of different values, and a pair is fuzzy if its distance is within the bound of
+        its length (getMaxDistances).
+    Args:
+        failureCodes (np.ndarray): Codes of the failure addresses in the vocabulary.
+        assetCodes (np.ndarray): Codes of the addresses of their assets.
+        vocabulary (pd.Index): Vocabulary of the field (with the values of the failures).
+        maxDistance (int): Max edit distance of a fuzzy match (of the longest values).
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Quality (codes of MATCH_QUALITY) and edit distance per failure.
+    """
+    quality = np.full(failureCodes.size, MATCH_QUALITY.categories.get_loc(MISMATCH), dtype='int8')
+    distance = np.zeros(failureCodes.size, dtype='int32')
+
+    missing = (failureCodes < 0) | (assetCodes < 0)
+    quality[missing] = MATCH_QUALITY.categories.get_loc(MISSING)
+    distance[missing] = -1
+    quality[~missing & (failureCodes == assetCodes)] = MATCH_QUALITY.categories.get_loc(EXACT)
+
+    different = ~missing & (failureCodes != assetCodes)
+    pairs = failureCodes[different].astype('int64') * (len(vocabulary) + 1) + assetCodes[different]
+    uniquePairs, inverse = np.unique(pairs, return_inverse=True)
+    values = vocabulary.to_numpy(dtype='object')
+    a, b = values[uniquePairs // (len(vocabulary) + 1)], values[uniquePairs % (len(vocabulary) + 1)]
+    pairDistances = getEditDistances(a, b, maxDistance)
+    fuzzy = pairDistances <= getMaxDistances(a, b, maxDistance)
+
+    distance[different] = pairDistances[inverse]
+    quality[np.flatnonzero(different)[fuzzy[inverse]]] = MATCH_QUALITY.categories.get_loc(FUZZY)
+
+    return quality, distance
+
+def matchAddresses(addresses:pd.DataFrame, index:AddressIndex, maxDistance:int=MAX_DISTANCE)->pd.DataFrame:
+    """
+        Match quality of the addresses of the failures against the addresses of their assets in the index.
+    Args:
+        addresses (pd.DataFrame): Failure addresses with COMPKEY and the address fields (one row per address record).
+        index (AddressIndex): Address index of the assets.
+        maxDistance (int): Max edit distance of a fuzzy match.
+    Returns:
+        pd.DataFrame: Quality and edit distance of each field and the overall quality (the worst of the fields that
+        are in the index) per address record, with the index of addresses.
+    """
+    rows = index.keys.index.get_indexer(addresses[WC.COMPKEY].to_numpy(dtype='int64'))
+    matches = {}
+    worst = np.zeros(addresses.shape[0], dtype='int8')
+
+    for field in FIELDS:
+        assetCodes = np.where(rows >= 0, index.keys[field].to_numpy()[rows], -1)
+        failureCodes, vocabulary = encode(addresses[field], field, index.vocabulary[field])
+        quality, distance = matchField(failureCodes, assetCodes, vocabulary, maxDistance)
+
+        matches[field + ' match'] = pd.Categorical.from_codes(quality, dtype=MATCH_QUALITY)
+        matches[field + ' distance'] = distance
+        if len(index.vocabulary[field]):
+            worst = np.maximum(worst, quality)
+
+    matches = pd.DataFrame(matches, index=addresses.index)
+    matches.insert(0, ADDRESS_MATCH, pd.Categorical.from_codes(worst, dtype=MATCH_QUALITY))
+
+    return matches
@@ -0,0 +1,160 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+
+
+MIN_POINTS = 3
+
+
+def getSegmentCodes(df:pd.DataFrame, by:list[str])->tuple[np.ndarray, pd.Index]:
+    """
+        Segment of each row (codes) and the segments (index) of the levels or columns of the table.
+    """
+    keys = df.reset_index()[by]
+    if len(by) == 1:
+        codes, segments = pd.factorize(keys[by[0]], sort=True)
+        return codes, pd.Index(segments, name=by[0])
+
+    codes, segments = pd.factorize(pd.MultiIndex.from_frame(keys), sort=True)
+    return codes, pd.MultiIndex.from_tuples(segments, names=by)
+
+def solveSegments(codes:np.ndarray, x:np.ndarray, y:np.ndarray, w:np.ndarray, nSegments:int)->tuple[np.ndarray, ...]:
+    """
+        Weighted least squares y = intercept + slope*x of all the segments at once: the normal equations (2x2) of each
+        segment are built with bincount and solved stacked.
+    Args:
+        codes (np.ndarray): Segment of each point.
+        x, y, w (np.ndarray): Points and weights (nPoints) or replicates of them (nReplicates, nPoints).
+        nSegments (int): Number of segments.
+    Returns:
+        tuple: intercept, slope, SSR, weighted TSS, number of points and (X'WX)^-1 per segment (and replicate).
+    """
+    x, y, w = np.atleast_2d(x), np.atleast_2d(y), np.atleast_2d(w)
+    nRep = x.shape[0]
+    bins = (np.arange(nRep)[:, None] * nSegments + codes[None, :]).ravel()
+
+    def sumBy(v):
+        return np.bincount(bins, weights=v.ravel(), minlength=nRep*nSegments).reshape(nRep, nSegments)
+
+    def perPoint(v):
+        return v[:, codes]
+
+    Sw, Sx, Sy, Sxx, Sxy = sumBy(w), sumBy(w*x), sumBy(w*y), sumBy(w*x*x), sumBy(w*x*y)
+    n = sumBy(np.ones_like(w))
+
+    XtWX = np.stack([np.stack([Sw, Sx], -1), np.stack([Sx, Sxx], -1)], -2)
+    XtWy = np.stack([Sy, Sxy], -1)
+
+    #segments with a singular system (e.g. less than two different x) get NaN
+    det = Sw * Sxx - Sx**2
+    singular = ~(det > 1e-12 * Sw * Sxx)
+    XtWX[singular] = np.eye(2)
+    inv = np.linalg.inv(XtWX)
+    inv[singular] = np.nan
+    coefs = np.einsum('...ij,...j->...i', inv, XtWy)
+
+    intercept, slope = coefs[..., 0], coefs[..., 1]
+    SSR = sumBy(w * (y - perPoint(intercept) - perPoint(slope) * x)**2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        TSS = sumBy(w * (y - perPoint(Sy / Sw))**2)
+
+    if nRep == 1:
+        return intercept[0], slope[0], SSR[0], TSS[0], n[0], inv[0]
+    return intercept, slope, SSR, TSS, n, inv
+
+def fitSegments(df:pd.DataFrame, x:str, y:str=DAC.FAILURE_RATE, w:str=WC.LENG, by:list[str]=[WC.MATERIAL],
+                alpha:float=0.05, minPoints:int=MIN_POINTS)->pd.DataFrame:
+    """
+        Weighted linear regression of y vs x for every segment of the grouped failure-rate table in one solve (same
+        results as one statsmodels WLS with a constant per segment).
+    Args:
+        df (pd.DataFrame): Grouped table (e.g. groupByTwoFactorsCalibration or getMarginal) with the columns x, y and w
+            and the segments in its levels or columns.
+        x (str): Column of the independent variable (e.g. mean max pressure of the range).
+        y (str): Column of the dependent variable.
+        w (str): Column of the weights.
+        by (list[str]): Levels or columns that define the segments (e.g. MATERIAL and the diameter range).
+        alpha (float): Significance of the confidence intervals.
+        minPoints (int): Segments with less points are not fitted (NaN).
+    Returns:
+        pd.DataFrame: Slope, Intercept, Std dev (of the slope), Slope P-value, Rsquared, confidence intervals of the slope
+        and the intercept and number of points per segment.
+    """
+    data = df.reset_index()
+    data = data[data[[x, y, w]].notna().all(axis=1)]
+    codes, segments = getSegmentCodes(data, by)
+
+    xv, yv, wv = (data[c].to_numpy(dtype='float64') for c in (x, y, w))
+    intercept, slope, SSR, TSS, n, inv = solveSegments(codes, xv, yv, wv, len(segments))
+
+    dfResid = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = SSR / dfResid
+        seIntercept = np.sqrt(sigma2 * inv[:, 0, 0])
+        seSlope = np.sqrt(sigma2 * inv[:, 1, 1])
+        tSlope = slope / seSlope
+        rsquared = 1 - SSR / TSS
+
+    tCrit = stats.t.ppf(1 - alpha/2, dfResid)
+    regres = pd.DataFrame({'Slope': slope, 'Intercept': intercept, 'Std dev': seSlope,
+                           'Slope P-value': 2 * stats.t.sf(np.abs(tSlope), dfResid), 'Rsquared': rsquared,
+                           'Slope CI low': slope - tCrit*seSlope, 'Slope CI high': slope + tCrit*seSlope,
+                           'Intercept CI low': intercept - tCrit*seIntercept,
+                           'Intercept CI high': intercept + tCrit*seIntercept, 'Points': n.astype('int64')}, index=segments)
+
+    regres.loc[regres['Points'] < minPoints, regres.columns[:-1]] = np.nan
+
+    return regres
+
+def bootstrapSegments(df:pd.DataFrame, x:str, y:str=DAC.FAILURE_RATE, w:str=WC.LENG, by:list[str]=[WC.MATERIAL],
+                      nBoot:int=1000, alpha:float=0.05, minPoints:int=MIN_POINTS, seed:int=0)->pd.DataFrame:
+    """
+        Bootstrap (resampling the points of each segment with replacement) of the weighted regressions of all the
+        segments. All the replicates are solved at once.
+    Args:
+        df (pd.DataFrame): Grouped table with the columns x, y and w.
+        x, y, w (str): Columns of the independent variable, the dependent variable and the weights.
+        by (list[str]): Levels or columns that define the segments.
+        nBoot (int): Number of replicates.
+        alpha (float): Significance of the percentile intervals.
+        minPoints (int): Segments with less points are not fitted (NaN).
+        seed (int): Seed of the resampling.
+    Returns:
+        pd.DataFrame: Std dev and percentile intervals of the slope and the intercept per segment.
+    """
+    data = df.reset_index()
+    data = data[data[[x, y, w]].notna().all(axis=1)]
+    codes, segments = getSegmentCodes(data, by)
+
+    #points sorted by segment so each segment is a block of rows
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    xv, yv, wv = (data[c].to_numpy(dtype='float64')[order] for c in (x, y, w))
+    counts = np.bincount(codes, minlength=len(segments))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    #each point is replaced by a random point of its own segment
+    rng = np.random.default_rng(seed)
+    idx = starts[codes] + (rng.random((nBoot, codes.size)) * counts[codes]).astype('int64')
+
+    intercept, slope, _, _, _, _ = solveSegments(codes, xv[idx], yv[idx], wv[idx], len(segments))
+
+    q = [alpha/2 * 100, (1 - alpha/2) * 100]
+    #segments without fitted replicates (less than two different x) are all NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        slopeQ, interceptQ = np.nanpercentile(slope, q, axis=0), np.nanpercentile(intercept, q, axis=0)
+        slopeStd, interceptStd = np.nanstd(slope, axis=0, ddof=1), np.nanstd(intercept, axis=0, ddof=1)
+
+    boot = pd.DataFrame({'Slope boot std': slopeStd, 'Slope boot low': slopeQ[0], 'Slope boot high': slopeQ[1],
+                         'Intercept boot std': interceptStd, 'Intercept boot low': interceptQ[0],
+                         'Intercept boot high': interceptQ[1]}, index=segments)
+
+    boot.loc[counts < minPoints] = np.nan
+
+    return boot
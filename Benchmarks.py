@@ -0,0 +1,227 @@
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+import GetFailures as gf
+import StageMetrics as SM
+import SyntheticData as SD
+import WatercareConstants as WC
+import Files as FILES
+
+
+BENCHMARK_DIR = 'Benchmarks'
+SYNTHETIC_DIR = 'Synthetic'
+DATASET_FILE = 'dataset.json'
+SCALES = [10000, 100000, 1000000]
+CRACK_SIZES = [10000, 100000]
+CRACK_METHODS = ['analytic'] #'euler' is the reference (slow for big sizes)
+
+
+def runIsolated(func, *args)->dict:
+    """
+        Runs a function in a new process and measures its wall time and the peak resident memory of the process, so
+        the peak of a run is not hidden by the previous ones.
+    Args:
+        func: Function to run (it has to be importable by the new process).
+        args: Arguments of the function.
+    Returns:
+        dict: 'Wall time (s)' and 'Peak RSS (MB)'.
+    """
+    return runInNewProcess(_measure, func, *args)
+
+def runInNewProcess(func, *args):
+    """
+        Result of a function run in a new (spawned) process.
+    """
+    ctx = mp.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        return pool.apply(func, args)
+
+def _measure(func, *args)->dict:
+    start = time.perf_counter()
+    func(*args)
+    wall = time.perf_counter() - start
+
+    return {'Wall time (s)': wall, 'Peak RSS (MB)': SM.getPeakRSS()}
+
+def readAssetsSequential(assetType:str=WC.WMN, usecols:list[int]=gf.ASSET_COLS, fnames:list[str]=None)->pd.DataFrame:
+    """
+        Previous way of loading the assets: the 3 files one after another with object columns, concatenated and then
+        filtered by type (pd.concat instead of the removed DataFrame.append).
+    """
+    fnames = [FILES.ASSETS1, FILES.ASSETS2, FILES.ASSETS3] if fnames is None else fnames
+    dtypes = {WC.ASSET_TYPECODE:'str',WC.ASSET_SERV_STA:'str','Asset Status':'str','Asset Compkey':'int64',
+              'Water Service Line Pipe Type':'str'}
+
+    frames = [pd.read_csv(f, delimiter = ',', index_col=['Asset Compkey'], dtype = dtypes, usecols=usecols) for f in fnames]
+    allAssets = pd.concat(frames).copy()
+
+    return allAssets[allAssets[WC.ASSET_TYPECODE] == assetType].copy()
+
+def benchmarkAssetsLoading(assetType:str=WC.WMN, usecols:list[int]=gf.ASSET_COLS, fnames:list[str]=None,
+                           repeats:int=3)->pd.DataFrame:
+    """
+        Wall time and peak RSS of the sequential and the parallel pre-filtered loading of the asset files.
+    Args:
+        assetType (str): Asset type code to keep (WMN or WSL).
+        usecols (list[int]): Columns of the asset files (ASSET_COLS or ASSET_SL_COLS).
+        fnames (list[str]): Asset files. Default is ASSETS1..3.
+        repeats (int): Number of runs of each method, the best one is reported.
+    Returns:
+        pd.DataFrame: Best wall time and peak RSS per method, and the ratio between them.
+    """
+    methods = {'Sequential': readAssetsSequential, 'Parallel': gf.readAssets}
+    results = {}
+
+    for name, func in methods.items():
+        runs = pd.DataFrame([runIsolated(func, assetType, usecols, fnames) for _ in range(repeats)])
+        results[name] = runs.min()
+        print(name, " loading: ", results[name].to_dict())
+
+    results = pd.DataFrame(results).T
+    results.loc['Ratio'] = results.loc['Sequential'] / results.loc['Parallel']
+
+    return results
+
+def getDataset(root:str, nPipes:int, seed:int=0)->str:
+    """
+        Directory of the synthetic dataset of nPipes pipes in root, generated only if it does not exist yet.
+    """
+    directory = os.path.join(root, str(nPipes))
+    fInfo = os.path.join(directory, DATASET_FILE)
+
+    if os.path.exists(fInfo):
+        with open(fInfo) as f:
+            if json.load(f)['Seed'] == seed:
+                return directory
+
+    counts = SD.generateDataset(directory, nPipes, seed)
+    with open(fInfo, 'w') as f:
+        json.dump({'Pipes': nPipes, 'Seed': seed, 'Records': counts}, f)
+
+    return directory
+
+def _benchmarkPipeline(directory:str)->list[dict]:
+    """
+        Metrics of the stages of getFailures, the pressures and geounits joins and groupByMaterial on a dataset.
+    """
+    import processData as pdata
+    import SpatialJoins as SJ
+
+    os.chdir(directory)
+    with SM.collect(verbose=False) as records:
+        pipes, _ = gf.getFailures(FILES.WORK_ORDERS)
+        with SM.stage('readPressureJoin'):
+            SM.logRows(SJ.readPressureJoin().shape[0], '{rows} pipes with pressure')
+        with SM.stage('readGeounitsJoin'):
+            SM.logRows(SJ.readGeounitsJoin().shape[0], '{rows} pipes with geounit')
+        with SM.stage('groupByMaterial'):
+            colors = pd.DataFrame({'Color': 'grey'}, index=pd.Index(pipes[WC.MATERIAL].cat.categories.tolist() +
+                                                                    ['Other'], name=WC.MATERIAL))
+            SM.logRows(pdata.groupByMaterial(pipes, colors).shape[0], '{rows} material groups')
+
+    return records
+
+def _benchmarkCrackModel(nCracks:int, method:str, seed:int)->list[dict]:
+    """
+        Metrics of the batch crack model for nCracks random cracks.
+    """
+    import crackGrowthCalculations as cc
+
+    inputs = SD.getCrackInputs(nCracks, seed)
+    with SM.collect(verbose=False) as records:
+        with SM.stage('crackModel ' + method) as record:
+            with np.errstate(all='ignore'):
+                res = cc.createCurvesUntilDetectableBatch(**inputs, method=method)
+            record['Rows in'], record['Rows out'] = nCracks, int(np.isfinite(res.daysToDetection).sum())
+
+    return records
+
+def getEnvironment()->dict:
+    """
+        Machine, versions and commit of a benchmark run.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {'Date': pd.Timestamp.now().isoformat(timespec='seconds'), 'Commit': commit, 'Machine': platform.platform(),
+            'CPUs': os.cpu_count(), 'Python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__}
+
+def runBenchmarks(scales:list[int]=SCALES, crackSizes:list[int]=CRACK_SIZES, methods:list[str]=CRACK_METHODS,
+                  root:str=SYNTHETIC_DIR, seed:int=0, outDir:str=BENCHMARK_DIR)->pd.DataFrame:
+    """
+        Times and memory of each stage of the pipeline on synthetic datasets of several sizes and of the crack model,
+        each run in a new process. The results are saved as JSON in outDir (one file per run) so runs can be compared
+        with compareBenchmarks. It does not need the Watercare data or network.
+    Args:
+        scales (list[int]): Number of pipes of the datasets (generated in root the first time).
+        crackSizes (list[int]): Number of cracks of the crack model runs.
+        methods (list[str]): Methods of createCurvesUntilDetectableBatch.
+        root (str): Directory of the synthetic datasets.
+        seed (int): Seed of the datasets and the cracks.
+        outDir (str): Directory of the results.
+    Returns:
+        pd.DataFrame: Metrics per scale and stage.
+    """
+    root, outDir = os.path.abspath(root), os.path.abspath(outDir)
+    results = []
+
+    for nPipes in scales:
+        directory = getDataset(root, nPipes, seed)
+        for record in runInNewProcess(_benchmarkPipeline, directory):
+            results.append(dict(record, Scale=nPipes))
+        print("Benchmarked pipeline with ", nPipes, " pipes")
+
+    for nCracks in crackSizes:
+        for method in methods:
+            for record in runInNewProcess(_benchmarkCrackModel, nCracks, method, seed):
+                results.append(dict(record, Scale=nCracks))
+        print("Benchmarked crack model with ", nCracks, " cracks")
+
+    run = {'Environment': getEnvironment(), 'Results': json.loads(SM.toJSON(results))}
+    os.makedirs(outDir, exist_ok=True)
+    fname = os.path.join(outDir, 'benchmark_' + run['Environment']['Date'].replace(':', '') + '.json')
+    with open(fname, 'w') as f:
+        json.dump(run, f, indent=1)
+    print("Results saved in ", fname)
+
+    return SM.toDataFrame(results)
+
+def loadBenchmarks(outDir:str=BENCHMARK_DIR)->pd.DataFrame:
+    """
+        Results of all the saved benchmark runs (one row per run, scale and stage).
+    """
+    frames = []
+    for fname in sorted(os.listdir(outDir)):
+        if fname.endswith('.json'):
+            with open(os.path.join(outDir, fname)) as f:
+                run = json.load(f)
+            frames.append(SM.toDataFrame(run['Results']).assign(Run=run['Environment']['Date'],
+                                                                  Commit=run['Environment']['Commit']))
+
+    return pd.concat(frames, ignore_index=True)
+
+def compareBenchmarks(base:str, new:str, outDir:str=BENCHMARK_DIR, tolerance:float=0.2)->pd.DataFrame:
+    """
+        Ratio of the time and the peak memory of two runs (dates of loadBenchmarks) per scale and stage, only the
+        stages that got slower or bigger than the tolerance.
+    """
+    results = loadBenchmarks(outDir)
+    cols = ['Wall time (s)', 'Peak RSS (MB)']
+    runs = [results[results['Run'] == run].groupby(['Scale', 'Stage'])[cols].sum() for run in [base, new]]
+
+    both = runs[0].join(runs[1], rsuffix=' new', how='inner')
+    for col in cols:
+        both[col + ' ratio'] = both[col + ' new'] / both[col]
+
+    return both[(both['Wall time (s) ratio'] > 1 + tolerance) | (both['Peak RSS (MB) ratio'] > 1 + tolerance)]
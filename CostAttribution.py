@@ -0,0 +1,207 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import FailureRateCube as FRC
+import Schema as SCHEMA
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+
+
+#Dimensions of the failures that are not columns of the pipes: type of the failed pipe and class of its SERVNO
+PIPE = 'Pipe'
+CLASS = 'Class'
+MAIN, SERVICE_LINE, BOTH = 'Main', 'Service line', 'Both'
+PIPE_LABELS = [MAIN, SERVICE_LINE]
+CLASS_LABELS = [MAIN, SERVICE_LINE, BOTH]
+
+#Activity codes of the service line repairs and columns of the service line assets (getAssetsSERVRecords)
+SERVICE_CODES = [WC.WSLRPR]
+SL_MATERIAL = 'Water Service Line Pipe Type'
+
+COST_RATE = 'NZD/failure'
+COST_PER_KM = 'NZD/km'
+COST_PER_KM_YEAR = 'NZD/km/year'
+LENGTH_KM = 'Length (km)'
+
+
+class CostIndex(NamedTuple):
+    """
+        Costs of the failures linked by an integer key per SERVNO. Each failure (main or service line repair) has the key
+        of its SERVNO and its code in each dimension (-1 for no valid value), and each SERVNO has its WoCost and its
+        class (main, service line or both, -1 if it has no failure). The codes and the length (km) of the mains of the
+        network are kept for the costs per km.
+    """
+    servno: pd.Index
+    cost: np.ndarray
+    servClass: np.ndarray
+    key: np.ndarray
+    codes: dict[str, np.ndarray]
+    labels: dict[str, list[str]]
+    pipeCodes: dict[str, np.ndarray]
+    pipeLength: np.ndarray
+    years: float
+
+
+def getServiceMaterialCodes(serviceFailures:pd.DataFrame, serviceLines:pd.DataFrame, labels:list[str])->np.ndarray:
+    """
+        Position in the material labels of the mains of the material of the service line of each failure (normalised as
+        the mains, e.g. ALK is PE and DI is Iron), -1 if it is unknown.
+    """
+    if serviceLines is None or SL_MATERIAL not in serviceLines.columns:
+        return np.full(serviceFailures.shape[0], -1, dtype='int8')
+
+    pos = serviceLines.index.get_indexer(serviceFailures[WC.COMPKEY])
+    materials = pd.Series(np.append(serviceLines[SL_MATERIAL].to_numpy(dtype='object'), None)[pos])
+    materials = SCHEMA.normaliseMaterials(materials).astype('object')
+
+    return pd.Categorical(materials, categories=labels).codes
+
+def buildCostIndex(failureRecords:pd.DataFrame, failureCosts:pd.DataFrame, mainFailures:pd.DataFrame,
+                   pipes:pd.DataFrame, serviceLines:pd.DataFrame=None, dims:list[str]=[WC.MATERIAL, DAC.LBL_DIAMETER],
+                   serviceCodes:list[str]=SERVICE_CODES, years:float=FRC.YEARS_OF_RECORDS)->CostIndex:
+    """
+        Builds the cost index once from the tables of readWorkOrders and the pipes, so every rollup is a sum over
+        integer codes instead of a join with the costs and a groupby.
+    Args:
+        failureRecords (pd.DataFrame): Failure records (readWorkOrders), used for the service line repairs and the
+            class of the SERVNOs.
+        failureCosts (pd.DataFrame): WoCost per SERVNO (readWorkOrders).
+        mainFailures (pd.DataFrame): Failures of mains with SERVNO and COMPKEY (getMainFailures). The ones whose pipe
+            is not in the pipes are not used (as failuresWithPipesInGIS).
+        pipes (pd.DataFrame): Main pipes indexed by COMPKEY with Shape_Leng (km) and the columns of the dimensions
+            (wPipesGISNfailures, with the pressures and geounits for those dimensions).
+        serviceLines (pd.DataFrame): Service line assets indexed by COMPKEY (getAssetsSERVRecords) for the material
+            of the service line failures. Default is None (unknown material).
+        dims (list[str]): Dimensions of the pipes (see FailureRateCube.getCodes). The service line failures only have
+            a material.
+        serviceCodes (list[str]): ACTCODEs of the service line repairs.
+        years (float): Years of failure records.
+    Returns:
+        CostIndex: Index of the costs.
+    """
+    servno = pd.Index(failureCosts.index.astype('str'), name=WC.SERVNO)
+    cost = failureCosts[WC.WO_COST].to_numpy(dtype='float64')
+
+    #failures of mains with their pipe, and service line repairs
+    pos = pipes.index.get_indexer(mainFailures[WC.COMPKEY])
+    mains = mainFailures[pos >= 0]
+    pos = pos[pos >= 0]
+    services = failureRecords[failureRecords[WC.ACTCODE].isin(serviceCodes)]
+
+    codes, labels, pipeCodes = {}, {}, {}
+    for dim in dims:
+        pipeCodes[dim], labels[dim] = FRC.getCodes(pipes, dim)
+        serviceDim = getServiceMaterialCodes(services, serviceLines, labels[dim]) if dim == WC.MATERIAL \
+            else np.full(services.shape[0], -1)
+        codes[dim] = np.concatenate([pipeCodes[dim][pos], serviceDim])
+
+    #class of each SERVNO from the SERVNOs with main and service line repairs (servBoth of the notebook)
+    hasMain = servno.isin(mains[WC.SERVNO])
+    hasService = servno.isin(services[WC.SERVNO])
+    servClass = np.select([hasMain & hasService, hasMain, hasService], [2, 0, 1], -1).astype('int8')
+
+    #failures without SERVNO cost (key -1 is the last position, 0 NZD)
+    key = servno.get_indexer(pd.concat([mains[WC.SERVNO], services[WC.SERVNO]]).astype('str'))
+    codes[PIPE] = np.repeat(np.array([0, 1], dtype='int8'), [mains.shape[0], services.shape[0]])
+    codes[CLASS] = np.append(servClass, -1)[key]
+    labels[PIPE], labels[CLASS] = PIPE_LABELS, CLASS_LABELS
+
+    pipeCodes[PIPE] = np.zeros(pipes.shape[0], dtype='int8')
+    pipeLength = pipes[WC.LENG].to_numpy(dtype='float64')
+
+    print("Cost index of ", mains.shape[0], " main failures and ", services.shape[0], " service line failures over ",
+          servno.size, " SERVNO")
+
+    return CostIndex(servno, cost, servClass, key.astype('int64'), codes, labels, pipeCodes, pipeLength, years)
+
+def getFailureCosts(index:CostIndex, cost:np.ndarray=None)->np.ndarray:
+    """
+        Cost of each failure: the cost of its SERVNO (as join(costs, on=SERVNO), a SERVNO with several failures counts
+        in each one).
+    Args:
+        index (CostIndex): Cost index.
+        cost (np.ndarray): Cost per SERVNO of a scenario (same order as index.servno). Default is None (WoCost).
+    """
+    cost = index.cost if cost is None else np.asarray(cost, dtype='float64')
+    return np.append(cost, 0.0)[index.key]
+
+def getMask(index:CostIndex, where:dict[str, list[str]])->np.ndarray:
+    """
+        Failures whose labels are in the given ones for each dimension, e.g. {PIPE: [MAIN], CLASS: [MAIN]} for the
+        failures of mains without service line repairs (failOnlyMain of the notebook).
+    """
+    mask = np.ones(index.key.size, dtype=bool)
+    for dim, values in where.items():
+        allowed = [index.labels[dim].index(v) for v in values]
+        mask &= np.isin(index.codes[dim], allowed)
+
+    return mask
+
+def rollup(index:CostIndex, dims:list[str], cost:np.ndarray=None, where:dict[str, list[str]]=None,
+           failureCosts:np.ndarray=None)->pd.DataFrame:
+    """
+        Cost, failures and cost rates per combination of the labels of the dimensions (getCostRatePerMaterial,
+        getCostRatePerMaterialDiam, etc. of the notebook). Only the failures with a valid value in the dimensions are
+        used.
+    Args:
+        index (CostIndex): Cost index.
+        dims (list[str]): Dimensions, e.g. [MATERIAL], [MATERIAL, LBL_DIAMETER] or [CLASS].
+        cost (np.ndarray): Cost per SERVNO of a scenario. Default is None (WoCost).
+        where (dict[str, list[str]]): Labels of the failures used per dimension (see getMask). Default is None (all).
+        failureCosts (np.ndarray): Cost per failure already calculated with getFailureCosts (to reuse it in several
+            rollups of the same scenario).
+    Returns:
+        pd.DataFrame: WoCost, number of failures, NZD/failure and, if the dimensions are of the pipes, the length of
+        the mains (km), NZD/km and NZD/km/year per cell (only cells with failures).
+    """
+    failureCosts = getFailureCosts(index, cost) if failureCosts is None else failureCosts
+    shape = tuple(len(index.labels[dim]) for dim in dims)
+    size = int(np.prod(shape))
+
+    codes = [index.codes[dim] for dim in dims]
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    if where is not None:
+        valid &= getMask(index, where)
+    cells = np.ravel_multi_index([c[valid] for c in codes], shape)
+
+    groups = pd.MultiIndex.from_product([index.labels[dim] for dim in dims], names=dims)
+    dfCost = pd.DataFrame({WC.WO_COST: np.bincount(cells, weights=failureCosts[valid], minlength=size),
+                           DAC.NUM_FAILURES: np.bincount(cells, minlength=size)}, index=groups)
+    dfCost[COST_RATE] = dfCost[WC.WO_COST] / dfCost[DAC.NUM_FAILURES].where(dfCost[DAC.NUM_FAILURES] > 0)
+
+    #length of the network only for the dimensions of the pipes
+    if all(dim in index.pipeCodes for dim in dims):
+        pipeCodes = [index.pipeCodes[dim] for dim in dims]
+        validPipes = np.logical_and.reduce([c >= 0 for c in pipeCodes])
+        pipeCells = np.ravel_multi_index([c[validPipes] for c in pipeCodes], shape)
+        dfCost[LENGTH_KM] = np.bincount(pipeCells, weights=index.pipeLength[validPipes], minlength=size)
+        dfCost[COST_PER_KM] = dfCost[WC.WO_COST] / dfCost[LENGTH_KM].where(dfCost[LENGTH_KM] > 0)
+        dfCost[COST_PER_KM_YEAR] = dfCost[COST_PER_KM] / index.years
+
+    dfCost = dfCost[dfCost[DAC.NUM_FAILURES] > 0].copy()
+    dfCost['%'] = dfCost[WC.WO_COST] / dfCost[WC.WO_COST].sum() * 100
+
+    return dfCost
+
+def rollups(index:CostIndex, groupings:list[list[str]], cost:np.ndarray=None,
+            where:dict[str, list[str]]=None)->dict[tuple, pd.DataFrame]:
+    """
+        Rollups of a cost scenario for several groupings (the cost of each failure is taken once).
+    Returns:
+        dict[tuple, pd.DataFrame]: Rollup per grouping (tuple of its dimensions).
+    """
+    failureCosts = getFailureCosts(index, cost)
+    return {tuple(dims): rollup(index, dims, where=where, failureCosts=failureCosts) for dims in groupings}
+
+def getScenarioCosts(index:CostIndex, factors:dict[str, float])->np.ndarray:
+    """
+        Cost per SERVNO of a scenario with a factor per class of SERVNO, e.g. {BOTH: 0.8} (classes not given keep
+        their cost).
+    """
+    scale = np.ones(len(CLASS_LABELS) + 1)
+    for label, factor in factors.items():
+        scale[CLASS_LABELS.index(label)] = factor
+
+    return index.cost * scale[index.servClass]
@@ -11,6 +11,10 @@ AGE_FAILURE = 'Age at failure'
 CURRENT_AGE = 'Age Today'
 
 FAILURE_RATE = 'Failures/Km/year'
+FAILURE_RATE_LOW = 'Failures/Km/year low'
+FAILURE_RATE_HIGH = 'Failures/Km/year high'
+
+GEOUNIT = 'Soil main rock'
 
 
 #Labels 
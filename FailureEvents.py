@@ -0,0 +1,255 @@
+import os
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import FailureRateCube as FRC
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+import Files as FILES
+
+
+EVENTS_DIR = 'Cache/Events'
+EVENTS_FILE = 'events.npz'
+
+#Periods of the counts: function of the dates of the days that returns the label of the period
+PERIODS = {'day': lambda dates: dates,
+           'month': lambda dates: dates.to_period('M'),
+           'year': lambda dates: dates.year,
+           'season': lambda dates: (dates.month % 12 // 3).map({0: 'Summer', 1: 'Autumn', 2: 'Winter', 3: 'Spring'}),
+           'month of year': lambda dates: dates.month}
+GROUPS = [WC.MATERIAL, DAC.GEOUNIT]
+
+
+class FailureEvents(NamedTuple):
+    """
+        Failures sorted by date with their day (days since origin), COMPKEY and material and geounit codes, and the
+        number of failures per day, material and geounit (the last position of each group has the failures without
+        a value, labelled UNK in the tables). Days go from origin to the last failure.
+    """
+    origin: pd.Timestamp
+    day: np.ndarray
+    compkey: np.ndarray
+    codes: dict[str, np.ndarray]
+    labels: dict[str, list[str]]
+    counts: np.ndarray
+
+
+def buildEvents(failures:pd.DataFrame, pipes:pd.DataFrame=None, origin:pd.Timestamp=None)->FailureEvents:
+    """
+        Builds the event store of the failures.
+    Args:
+        failures (pd.DataFrame): Failures with ADDDTTM and COMPKEY (mainFailures).
+        pipes (pd.DataFrame): Pipes indexed by COMPKEY with MATERIAL and main_rock (e.g. wPipesGISNfailures joined
+            with the geounits), or None if the failures already have them.
+        origin (pd.Timestamp): Day 0. Default is the day of the first failure.
+    Returns:
+        FailureEvents: Event store.
+    """
+    failures = failures[failures[WC.ADDDTTM].notna()]
+    if pipes is not None:
+        cols = [FRC.CATEGORIES[g] for g in GROUPS if FRC.CATEGORIES[g] in pipes.columns]
+        failures = failures[[WC.ADDDTTM, WC.COMPKEY]].join(pipes[cols], on=WC.COMPKEY)
+
+    dates = pd.to_datetime(failures[WC.ADDDTTM])
+    dates = (dates.dt.tz_localize(None) if dates.dt.tz is not None else dates).dt.normalize()
+    origin = dates.min() if origin is None else pd.Timestamp(origin).normalize()
+    day = ((dates - origin) // pd.Timedelta(days=1)).to_numpy(dtype='int32')
+    order = np.argsort(day, kind='stable')
+
+    codes, labels = {}, {}
+    for group in GROUPS:
+        if FRC.CATEGORIES[group] in failures.columns:
+            c, labels[group] = FRC.getCodes(failures, group)
+        else:
+            c, labels[group] = np.full(failures.shape[0], -1), []
+        #failures without a value go to the last position
+        codes[group] = np.where(c < 0, len(labels[group]), c).astype('int32')[order]
+
+    day = day[order]
+    shape = (day[-1] + 1 if day.size else 0,) + tuple(len(labels[g]) + 1 for g in GROUPS)
+    flat = np.ravel_multi_index((day,) + tuple(codes[g] for g in GROUPS), shape)
+    counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape).astype('int32')
+
+    return FailureEvents(origin, day, failures[WC.COMPKEY].to_numpy(dtype='int64')[order], codes, labels, counts)
+
+def saveEvents(events:FailureEvents, eventsDir:str=EVENTS_DIR):
+    """
+        Saves the event store (the counts are rebuilt when it is loaded).
+    """
+    os.makedirs(eventsDir, exist_ok=True)
+    arrays = {'origin': np.array(str(events.origin)), 'day': events.day, 'compkey': events.compkey}
+    for group in GROUPS:
+        arrays['codes ' + group] = events.codes[group]
+        arrays['labels ' + group] = np.array(events.labels[group], dtype='str')
+    np.savez(os.path.join(eventsDir, EVENTS_FILE), **arrays)
+
+def loadEvents(eventsDir:str=EVENTS_DIR)->FailureEvents:
+    """
+        Event store saved by saveEvents.
+    """
+    with np.load(os.path.join(eventsDir, EVENTS_FILE)) as f:
+        day = f['day']
+        codes = {g: f['codes ' + g] for g in GROUPS}
+        labels = {g: f['labels ' + g].tolist() for g in GROUPS}
+        events = FailureEvents(pd.Timestamp(str(f['origin'])), day, f['compkey'], codes, labels, None)
+
+    shape = (day[-1] + 1 if day.size else 0,) + tuple(len(labels[g]) + 1 for g in GROUPS)
+    flat = np.ravel_multi_index((day,) + tuple(codes[g] for g in GROUPS), shape)
+
+    return events._replace(counts=np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape).astype('int32'))
+
+def getDates(events:FailureEvents)->pd.DatetimeIndex:
+    """
+        Dates of the days of the store.
+    """
+    return pd.date_range(events.origin, periods=events.counts.shape[0], freq='D')
+
+def getDailyCounts(events:FailureEvents, by:list[str]=[WC.MATERIAL])->pd.DataFrame:
+    """
+        Failures per day (rows) and group (columns), including the days without failures.
+    """
+    axes = tuple(i + 1 for i, g in enumerate(GROUPS) if g not in by)
+    counts = events.counts.sum(axis=axes)
+    columns = pd.MultiIndex.from_product([events.labels[g] + [WC.UNKNOWN] for g in by], names=by)
+
+    return pd.DataFrame(counts.reshape(counts.shape[0], -1), index=getDates(events), columns=columns)
+
+def getCounts(events:FailureEvents, period:str='month', by:list[str]=[WC.MATERIAL])->pd.DataFrame:
+    """
+        Failures per period (day, month, year, season or month of year) and group, from the daily counts (replaces the
+        groupby of the failures by material, year and month).
+    """
+    daily = getDailyCounts(events, by)
+    labels = PERIODS[period](daily.index)
+    codes, periods = pd.factorize(labels, sort=True)
+
+    sums = np.zeros((len(periods), daily.shape[1]), dtype='int64')
+    np.add.at(sums, codes, daily.to_numpy())
+
+    return pd.DataFrame(sums, index=pd.Index(periods, name=period), columns=daily.columns)
+
+def readDailyClimate(fname:str=FILES.CLIMATE_DAILY)->pd.DataFrame:
+    """
+        Daily climate series (rainfall, soil moisture deficit, temperature, ...) indexed by date.
+    """
+    climate = pd.read_csv(fname, delimiter = ',', index_col=0, parse_dates=[0])
+
+    return climate.astype('float64').sort_index()
+
+def alignClimate(events:FailureEvents, climate:pd.DataFrame, before:int=0, maxGap:int=None)->np.ndarray:
+    """
+        Climate of each day of the store as of that day (last observation at or before it).
+    Args:
+        events (FailureEvents): Event store.
+        climate (pd.DataFrame): Daily series indexed by date (missing days are allowed).
+        before (int): Days before the origin to include (for the windows and lags of the first days).
+        maxGap (int): Max days since the last observation, older ones are NaN. Default is None (no limit).
+    Returns:
+        np.ndarray: Values (before + days, variables), NaN before the first observation.
+    """
+    dates = pd.date_range(events.origin - pd.Timedelta(days=before), periods=before + events.counts.shape[0],
+                          freq='D').to_numpy()
+    obs = climate.index.tz_localize(None).normalize().to_numpy() if climate.index.tz is not None else \
+        climate.index.normalize().to_numpy()
+    values = climate.to_numpy(dtype='float64')
+
+    pos = np.searchsorted(obs, dates, side='right') - 1
+    aligned = np.where(pos[:, None] >= 0, values[np.maximum(pos, 0)], np.nan)
+    if maxGap is not None:
+        gap = (dates - obs[np.maximum(pos, 0)]) // np.timedelta64(1, 'D')
+        aligned[gap > maxGap] = np.nan
+
+    return aligned
+
+def getRollingWindows(values:np.ndarray, windows:list[int], how:str='sum', minFraction:float=1)->np.ndarray:
+    """
+        Rolling sums or means of the daily series over several windows at once (windows ending on each day) from the
+        cumulative sums.
+    Args:
+        values (np.ndarray): Daily values (days, variables).
+        windows (list[int]): Lengths of the windows in days.
+        how (str): 'sum' or 'mean' (of the available days).
+        minFraction (float): Min fraction of the days of the window with values, otherwise NaN.
+    Returns:
+        np.ndarray: Values (windows, days, variables), NaN for the first days without a complete window.
+    """
+    valid = ~np.isnan(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    cumValues = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0), axis=0)])
+    cumValid = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+
+    days = values.shape[0]
+    result = np.full((len(windows),) + values.shape, np.nan)
+    for i, w in enumerate(windows):
+        if w > days:
+            continue
+        total = cumValues[w:] - cumValues[:-w]
+        n = cumValid[w:] - cumValid[:-w]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            res = total / n if how == 'mean' else total
+        result[i, w - 1:] = np.where(n >= minFraction * w, res, np.nan)
+
+    return result
+
+def getClimateAtEvents(events:FailureEvents, climate:pd.DataFrame, windows:list[int], how:str='sum',
+                       lag:int=0)->pd.DataFrame:
+    """
+        Rolling climate of each failure: window of each length ending lag days before the day of the failure.
+    Returns:
+        pd.DataFrame: One row per failure (in the order of the store) with COMPKEY, date and one column per variable
+        and window ('<variable> <window>d').
+    """
+    before = max(windows) - 1 + lag
+    rolled = getRollingWindows(alignClimate(events, climate, before), windows, how)
+    values = rolled[:, events.day + before - lag]
+
+    table = pd.DataFrame({WC.COMPKEY: events.compkey, WC.ADDDTTM: events.origin + pd.to_timedelta(events.day, unit='D')})
+    for i, w in enumerate(windows):
+        for j, var in enumerate(climate.columns):
+            table[var + ' ' + str(w) + 'd'] = values[i, :, j]
+
+    return table
+
+def getLaggedCorrelations(events:FailureEvents, climate:pd.DataFrame, windows:list[int], lags:list[int],
+                          by:list[str]=[WC.MATERIAL], how:str='sum')->pd.DataFrame:
+    """
+        Pearson correlation of the daily failures of each group with the rolling climate of each variable, window and
+        lag (window ending lag days before), for all of them at once over the days with values.
+    Args:
+        events (FailureEvents): Event store.
+        climate (pd.DataFrame): Daily climate series.
+        windows (list[int]): Lengths of the windows in days.
+        lags (list[int]): Lags in days (>= 0).
+        by (list[str]): Groups of the failures.
+        how (str): 'sum' or 'mean' of the window.
+    Returns:
+        pd.DataFrame: Correlation per variable, window and lag (rows) and group (columns).
+    """
+    daily = getDailyCounts(events, by)
+    counts = daily.to_numpy(dtype='float64')
+    before = max(windows) - 1 + max(lags)
+    rolled = getRollingWindows(alignClimate(events, climate, before), windows, how)
+
+    rows, index = [], []
+    for lag in lags:
+        #climate of lag days before each day
+        x = rolled[:, before - lag:before - lag + counts.shape[0]]
+        for j, var in enumerate(climate.columns):
+            xv = x[:, :, j]
+            valid = ~np.isnan(xv)
+            n = valid.sum(axis=1)[:, None]
+            xz = np.where(valid, xv, 0)
+            #means and covariances over the valid days of each window
+            mx = xz.sum(axis=1)[:, None] / n
+            my = (valid.astype('float64') @ counts) / n
+            sxy = xz @ counts / n - mx * my
+            sxx = (xz**2).sum(axis=1)[:, None] / n - mx**2
+            syy = (valid.astype('float64') @ counts**2) / n - my**2
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rows.append(sxy / np.sqrt(sxx * syy))
+            index += [(var, w, lag) for w in windows]
+
+    return pd.DataFrame(np.vstack(rows), index=pd.MultiIndex.from_tuples(index, names=['Variable', 'Window', 'Lag']),
+                        columns=daily.columns)
@@ -0,0 +1,336 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import FailuresCache as fc
+import FailureRateCube as FRC
+import GetFailures as gf
+import SpatialJoins as SJ
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+import Files as FILES
+
+
+FEATURES_DIR = 'Cache/Features'
+FEATURES_FILE = 'features.parquet'
+
+MATERIALS_PREDOMI = [WC.AC, WC.PVC, DAC.IRON, WC.PE]
+
+#Features of the pipes (names of joinWithValues of the forest notebook)
+TARGET = 'Failed'
+WEIGHT = 'weights'
+NUMERIC_FEATURES = ['Diameter', 'MaxPressure', 'PressureFluc', 'Current age', WC.LENG, 'LAT', 'LONG']
+CATEGORICAL_FEATURES = ['Material', 'SoilMainRock', 'Suburb']
+
+#Valid ranges of the diameter and the pressures (Diam_bins and PressMax_bins of the notebook)
+DIAMETER_RANGE = (25, 800)
+PRESSURE_RANGE = (20, 120)
+MAX_PRESSURE_DISTANCE = 1
+
+#Hyperparameters of the models (same number of trees as create_RForestmodel and create_GradientBoostedModel)
+MODELS = {'RandomForest': {'n_estimators': 900},
+          'GradientBoosted': {'max_iter': 900, 'max_depth': 10, 'learning_rate': 0.05}}
+
+PROBABILITY = 'Failure probability'
+
+#Most categories of a categorical feature (HistGradientBoosting accepts up to 255), the rare ones are lumped in OTHER
+MAX_CATEGORIES = 255
+
+#Limits of the native thread pools of the process (kept so they are not restored)
+_LIMITS = {}
+
+
+def readCoordinates(fname:str=FILES.COORDINATES)->pd.DataFrame:
+    """
+        Coordinates of the middle point of the GIS pipes (as getCoordinates).
+    """
+    GISPipesCoord = pd.read_csv(fname, delimiter = ',', dtype = {WC.COMPKEY:'int64', 'LAT':'float64', 'LONG':'float64'},
+                                usecols=[3,24,25], index_col=[WC.COMPKEY])
+
+    return GISPipesCoord.groupby(GISPipesCoord.index).agg({'LAT': 'first', 'LONG': 'first'})
+
+def buildFeatureMatrix(pipes:pd.DataFrame, pressures:pd.DataFrame, geounits:pd.DataFrame, coordinates:pd.DataFrame,
+                       assets:pd.DataFrame)->pd.DataFrame:
+    """
+        Feature matrix of the pipes of the predominant materials (as joinWithValues of the forest notebook): diameter,
+        age and material validated, pressures of nodes near the pipe, coordinates, suburb and main rock. Pipes with
+        an invalid or missing value are removed.
+    Args:
+        pipes (pd.DataFrame): GIS pipes with the number of failures (getFailures).
+        pressures (pd.DataFrame): Pressures per COMPKEY (SpatialJoins.readPressureJoin or getNearestPressures).
+        geounits (pd.DataFrame): Main rock per COMPKEY (SpatialJoins.readGeounitsJoin or getGeounits).
+        coordinates (pd.DataFrame): LAT and LONG per COMPKEY (readCoordinates).
+        assets (pd.DataFrame): Assets with the SUBURB (getAssetsRecords).
+    Returns:
+        pd.DataFrame: Features (float32 and categoricals), Failed and weights per COMPKEY.
+    """
+    df = pipes[pipes[WC.MATERIAL].isin(MATERIALS_PREDOMI)]
+    df = df[[WC.LENG, WC.NOM_DIA_MM, DAC.CURRENT_AGE, WC.MATERIAL, DAC.NUM_FAILURES]].copy()
+    print("Pipes of the predominant materials ", df.shape[0])
+
+    #intrinsic values: diameter in the bins and age in the validity window of the material
+    df[WC.NOM_DIA_MM] = df[WC.NOM_DIA_MM].where(df[WC.NOM_DIA_MM].gt(DIAMETER_RANGE[0])
+                                                & df[WC.NOM_DIA_MM].le(DIAMETER_RANGE[1]))
+    windows = FRC.getValidityWindows(MATERIALS_PREDOMI).reindex(df[WC.MATERIAL].astype('object'))
+    age = df[DAC.CURRENT_AGE]
+    df[DAC.CURRENT_AGE] = age.where(~(age.to_numpy() > windows['StartAge'].to_numpy())
+                                    & ~(age.to_numpy() < windows['EndAge'].to_numpy()))
+
+    #pressures of a node near the pipe in the valid range
+    press = pressures[pressures[SJ.DISTANCE] < MAX_PRESSURE_DISTANCE]
+    df = df.join(press[['MOD_MAXPRE', 'Press_fluc']])
+    df['MOD_MAXPRE'] = df['MOD_MAXPRE'].where(df['MOD_MAXPRE'].gt(PRESSURE_RANGE[0])
+                                              & df['MOD_MAXPRE'].le(PRESSURE_RANGE[1]))
+
+    df = df.join(coordinates[['LAT', 'LONG']]).join(assets[[WC.SUBURB]]).join(geounits[[SJ.MAIN_ROCK]])
+    df = df.dropna()
+    print("Pipes with all the features ", df.shape[0])
+
+    features = pd.DataFrame({'Diameter': df[WC.NOM_DIA_MM], 'MaxPressure': df['MOD_MAXPRE'],
+                             'PressureFluc': df['Press_fluc'], 'Current age': df[DAC.CURRENT_AGE],
+                             WC.LENG: df[WC.LENG], 'LAT': df['LAT'], 'LONG': df['LONG']}).astype('float32')
+    for col, values in zip(CATEGORICAL_FEATURES, [df[WC.MATERIAL], df[SJ.MAIN_ROCK], df[WC.SUBURB]]):
+        features[col] = lumpRareCategories(values.astype('str'))
+
+    #balanced weights of the classes (as getBaseRandomForest)
+    features[TARGET] = (df[DAC.NUM_FAILURES] > 0).astype('int8')
+    counts = features[TARGET].value_counts()
+    features[WEIGHT] = features[TARGET].map(features.shape[0] / 2.0 / counts).astype('float32')
+
+    return features
+
+def lumpRareCategories(values:pd.Series, maxCategories:int=MAX_CATEGORIES)->pd.Series:
+    """
+        Categorical with the maxCategories - 1 most frequent values (by number of pipes) and the rest as Other, so the
+        codes are the same for every material and below the limit of HistGradientBoosting (e.g. the suburbs).
+    """
+    counts = values.value_counts()
+    if counts.size > maxCategories:
+        values = values.where(values.isin(counts.index[:maxCategories - 1]), DAC.OTHER)
+
+    return values.astype('category')
+
+def getFeaturesInputs(fname:str)->list[str]:
+    """
+        Files read to build the feature matrix (the inputs of getFailures, the joins and this code).
+    """
+    return fc.getFailuresInputs(fname) + [FILES.PRESSURE_JOIN, FILES.GEOUNITS, FILES.GEOUNITS_PIPES_IDS,
+                                          FILES.GEOUNITS_PIPES_JOIN, FILES.COORDINATES, __file__]
+
+def getFeatureMatrix(fname:str=FILES.WORK_ORDERS, cacheDir:str=FEATURES_DIR, rebuild:bool=False)->pd.DataFrame:
+    """
+        Feature matrix of the pipes materialised in parquet, keyed by the hashes of the input files. It is only built
+        again if an input changed.
+    Args:
+        fname (str): Work orders file.
+        cacheDir (str): Directory of the cache.
+        rebuild (bool): If True, the matrix is built again even if it is in the cache.
+    Returns:
+        pd.DataFrame: Features, Failed and weights per COMPKEY.
+    """
+    key = fc.getInputsKey(getFeaturesInputs(fname), cacheDir)
+    fFeatures = os.path.join(cacheDir, key, FEATURES_FILE)
+
+    if not rebuild and os.path.exists(fFeatures):
+        print("Loading the feature matrix from the cache ", key)
+        return fc.loadTable(fFeatures)
+
+    pipes, _ = fc.getFailuresCached(fname)
+    features = buildFeatureMatrix(pipes, SJ.readPressureJoin(), SJ.readGeounitsJoin(), readCoordinates(),
+                                  gf.getAssetsRecords())
+
+    os.makedirs(os.path.dirname(fFeatures), exist_ok=True)
+    fc.saveTable(features, fFeatures)
+
+    return features
+
+def toArrays(features:pd.DataFrame)->tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Features as a float32 matrix (categoricals as their codes), target and weights.
+    """
+    cols = [features[c].to_numpy(dtype='float32') for c in NUMERIC_FEATURES]
+    cols += [features[c].cat.codes.to_numpy(dtype='float32') for c in CATEGORICAL_FEATURES]
+
+    return np.column_stack(cols), features[TARGET].to_numpy(), features[WEIGHT].to_numpy()
+
+def createModel(name:str, seed:int=0, jobs:int=-1):
+    """
+        CPU model of the notebook models: random forest or histogram gradient boosted trees (categorical features
+        as categories). scikit-learn is only needed for the models.
+    Args:
+        name (str): Model of MODELS.
+        seed (int): Random state.
+        jobs (int): Threads of the random forest (-1 all the cores).
+    """
+    from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+
+    if name == 'RandomForest':
+        return RandomForestClassifier(**MODELS[name], n_jobs=jobs, random_state=seed)
+
+    categorical = np.arange(len(NUMERIC_FEATURES), len(NUMERIC_FEATURES) + len(CATEGORICAL_FEATURES))
+    return HistGradientBoostingClassifier(**MODELS[name], categorical_features=categorical, random_state=seed)
+
+def getMetrics(y:np.ndarray, probability:np.ndarray, p:float=0.5)->dict:
+    """
+        Metrics of the notebook models: AUC, area under the precision-recall curve, accuracy, precision and recall.
+    """
+    from sklearn import metrics
+
+    predicted = probability > p
+    return {'auc': metrics.roc_auc_score(y, probability), 'prc': metrics.average_precision_score(y, probability),
+            'accuracy': metrics.accuracy_score(y, predicted),
+            'precision': metrics.precision_score(y, predicted, zero_division=0),
+            'recall': metrics.recall_score(y, predicted, zero_division=0)}
+
+def limitThreads(threads:int=1):
+    """
+        Limits the OpenMP and BLAS threads of the process (HistGradientBoosting uses all the cores by default), so the
+        folds run in parallel do not oversubscribe the cores. Used as initializer of the pool.
+    """
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+
+    #the limits only apply to the libraries already loaded
+    import sklearn.ensemble
+    from threadpoolctl import threadpool_limits
+    _LIMITS['threads'] = threadpool_limits(limits=threads)
+
+def trainFold(args:tuple)->tuple[str,int,np.ndarray,dict]:
+    """
+        Trains and evaluates the model of one fold (one thread per model as the pool limits the threads, the folds run
+        in parallel). Used by the process pool.
+    Returns:
+        tuple[str,int,np.ndarray,dict]: Material, fold, probabilities of the test rows and metrics.
+    """
+    material, fold, name, X, y, w, train, test, seed = args
+
+    model = createModel(name, seed, jobs=1)
+    model.fit(X[train], y[train], sample_weight=w[train])
+    probability = model.predict_proba(X[test])[:, 1]
+
+    return material, fold, probability, getMetrics(y[test], probability)
+
+def crossValidate(features:pd.DataFrame, name:str='RandomForest', k:int=5, workers:int=None, seed:int=0,
+                  threads:int=1)->tuple[pd.DataFrame, pd.Series]:
+    """
+        Stratified k-fold cross validation of one model per material, all the folds of all the materials in parallel
+        over a process pool.
+    Args:
+        features (pd.DataFrame): Feature matrix (getFeatureMatrix).
+        name (str): Model of MODELS.
+        k (int): Number of folds.
+        workers (int): Number of processes. Default is None (number of CPUs).
+        seed (int): Seed of the folds and the models.
+        threads (int): Threads of each process (workers x threads should not exceed the cores).
+    Returns:
+        tuple[pd.DataFrame, pd.Series]: Metrics per material and fold, and out of fold probability per pipe.
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    tasks, rows = [], {}
+    for material in MATERIALS_PREDOMI:
+        dfM = features[features['Material'] == material]
+        if dfM[TARGET].nunique() < 2:
+            continue
+        X, y, w = toArrays(dfM)
+        rows[material] = dfM.index
+        folds = StratifiedKFold(n_splits=k, shuffle=True, random_state=seed).split(X, y)
+        tasks += [(material, i, name, X, y, w, train, test, seed) for i, (train, test) in enumerate(folds)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=limitThreads, initargs=(threads,)) as pool:
+        results = list(pool.map(trainFold, tasks))
+
+    oof = pd.Series(np.nan, index=features.index, name=PROBABILITY)
+    for (material, _, _, _, _, _, _, test, _), (_, _, probability, _) in zip(tasks, results):
+        oof.loc[rows[material][test]] = probability
+
+    metrics = pd.DataFrame([dict(Material=m, Fold=f, **res) for m, f, _, res in results]).set_index(['Material', 'Fold'])
+
+    return metrics, oof
+
+def trainModels(features:pd.DataFrame, name:str='RandomForest', seed:int=0)->dict:
+    """
+        Trains the model of each material with all its pipes (using all the cores).
+    Returns:
+        dict: Model per material.
+    """
+    models = {}
+    for material in MATERIALS_PREDOMI:
+        dfM = features[features['Material'] == material]
+        if dfM[TARGET].nunique() < 2:
+            continue
+        X, y, w = toArrays(dfM)
+        models[material] = createModel(name, seed).fit(X, y, sample_weight=w)
+
+    return models
+
+def scorePipes(models:dict, features:pd.DataFrame, pipes:pd.DataFrame=None, chunkSize:int=200000)->pd.Series:
+    """
+        Failure probability of every pipe of the feature matrix with the model of its material, predicted in chunks
+        (the models use all the cores). The pipes that are not in the feature matrix (other materials or a missing or
+        invalid feature) are not scored.
+    Args:
+        models (dict): Model per material (trainModels).
+        features (pd.DataFrame): Feature matrix.
+        pipes (pd.DataFrame): GIS pipes indexed by COMPKEY (getFailures). Default is None (only the pipes of the
+            feature matrix).
+        chunkSize (int): Pipes per prediction.
+    Returns:
+        pd.Series: Failure probability per COMPKEY of the pipes (NaN for the pipes not scored).
+    """
+    scores = pd.Series(np.nan, index=features.index, name=PROBABILITY)
+    X, _, _ = toArrays(features)
+    material = features['Material'].to_numpy()
+
+    for m, model in models.items():
+        rows = np.flatnonzero(material == m)
+        for start in range(0, rows.size, chunkSize):
+            chunk = rows[start:start + chunkSize]
+            scores.iloc[chunk] = model.predict_proba(X[chunk])[:, 1]
+
+    if pipes is not None:
+        scores = scores.reindex(pipes.index)
+    print("Pipes scored ", scores.notna().sum(), " of ", scores.shape[0], ". Not scored: ", scores.isna().sum())
+
+    return scores
+
+def runPipeline(fname:str=FILES.WORK_ORDERS, name:str='RandomForest', k:int=5, workers:int=None,
+                features:pd.DataFrame=None,
+                pipes:pd.DataFrame=None)->tuple[dict, pd.DataFrame, pd.Series, pd.DataFrame]:
+    """
+        Feature matrix (cached), cross validation, training and scoring of all the pipes, with the time of each stage.
+    Args:
+        fname (str): Work orders file.
+        name (str): Model of MODELS.
+        k (int): Number of folds.
+        workers (int): Number of processes of the cross validation.
+        features (pd.DataFrame): Feature matrix. Default is None (getFeatureMatrix).
+        pipes (pd.DataFrame): GIS pipes that are scored. Default is None (getFailuresCached).
+    Returns:
+        tuple[dict, pd.DataFrame, pd.Series, pd.DataFrame]: Models, cross validation metrics, failure probability per
+        GIS pipe (NaN for the pipes not in the feature matrix) and seconds and rows of each stage.
+    """
+    report = []
+
+    def timed(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        report.append({'Stage': stage, 'Seconds': time.perf_counter() - start, 'Rows': features.shape[0]})
+        print(stage, " finished in ", "%.2f" % report[-1]['Seconds'], " s")
+        return result
+
+    if features is None:
+        start = time.perf_counter()
+        features = getFeatureMatrix(fname)
+        report.append({'Stage': 'Features', 'Seconds': time.perf_counter() - start, 'Rows': features.shape[0]})
+
+    metrics, _ = timed('Cross validation', crossValidate, features, name, k, workers)
+    models = timed('Training', trainModels, features, name)
+    pipes = fc.getFailuresCached(fname)[0] if pipes is None else pipes
+    scores = timed('Scoring', scorePipes, models, features, pipes)
+
+    print(metrics.groupby(level=0).mean())
+
+    return models, metrics, scores, pd.DataFrame(report).set_index('Stage')
@@ -0,0 +1,161 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import Schema as SCHEMA
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+import Files as FILES
+
+
+#Ranges of the dimensions of the cube: column of the pipe table, bins and labels (same as the notebooks)
+RANGES = {DAC.LBL_CURRENT_AGE: (DAC.CURRENT_AGE, np.arange(0, 115, 5).tolist(), [str(i) for i in np.arange(0, 110, 5)]),
+          DAC.LBL_DIAMETER: (WC.NOM_DIA_MM, [25, 75, 115, 135, 165, 190, 225, 275, 800],
+                             ['50', '100', '125', '150', '175', '200', '250', '>300']),
+          DAC.LBL_MAX_PRE: ('MOD_MAXPRE', [20, 50, 60, 70, 80, 90, 120],
+                            ['(20,50]', '(50,60]', '(60,70]', '(70,80]', '(80,90]', '(90,120]']),
+          DAC.LBL_PRE_FLU: ('Press_fluc', [0, 3, 6, 9, 12, 15, 20, 35],
+                            ['(0,3]', '(3,6]', '(6,9]', '(9,12]', '(12,15]', '(15,20]', '(20,35]'])}
+
+#Categorical dimensions of the cube: column of the pipe table
+CATEGORIES = {WC.MATERIAL: WC.MATERIAL,
+              DAC.GEOUNIT: 'main_rock'}
+
+DIMENSIONS = [WC.MATERIAL, DAC.LBL_CURRENT_AGE, DAC.LBL_DIAMETER, DAC.LBL_MAX_PRE, DAC.LBL_PRE_FLU, DAC.GEOUNIT]
+
+#Validity windows of the materials (Const-Materials.csv) applied to each range dimension: columns of the lower and upper
+#limits. The ages of the windows are calculated from the years of the file with AGES_REFERENCE_YEAR.
+VALIDITY = {DAC.LBL_CURRENT_AGE: ('EndAge', 'StartAge'),
+            DAC.LBL_DIAMETER: ('MinD', 'MaxD')}
+AGES_REFERENCE_YEAR = 2021
+
+YEARS_OF_RECORDS = 6
+
+
+class FailureCube(NamedTuple):
+    """
+        Summed length (km) and number of failures of the pipes per combination of the ranges of the dimensions. The
+        last position of each dimension has the pipes without a valid range in that dimension (missing, out of the bins
+        or out of the validity window of its material), so every marginal only excludes the invalid values of its own
+        dimensions.
+    """
+    dims: list[str]
+    labels: dict[str, list[str]]
+    length: np.ndarray
+    failures: np.ndarray
+    years: float
+
+
+def getValidityWindows(materials:list[str])->pd.DataFrame:
+    """
+        Validity windows of the materials: ages (EndAge, StartAge) and diameters (MinD, MaxD) from Const-Materials.csv.
+    Args:
+        materials (list[str]): Materials of the cube.
+    Returns:
+        pd.DataFrame: Limits per material (NaN is no limit).
+    """
+    consts = pd.read_csv(FILES.MAT_CONSTS, delimiter = ',', index_col=[WC.MATERIAL])
+
+    windows = pd.DataFrame({'StartAge': AGES_REFERENCE_YEAR - consts['YearIni'],
+                            'EndAge': (AGES_REFERENCE_YEAR - consts['YearFinal']).replace(0, np.nan),
+                            'MinD': consts['MinD'], 'MaxD': consts['MaxD']})
+
+    return windows.reindex(materials)
+
+def getCodes(pipes:pd.DataFrame, dim:str)->tuple[np.ndarray, list[str]]:
+    """
+        Position of each pipe in a dimension (-1 for the pipes without a valid value) and the labels of the dimension.
+    """
+    if dim in CATEGORIES:
+        values = pipes[CATEGORIES[dim]]
+        if dim == WC.MATERIAL:
+            values = values if isinstance(values.dtype, pd.CategoricalDtype) else SCHEMA.normaliseMaterials(values)
+        else:
+            values = values.astype('category')
+        return values.cat.codes.to_numpy(), list(values.cat.categories)
+
+    col, bins, labels = RANGES[dim]
+    #right closed intervals as pd.cut
+    values = pd.to_numeric(pipes[col], errors='coerce').to_numpy(dtype='float64')
+    codes = np.searchsorted(bins, values, side='left') - 1
+    codes[(codes < 0) | (codes >= len(labels)) | np.isnan(values)] = -1
+
+    return codes, list(labels)
+
+def buildCube(pipes:pd.DataFrame, dims:list[str]=DIMENSIONS, years:float=YEARS_OF_RECORDS,
+              validate:bool=True)->FailureCube:
+    """
+        Bins the pipe table (with pressures and geounits) in all the dimensions at once and sums the length and the
+        failures of each cell.
+    Args:
+        pipes (pd.DataFrame): Pipes with Shape_Leng (km), Num of failures and the columns of the dimensions.
+        dims (list[str]): Dimensions of the cube (MATERIAL is needed for the validity windows).
+        years (float): Years of failure records.
+        validate (bool): If True, the values out of the validity window of the material of the pipe are invalid.
+    Returns:
+        FailureCube: Length and failures per cell.
+    """
+    codes, labels = [], {}
+    for dim in dims:
+        c, labels[dim] = getCodes(pipes, dim)
+        codes.append(c)
+
+    if validate and WC.MATERIAL in dims:
+        matCodes = codes[dims.index(WC.MATERIAL)]
+        windows = getValidityWindows(labels[WC.MATERIAL])
+        for dim, (lower, upper) in VALIDITY.items():
+            if dim not in dims:
+                continue
+            #limits of the material of each pipe (pipes without material get no limits)
+            lo = np.append(windows[lower].to_numpy(dtype='float64'), np.nan)[matCodes]
+            hi = np.append(windows[upper].to_numpy(dtype='float64'), np.nan)[matCodes]
+            values = pd.to_numeric(pipes[RANGES[dim][0]], errors='coerce').to_numpy(dtype='float64')
+            codes[dims.index(dim)][(values < lo) | (values > hi)] = -1
+
+    #invalid values go to the last position of each dimension
+    shape = tuple(len(labels[dim]) + 1 for dim in dims)
+    codes = [np.where(c < 0, n - 1, c) for c, n in zip(codes, shape)]
+    cells = np.ravel_multi_index(codes, shape)
+
+    size = int(np.prod(shape))
+    length = np.bincount(cells, weights=pipes[WC.LENG].to_numpy(dtype='float64'), minlength=size).reshape(shape)
+    failures = np.bincount(cells, weights=pipes[DAC.NUM_FAILURES].to_numpy(dtype='float64'), minlength=size).reshape(shape)
+
+    return FailureCube(list(dims), labels, length, failures, years)
+
+def getMarginal(cube:FailureCube, dims:list[str], minPercentage:float=None)->pd.DataFrame:
+    """
+        Length, failures and failure rate per combination of the ranges of one or more dimensions (as groupByFactor or
+        groupByTwoFactorsCalibration of the notebooks). Only the pipes with valid values in these dimensions are used.
+    Args:
+        cube (FailureCube): Cube of the pipes.
+        dims (list[str]): Dimensions of the marginal, e.g. [MATERIAL, LBL_CURRENT_AGE].
+        minPercentage (float): If given, the failure rates of the cells with less than this % of the length of the
+            first dimension are NaN.
+    Returns:
+        pd.DataFrame: Shape_Leng, Num of failures, % and Failures/Km/year per cell (only cells with length).
+    """
+    axes = tuple(cube.dims.index(dim) for dim in dims)
+    others = tuple(i for i in range(len(cube.dims)) if i not in axes)
+    valid = tuple(slice(None, -1) if i in axes else slice(None) for i in range(len(cube.dims)))
+
+    length = cube.length[valid].sum(axis=others)
+    failures = cube.failures[valid].sum(axis=others)
+
+    #sum reorders the kept axes as in the cube
+    order = np.argsort(np.argsort(axes))
+    length, failures = np.transpose(length, order), np.transpose(failures, order)
+
+    index = pd.MultiIndex.from_product([cube.labels[dim] for dim in dims], names=dims)
+    dfGroup = pd.DataFrame({WC.LENG: length.ravel(), DAC.NUM_FAILURES: failures.ravel()}, index=index)
+    dfGroup = dfGroup[dfGroup[WC.LENG] > 0].copy()
+
+    #percentage of shape leng per value of the first dimension
+    dfGroup['%'] = (dfGroup[WC.LENG] * 100 / dfGroup.groupby(level=0)[WC.LENG].transform('sum')).round(2)
+    dfGroup[DAC.FAILURE_RATE] = dfGroup[DAC.NUM_FAILURES] / dfGroup[WC.LENG] / cube.years
+
+    if minPercentage is not None:
+        dfGroup[DAC.FAILURE_RATE] = dfGroup[DAC.FAILURE_RATE].where(dfGroup['%'] > minPercentage, np.nan)
+
+    return dfGroup
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+import BatchRegression as BR
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+
+
+N_REPLICATES = 10000
+
+#Max number of values drawn at once (bounds the memory of the replicates, ~24 bytes per value)
+CHUNK_ELEMENTS = 5000000
+
+
+def getPercentiles(draw, nBins:int, nBoot:int, alpha:float, chunkElements:int)->tuple[np.ndarray,np.ndarray]:
+    """
+        Percentile interval of the replicates of each bin. The bins are processed in blocks so only the replicates of
+        one block (nBoot x bins of the block) are in memory.
+    Args:
+        draw (function): Returns the replicates (nBoot, bins) of the failure rates of a block of bins (array of bins).
+        nBins (int): Number of bins.
+        nBoot (int): Number of replicates.
+        alpha (float): Significance of the intervals.
+        chunkElements (int): Max number of replicates in memory.
+    Returns:
+        tuple[np.ndarray,np.ndarray]: Low and high limits per bin.
+    """
+    low, high = np.full(nBins, np.nan), np.full(nBins, np.nan)
+    step = max(1, chunkElements // nBoot)
+
+    for start in range(0, nBins, step):
+        block = np.arange(start, min(start + step, nBins))
+        rates = draw(block)
+        low[block], high[block] = np.percentile(rates, [alpha/2 * 100, (1 - alpha/2) * 100], axis=0)
+
+    return low, high
+
+def getPoissonIntervals(dfGroup:pd.DataFrame, years:float, nBoot:int=N_REPLICATES, alpha:float=0.05, seed:int=0,
+                        chunkElements:int=CHUNK_ELEMENTS)->pd.DataFrame:
+    """
+        Poisson bootstrap intervals of the failure rates of a grouped table (getFailureRatesByMaterial, groupByFactor,
+        groupByTwoFactorsCalibration or getMarginal): the number of failures of each bin is drawn nBoot times from a
+        Poisson with its observed number as mean, all the bins at once.
+    Args:
+        dfGroup (pd.DataFrame): Grouped table with Shape_Leng (km) and Num of failures.
+        years (float): Years of failure records used for the failure rate (6 in the notebooks).
+        nBoot (int): Number of replicates.
+        alpha (float): Significance of the intervals.
+        seed (int): Seed of the replicates.
+        chunkElements (int): Max number of replicates in memory.
+    Returns:
+        pd.DataFrame: Copy of the table with the columns Failures/Km/year low and high (NaN for bins without length).
+    """
+    failures = dfGroup[DAC.NUM_FAILURES].to_numpy(dtype='float64')
+    length = dfGroup[WC.LENG].to_numpy(dtype='float64')
+    rng = np.random.default_rng(seed)
+
+    def draw(block):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return rng.poisson(failures[block], size=(nBoot, block.size)) / length[block] / years
+
+    dfGroup = dfGroup.copy()
+    dfGroup[DAC.FAILURE_RATE_LOW], dfGroup[DAC.FAILURE_RATE_HIGH] = getPercentiles(draw, len(dfGroup), nBoot, alpha,
+                                                                                   chunkElements)
+    return dfGroup
+
+def getPipeBootstrapIntervals(pipes:pd.DataFrame, by:list[str], years:float, nBoot:int=N_REPLICATES, alpha:float=0.05,
+                              seed:int=0, chunkElements:int=CHUNK_ELEMENTS)->pd.DataFrame:
+    """
+        Pipe-level bootstrap intervals of the failure rates per bin: the pipes of each bin are resampled with
+        replacement and the failure rate of each replicate is its failures over its length. The replicates are drawn
+        in chunks of at most chunkElements pipes, so the time grows with pipes x replicates (getPoissonIntervals is
+        the fast option for the whole network).
+    Args:
+        pipes (pd.DataFrame): Pipes with Shape_Leng (km), Num of failures and the columns of the bins (e.g. MATERIAL
+            and the ranges added by putInRanges).
+        by (list[str]): Columns or levels of the bins.
+        years (float): Years of failure records.
+        nBoot (int): Number of replicates.
+        alpha (float): Significance of the intervals.
+        seed (int): Seed of the replicates.
+        chunkElements (int): Max number of resampled pipes in memory.
+    Returns:
+        pd.DataFrame: Shape_Leng, Num of failures, Failures/Km/year, low and high per bin.
+    """
+    data = pipes.reset_index()
+    data = data[data[by].notna().all(axis=1)]
+    codes, bins = BR.getSegmentCodes(data, by)
+
+    #pipes sorted by bin so each bin is a block of rows
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    failures = data[DAC.NUM_FAILURES].to_numpy(dtype='float64')[order]
+    length = data[WC.LENG].to_numpy(dtype='float64')[order]
+    counts = np.bincount(codes, minlength=len(bins))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rng = np.random.default_rng(seed)
+
+    def draw(block):
+        rates = np.empty((nBoot, block.size))
+        for j, b in enumerate(block):
+            step = max(1, chunkElements // counts[b])
+            for r in range(0, nBoot, step):
+                #the pipes of the bin resampled with replacement
+                idx = rng.integers(starts[b], starts[b] + counts[b], size=(min(step, nBoot - r), counts[b]))
+                rates[r:r + step, j] = failures[idx].sum(axis=1) / length[idx].sum(axis=1) / years
+
+        return rates
+
+    dfGroup = pd.DataFrame({WC.LENG: np.bincount(codes, weights=length, minlength=len(bins)),
+                            DAC.NUM_FAILURES: np.bincount(codes, weights=failures, minlength=len(bins))}, index=bins)
+    dfGroup[DAC.FAILURE_RATE] = dfGroup[DAC.NUM_FAILURES] / dfGroup[WC.LENG] / years
+    dfGroup[DAC.FAILURE_RATE_LOW], dfGroup[DAC.FAILURE_RATE_HIGH] = getPercentiles(draw, len(bins), nBoot, alpha,
+                                                                                   chunkElements)
+    return dfGroup
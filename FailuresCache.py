@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+import GetFailures as gf
+import AddressIndex as AI
+import Schema as SCHEMA
+import WatercareConstants as WC
+import DataAnalysisConstants as DAC
+import Files as FILES
+
+
+CACHE_DIR = 'Cache/Failures'
+HASHES_FILE = 'fileHashes.json'
+MAX_CACHE_BYTES = 2 * 1024**3 #2 GB
+
+#Tables of getFailures in the order they are returned
+TABLES = ['wPipesGISNfailures', 'mainFailures']
+
+
+def getFileHash(fname:str, knownHashes:dict=None)->str:
+    """
+        Hash (sha1) of the content of a file. If the size and modification time of the file are the same as in
+        knownHashes, the known hash is reused instead of reading the file again.
+    Args:
+        fname (str): File name.
+        knownHashes (dict): Hashes of previous calls by file name, it is updated with the new hash.
+    Returns:
+        str: hex digest of the file content.
+    """
+    stat = os.stat(fname)
+    known = None if knownHashes is None else knownHashes.get(os.path.abspath(fname))
+
+    if known is not None and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns:
+        return known['hash']
+
+    h = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            h.update(block)
+
+    if knownHashes is not None:
+        knownHashes[os.path.abspath(fname)] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': h.hexdigest()}
+
+    return h.hexdigest()
+
+def getInputsKey(fnames:list[str], cacheDir:str=CACHE_DIR)->str:
+    """
+        Key of a version of the cache: hash of the content of all the input files (and the code that processes them).
+    Args:
+        fnames (list[str]): Input files.
+        cacheDir (str): Directory of the cache, it keeps the known hashes of the files.
+    Returns:
+        str: Key of the version.
+    """
+    fHashes = os.path.join(cacheDir, HASHES_FILE)
+    knownHashes = {}
+    if os.path.exists(fHashes):
+        with open(fHashes) as f:
+            knownHashes = json.load(f)
+
+    h = hashlib.sha1()
+    for fname in fnames:
+        h.update(os.path.basename(fname).encode())
+        h.update(getFileHash(fname, knownHashes).encode())
+
+    os.makedirs(cacheDir, exist_ok=True)
+    with open(fHashes, 'w') as f:
+        json.dump(knownHashes, f)
+
+    return h.hexdigest()
+
+def getFailuresInputs(fname:str)->list[str]:
+    """
+        Files read by getFailures: work orders, assets, GIS pipes and filter tables, plus the code of GetFailures and of
+        the modules its output depends on (address index, schema and constants).
+    """
+    return [fname, FILES.ASSETS1, FILES.ASSETS2, FILES.ASSETS3, FILES.WATER_PIPES, FILES.ACTCODE_REPAIR,
+            FILES.SR_PROB_FILTER, gf.__file__, AI.__file__, SCHEMA.__file__, WC.__file__, DAC.__file__]
+
+def saveTable(df:pd.DataFrame, fname:str):
+    """
+        Saves a table in parquet keeping its index.
+    """
+    df.to_parquet(fname + '.tmp', index=True)
+    os.replace(fname + '.tmp', fname)
+
+def loadTable(fname:str)->pd.DataFrame:
+    """
+        Loads a table saved with saveTable.
+    """
+    return pd.read_parquet(fname)
+
+def getFailuresCached(fname:str=FILES.WORK_ORDERS, cacheDir:str=CACHE_DIR, rebuild:bool=False,
+                      maxBytes:int=MAX_CACHE_BYTES)->tuple[pd.DataFrame,pd.DataFrame]:
+    """
+        Same as GetFailures.getFailures but the resulting tables are saved in parquet in a version of the cache keyed by
+        the hashes of the input files. If the inputs did not change, the tables are loaded from the cache (the current
+        age of the pipes is calculated again, it depends on the date and not on the inputs).
+    Args:
+        fname (str): Work orders file.
+        cacheDir (str): Directory of the cache.
+        rebuild (bool): If True, the tables are built again even if they are in the cache.
+        maxBytes (int): Maximum size of the cache, the oldest versions are removed to stay under it.
+    Returns:
+        tuple[pd.DataFrame,pd.DataFrame]: wPipesGISNfailures, mainFailures.
+    """
+    key = getInputsKey(getFailuresInputs(fname), cacheDir)
+    versionDir = os.path.join(cacheDir, key)
+    fTables = [os.path.join(versionDir, t + '.parquet') for t in TABLES]
+
+    if not rebuild and all(os.path.exists(f) for f in fTables):
+        print("Loading failures from the cache ", key)
+        os.utime(versionDir)
+        wPipesGISNfailures, mainFailures = (loadTable(f) for f in fTables)
+        return gf.setCurrentAge(wPipesGISNfailures), mainFailures
+
+    tables = gf.getFailures(fname)
+
+    os.makedirs(versionDir, exist_ok=True)
+    for df, f in zip(tables, fTables):
+        saveTable(df, f)
+
+    evictOldVersions(cacheDir, maxBytes, keep=key)
+
+    return tables
+
+def getVersions(cacheDir:str=CACHE_DIR)->pd.DataFrame:
+    """
+        Versions in the cache with their size and last use, from the most to the least recent.
+    """
+    versions = []
+    if os.path.isdir(cacheDir):
+        for key in os.listdir(cacheDir):
+            path = os.path.join(cacheDir, key)
+            if os.path.isdir(path):
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                versions.append([key, size, os.path.getmtime(path)])
+
+    versions = pd.DataFrame(versions, columns=['Key', 'Bytes', 'Last use']).sort_values('Last use', ascending=False)
+    versions['Last use'] = pd.to_datetime(versions['Last use'], unit='s')
+
+    return versions.set_index('Key')
+
+def evictOldVersions(cacheDir:str=CACHE_DIR, maxBytes:int=MAX_CACHE_BYTES, keep:str=None):
+    """
+        Removes the least recently used versions of the cache until its size is under maxBytes.
+    Args:
+        cacheDir (str): Directory of the cache.
+        maxBytes (int): Maximum size of the cache.
+        keep (str): Key of a version that is never removed.
+    """
+    versions = getVersions(cacheDir)
+    total = versions['Bytes'].sum()
+
+    for key, size in versions['Bytes'][::-1].items():
+        if total <= maxBytes:
+            break
+        if key != keep:
+            shutil.rmtree(os.path.join(cacheDir, key))
+            total -= size
+            print("Removed from the cache ", key)
+
+def invalidateCache(cacheDir:str=CACHE_DIR):
+    """
+        Removes all the versions and known hashes of the cache.
+    """
+    if os.path.isdir(cacheDir):
+        shutil.rmtree(cacheDir)
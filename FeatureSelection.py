@@ -0,0 +1,210 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import FailuresCache as fc
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+
+
+SELECTION_DIR = 'Cache/FeatureSelection'
+SCORES_FILE = 'scores.parquet'
+TRACE_FILE = 'Trace.csv'
+
+#Data of the workers of the pool (set once per process by setData)
+_DATA = {}
+
+
+def getDataKey(df:pd.DataFrame, target:str, weight:str, k:int, seed:int)->str:
+    """
+        Key of the rows and the folds of a selection: hash of the index of the rows used, the values of the target and
+        the weights, k and the seed. The features are part of the key of each subset (see getSubsetKey), so adding a
+        candidate that does not change the rows keeps the scores of the other subsets.
+    """
+    cols = [target] + ([weight] if weight is not None else [])
+    h = hashlib.sha1(pd.util.hash_pandas_object(df[cols], index=True).to_numpy().tobytes())
+    h.update(('|'.join(cols) + '|' + str(k) + '|' + str(seed)).encode())
+
+    return h.hexdigest()
+
+def getColumnHashes(df:pd.DataFrame, features:list[str])->dict[str, str]:
+    """
+        Hash of the values of each feature.
+    """
+    return {f: hashlib.sha1(pd.util.hash_pandas_object(df[f], index=False).to_numpy().tobytes()).hexdigest()
+            for f in features}
+
+def getSubsetKey(subset:list[str], columnHashes:dict[str, str])->str:
+    """
+        Hash of a set of features and their values (the order does not matter).
+    """
+    return hashlib.sha1('|'.join(f + '=' + columnHashes[f] for f in sorted(subset)).encode()).hexdigest()
+
+def getFolds(n:int, k:int, seed:int)->np.ndarray:
+    """
+        Fold of each row (shuffled k-fold).
+    """
+    return np.random.default_rng(seed).permutation(n) % k
+
+def setData(X:np.ndarray, y:np.ndarray, w:np.ndarray, folds:np.ndarray, columns:list[str]):
+    """
+        Keeps the data in the process so the tasks only send the subsets. Used as initializer of the pool.
+    """
+    _DATA.update(X=X, y=y, w=w, folds=folds, columns={c: i for i, c in enumerate(columns)})
+
+def scoreSubset(task:tuple[tuple[str, ...], int])->float:
+    """
+        Weighted R2 on the test rows of one fold of the weighted linear regression (with constant) of the target on
+        a subset of the features, fitted with the other folds.
+    Args:
+        task (tuple[tuple[str, ...], int]): Features of the subset and fold.
+    Returns:
+        float: R2 of the fold.
+    """
+    subset, fold = task
+    X, y, w, folds = _DATA['X'], _DATA['y'], _DATA['w'], _DATA['folds']
+    cols = [_DATA['columns'][c] for c in subset]
+
+    A = np.column_stack([np.ones(X.shape[0]), X[:, cols]])
+    train, test = folds != fold, folds == fold
+    sw = np.sqrt(w[train])
+    coef = np.linalg.lstsq(A[train] * sw[:, None], y[train] * sw, rcond=None)[0]
+
+    resid = y[test] - A[test] @ coef
+    mean = np.average(y[test], weights=w[test])
+
+    return 1 - np.sum(w[test] * resid**2) / np.sum(w[test] * (y[test] - mean)**2)
+
+def loadScores(cacheDir:str=SELECTION_DIR)->dict:
+    """
+        Scores already calculated by (data key, subset key, fold).
+    """
+    fScores = os.path.join(cacheDir, SCORES_FILE)
+    if not os.path.exists(fScores):
+        return {}
+
+    scores = fc.loadTable(fScores)
+    return dict(zip(zip(scores['Data'], scores['Subset'], scores['Fold']), scores['Score']))
+
+def saveScores(scores:dict, cacheDir:str=SELECTION_DIR):
+    """
+        Saves the scores of the subsets.
+    """
+    os.makedirs(cacheDir, exist_ok=True)
+    keys = list(scores.keys())
+    table = pd.DataFrame({'Data': [key[0] for key in keys], 'Subset': [key[1] for key in keys],
+                          'Fold': np.array([key[2] for key in keys], dtype='int64'),
+                          'Score': np.array(list(scores.values()), dtype='float64')})
+    fc.saveTable(table, os.path.join(cacheDir, SCORES_FILE))
+
+def evaluateSubsets(subsets:list[list[str]], dataKey:str, columnHashes:dict[str, str], k:int, scores:dict,
+                    pool:ProcessPoolExecutor)->tuple[np.ndarray, int]:
+    """
+        Mean score of the folds of each subset. Only the (subset, fold) pairs that are not in scores are evaluated,
+        over the pool, and added to scores.
+    Returns:
+        tuple[np.ndarray, int]: Mean score per subset and number of folds evaluated.
+    """
+    keys = [getSubsetKey(s, columnHashes) for s in subsets]
+    tasks = [(tuple(s), f) for s, key in zip(subsets, keys) for f in range(k) if (dataKey, key, f) not in scores]
+
+    if tasks:
+        chunk = max(1, len(tasks) // (4 * (os.cpu_count() or 1)))
+        for (subset, fold), score in zip(tasks, pool.map(scoreSubset, tasks, chunksize=chunk)):
+            scores[(dataKey, getSubsetKey(subset, columnHashes), fold)] = score
+
+    means = np.array([np.mean([scores[(dataKey, key, f)] for f in range(k)]) for key in keys])
+
+    return means, len(tasks)
+
+def sequentialSelection(df:pd.DataFrame, features:list[str], target:str=DAC.FAILURE_RATE, weight:str=WC.LENG,
+                        direction:str='forward', k:int=5, maxFeatures:int=None, tol:float=0, patience:int=1,
+                        workers:int=None, seed:int=0, cacheDir:str=SELECTION_DIR)->pd.DataFrame:
+    """
+        Sequential feature selection (as SequentialFeatureSelector with LinearRegression, weighted) scored with the
+        k-fold R2. In each step all the candidate subsets are evaluated over a process pool; the scores are cached by
+        the hash of the rows, target, weights and folds, of the features of the subset and the fold, so repeated or
+        longer searches (e.g. with more candidates) reuse them.
+    Args:
+        df (pd.DataFrame): Table with the features, the target and the weights (e.g. the regression table or the
+            numeric features of FailureModels.getFeatureMatrix).
+        features (list[str]): Candidate features.
+        target (str): Column of the dependent variable.
+        weight (str): Column of the weights (None for no weights).
+        direction (str): 'forward' adds the best feature in each step and 'backward' removes the worst one.
+        k (int): Number of folds.
+        maxFeatures (int): Stops when the subset has this number of features (forward) or this number of features
+            removed (backward). Default is None (all).
+        tol (float): Minimum improvement of the score of a step.
+        patience (int): Steps without improvement before stopping (early stopping).
+        workers (int): Number of processes. Default is None (number of CPUs).
+        seed (int): Seed of the folds.
+        cacheDir (str): Directory of the scores and the trace.
+    Returns:
+        pd.DataFrame: Trace of the selection: feature added or removed, features, score, improvement and number of
+        folds evaluated (the rest came from the cache) per step. It is also saved in the cache directory.
+    """
+    data = df.dropna(subset=features + [target] + ([weight] if weight is not None else []))
+    X = data[features].to_numpy(dtype='float64')
+    y = data[target].to_numpy(dtype='float64')
+    w = data[weight].to_numpy(dtype='float64') if weight is not None else np.ones(data.shape[0])
+    folds = getFolds(data.shape[0], k, seed)
+
+    dataKey = getDataKey(data, target, weight, k, seed)
+    columnHashes = getColumnHashes(data, features)
+    scores = loadScores(cacheDir)
+    forward = direction == 'forward'
+    selected = [] if forward else list(features)
+    maxSteps = len(features) if maxFeatures is None else maxFeatures
+
+    trace, best, waited = [], -np.inf, 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=setData, initargs=(X, y, w, folds, features)) as pool:
+        if not forward:
+            best, evaluated = evaluateSubsets([selected], dataKey, columnHashes, k, scores, pool)
+            best = best[0]
+            trace.append({'Step': 0, 'Feature': None, 'Features': '|'.join(selected), 'Score': best,
+                          'Improvement': np.nan, 'Evaluated': evaluated})
+
+        for step in range(1, maxSteps + 1):
+            candidates = [f for f in features if f not in selected] if forward else list(selected)
+            if not candidates or (not forward and len(selected) == 1):
+                break
+
+            subsets = [selected + [c] for c in candidates] if forward else [[f for f in selected if f != c]
+                                                                             for c in candidates]
+            means, evaluated = evaluateSubsets(subsets, dataKey, columnHashes, k, scores, pool)
+            saveScores(scores, cacheDir)
+
+            i = int(np.argmax(means))
+            improvement = means[i] - best if np.isfinite(best) else np.nan
+            selected = subsets[i]
+            trace.append({'Step': step, 'Feature': candidates[i], 'Features': '|'.join(selected), 'Score': means[i],
+                          'Improvement': improvement, 'Evaluated': evaluated})
+            print("Step ", step, " ", direction, " ", candidates[i], " score: ", "%.4f" % means[i], " evaluated folds: ",
+                  evaluated)
+
+            waited = waited + 1 if improvement <= tol else 0
+            best = max(best, means[i])
+            if waited >= patience:
+                break
+
+    trace = pd.DataFrame(trace)
+    os.makedirs(cacheDir, exist_ok=True)
+    trace.to_csv(os.path.join(cacheDir, direction + TRACE_FILE), index=False)
+
+    return trace
+
+def loadTrace(direction:str='forward', cacheDir:str=SELECTION_DIR)->pd.DataFrame:
+    """
+        Trace of the last selection saved by sequentialSelection.
+    """
+    return pd.read_csv(os.path.join(cacheDir, direction + TRACE_FILE))
+
+def getSelectedFeatures(trace:pd.DataFrame)->list[str]:
+    """
+        Features of the step with the best score of a trace.
+    """
+    return trace.loc[trace['Score'].idxmax(), 'Features'].split('|')
@@ -0,0 +1,194 @@
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple, Callable, Union
+
+import numpy as np
+import pandas as pd
+
+
+FIGURES_DIR = 'Figures'
+MANIFEST_FILE = 'manifest.json'
+DPI = 200
+
+
+class FigureSpec(NamedTuple):
+    """
+        Figure of the report: function that draws it (or its name as 'module.function', e.g.
+        'crackGrowthGraphs.graphsAllGrowth'), its arguments and the data it is drawn from (part of its key, the
+        arguments are also part of it). Functions with a fileName argument save the figure themselves (fileName without
+        extension), the others return the figure (or the axes) and it is saved as name.png.
+    """
+    name: str
+    func: Union[Callable, str]
+    args: tuple = ()
+    kwargs: dict = {}
+    data: object = None
+
+
+def getFunction(func:Union[Callable, str])->Callable:
+    """
+        Function of a spec (imported if it is given as 'module.function').
+    """
+    if callable(func):
+        return func
+
+    module, name = func.rsplit('.', 1)
+    return getattr(importlib.import_module(module), name)
+
+def getFunctionName(func:Union[Callable, str])->str:
+    """
+        Name of the function of a spec as 'module.function'.
+    """
+    return func if isinstance(func, str) else func.__module__ + '.' + func.__qualname__
+
+def updateHash(h, value):
+    """
+        Adds a value to the hash: the hash of the values for the tables, the bytes for the arrays and the pickle for the
+        rest.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        h.update(str(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(str((value.dtype, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(str(len(value)).encode())
+        for v in value:
+            updateHash(h, v)
+    elif isinstance(value, dict):
+        for k in sorted(value, key=str):
+            h.update(str(k).encode())
+            updateHash(h, value[k])
+    else:
+        h.update(pickle.dumps(value))
+
+def getSpecKey(spec:FigureSpec, dpi:int=DPI)->str:
+    """
+        Key of a figure: hash of the function, the arguments, the data and the dpi.
+    """
+    h = hashlib.sha1((spec.name + '|' + getFunctionName(spec.func) + '|' + str(dpi)).encode())
+    for value in [spec.args, spec.kwargs, spec.data]:
+        updateHash(h, value)
+
+    return h.hexdigest()
+
+def loadManifest(outDir:str=FIGURES_DIR)->dict:
+    """
+        Key of each figure rendered in the directory.
+    """
+    fManifest = os.path.join(outDir, MANIFEST_FILE)
+    if not os.path.exists(fManifest):
+        return {}
+
+    with open(fManifest) as f:
+        return json.load(f)
+
+def saveManifest(manifest:dict, outDir:str=FIGURES_DIR):
+    """
+        Saves the key of each figure rendered in the directory.
+    """
+    with open(os.path.join(outDir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+def renderFigure(spec:FigureSpec, outDir:str=FIGURES_DIR, dpi:int=DPI)->float:
+    """
+        Draws a figure on the Agg backend (no display) and saves it as png in the directory.
+    Returns:
+        float: Time to draw and save the figure (s).
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    func = getFunction(spec.func)
+    kwargs = dict(spec.kwargs)
+    if 'fileName' in inspect.signature(func).parameters:
+        kwargs['fileName'] = os.path.join(outDir, spec.name)
+
+    try:
+        result = func(*spec.args, **kwargs)
+        if 'fileName' not in kwargs:
+            fig = result if isinstance(result, matplotlib.figure.Figure) else plt.gcf()
+            fig.savefig(os.path.join(outDir, spec.name + '.png'), dpi=dpi, bbox_inches='tight')
+    finally:
+        plt.close('all')
+
+    return time.perf_counter() - start
+
+def renderFigures(specs:list[FigureSpec], outDir:str=FIGURES_DIR, workers:int=None, dpi:int=DPI,
+                  force:bool=False)->pd.DataFrame:
+    """
+        Renders a set of figures (e.g. all the figures of the report) over a process pool. The figures whose key
+        (function, arguments and data) is the same as the last time they were rendered in the directory, and whose png
+        exists, are skipped.
+    Args:
+        specs (list[FigureSpec]): Figures to render (the names must be unique).
+        outDir (str): Directory of the png files and the manifest.
+        workers (int): Number of processes. Default is None (number of CPUs).
+        dpi (int): Resolution of the figures returned by the functions (the ones that save themselves keep theirs).
+        force (bool): If True, all the figures are rendered again.
+    Returns:
+        pd.DataFrame: Status of each figure ('rendered', 'skipped' or 'failed'), its time (s) and the error if it failed.
+    """
+    names = [s.name for s in specs]
+    assert len(set(names)) == len(names), "The names of the figures must be unique"
+
+    os.makedirs(outDir, exist_ok=True)
+    manifest = loadManifest(outDir)
+    keys = {s.name: getSpecKey(s, dpi) for s in specs}
+
+    status = {}
+    pending = []
+    for spec in specs:
+        done = manifest.get(spec.name) == keys[spec.name] and os.path.exists(os.path.join(outDir, spec.name + '.png'))
+        if done and not force:
+            status[spec.name] = {'Status': 'skipped', 'Time (s)': 0.0, 'Error': None}
+        else:
+            pending.append(spec)
+
+    start = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(renderFigure, spec, outDir, dpi): spec.name for spec in pending}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    status[name] = {'Status': 'rendered', 'Time (s)': future.result(), 'Error': None}
+                    manifest[name] = keys[name]
+                except Exception as e:
+                    status[name] = {'Status': 'failed', 'Time (s)': np.nan, 'Error': repr(e)}
+                    manifest.pop(name, None)
+        saveManifest(manifest, outDir)
+
+    status = pd.DataFrame.from_dict(status, orient='index').reindex(names)
+    status.index.name = 'Figure'
+    counts = status['Status'].value_counts()
+    print("Rendered ", counts.get('rendered', 0), " figures, skipped ", counts.get('skipped', 0), ", failed ",
+          counts.get('failed', 0), " in ", "%.2f" % (time.perf_counter() - start), " s")
+
+    return status
+
+def checkLazyImports(modules:list[str]=['crackGrowthCalculations', 'GetFailures', 'crackGrowthGraphs', 'PlotUtils'])->bool:
+    """
+        Checks that importing the modules (in a new process) does not load matplotlib or seaborn.
+    """
+    import subprocess
+    import sys
+
+    code = ('import sys\n' + ''.join('import ' + m + '\n' for m in modules) +
+            'print(any(m in sys.modules for m in ["matplotlib", "seaborn"]))')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+    lazy = out.stdout.strip().splitlines()[-1] == 'False'
+    print("Modules imported without the plotting libraries: ", lazy)
+
+    return lazy
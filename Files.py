@@ -1,9 +1,31 @@
 
 WORK_ORDERS = 'Data/03-WorkOrders.csv'
+WATER_PIPES = 'Data/00-Water_Pipe.csv'
+
+ACTCODE_REPAIR = 'Data/01-ACTCODERepair.csv'
+SR_PROB_FILTER = 'Data/02-SR_PROB_TO_FILTER.csv'
 
 ASSETS1 = 'Data/Assets/001-All-Assets_1.csv'
 ASSETS2 = 'Data/Assets/001-All-Assets_2.csv'
 ASSETS3 = 'Data/Assets/001-All-Assets_3.csv'
 
 
-MAT_CONSTS = 'Data/Const-Materials.csv'
\ No newline at end of file
+PRESSURE_JOIN = 'Data/09-JoinWater_PipeVsPressure.csv'
+GEOUNITS = 'Data/Geounits/Geounits.csv'
+GEOUNITS_PIPES_IDS = 'Data/Geounits/Water_pipes.csv'
+GEOUNITS_PIPES_JOIN = 'Data/Geounits/IntersectGeounitsVsWaterP.csv'
+
+#Geometries (WKT) for the spatial joins
+PIPES_GEOMETRY = 'Data/Spatial/Water_Pipe_Geometry.csv'
+PRESSURE_NODES = 'Data/Spatial/PressureNodes.csv'
+GEOUNITS_GEOMETRY = 'Data/Spatial/Geounits_Geometry.csv'
+
+COORDINATES = 'Data/Coordinates/CoordinatesMiddlePointAll.txt'
+
+#Daily climate series (date and one column per variable)
+CLIMATE_DAILY = 'Data/Climate/DailyClimate.csv'
+
+
+MAT_CONSTS = 'Data/Const-Materials.csv'
+
+CRACK_SENSITIVITY_PARAMS = 'Data/CrackModel/00-SensitivityAnalysisParams.csv'
@@ -1,13 +1,18 @@
 
 import pandas as pd 
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 import WatercareConstants as WC
 import DataAnalysisConstants as DAC
 import Files as FILES
+import Schema as SCHEMA
+import AddressIndex as AI
+import StageMetrics as SM
 
 
 #Returns a dataframe from the file and drops duplicates by index (WONO) and by attributes
+@SM.instrumented()
 def getFailureRecords(fname):
     #Reads the cvs file result from the query to the Watercare DB and store it in a dataframe
     failureRecords = pd.read_csv(fname, delimiter = ',', 
@@ -18,11 +23,12 @@ def getFailureRecords(fname):
                                  parse_dates=[WC.ADDDTTM],
                                 )[[WC.SERVNO,WC.ACTCODE,WC.SR_PROB,WC.ADDDTTM,WC.COMPKEY]]
     numFailureRecordsOri= failureRecords.shape[0]
-    print('Number of records from the DB query:' , numFailureRecordsOri)
+    SM.logRows(numFailureRecordsOri, 'Number of records from the DB query: {rows}')
 
     failureRecords= failureRecords[~failureRecords.index.duplicated()].copy()
 
-    print('Number of failure records:', failureRecords.shape[0], ' Deleted records duplicated WONO: ', numFailureRecordsOri - failureRecords.shape[0])
+    SM.logRows(failureRecords.shape[0], 'Number of failure records: {rows}  Deleted records duplicated WONO:  {dropped}',
+               numFailureRecordsOri - failureRecords.shape[0], 'duplicated WONO')
     numFailureRecordsOri = failureRecords.shape[0]
 
     #For this study if it is the same type of Repair activity on the same asset associated 
@@ -33,7 +39,8 @@ def getFailureRecords(fname):
 
     #check for duplicates using only the date (not datetime) in the extraMethods.py file!!
 
-    print('Number of failure records:', failureRecords.shape[0], ' Deleted records: ', numFailureRecordsOri - failureRecords.shape[0])
+    SM.logRows(failureRecords.shape[0], 'Number of failure records: {rows}  Deleted records:  {dropped}',
+               numFailureRecordsOri - failureRecords.shape[0], 'duplicated records')
     numFailureRecordsOri = failureRecords.shape[0]
     return failureRecords, numFailureRecordsOri
 
@@ -49,42 +56,222 @@ def getAddressFromFailureRecords(fname):
 
 	return addressRecords
 
-# Creates a dataset combining all 3 assets files, separate mains from other assests, remove duplicates and return the mains dataset
-def getAssetsRecords():
+#Columns of the work orders file used by readWorkOrders
+FAILURE_COLS = [WC.SERVNO,WC.ACTCODE,WC.SR_PROB,WC.ADDDTTM,WC.COMPKEY]
+ADDRESS_COLS = [WC.STR_TYPE,WC.STR_NAME,WC.SUBURB,'FLAT','HOUSENO','POSTCODE']
+
+#Address fields that have to match the ones of the asset
+FILTER_FIELDS = [WC.SUBURB]
+
+#Empty set of seen hashes
+NO_HASHES = np.empty(0, dtype='uint64')
+
+# True for the hashes that are in the sorted array of seen hashes
+def isSeen(hashes, seen):
+
+    if seen.size == 0:
+        return np.zeros(len(hashes), dtype=bool)
+
+    pos = np.minimum(np.searchsorted(seen, hashes), seen.size - 1)
+    return seen[pos] == hashes
+
+# Adds the hashes to the sorted array of seen hashes (merged by position, without sorting all the seen ones again). 
+# 64 bit hashes are used instead of the keys, a collision is unlikely for the sizes of the extracts (about 1e-6 for 
+# 10M keys)
+def addSeen(seen, hashes):
+
+    new = np.unique(hashes)
+    new = new[~isSeen(new, seen)]
+
+    return np.insert(seen, np.searchsorted(seen, new), new)
+
+# Reads the work orders file once in chunks and returns the failure records (without duplicated WONO or attributes 
+# and filtered by 3rd party SR_PROB and not repair ACTCODE), the addresses of those failure records and the cost per SERVNO.
+# Same results as getFailureRecords + filters3PandNotRepairs, getAddressFromFailureRecords and the WoCost per SERVNO,
+# but only one chunk of the file is in memory at a time. Besides the output tables, the memory grows with the seen WONOs
+# and records, kept as sorted hashes (8 bytes per distinct WONO and record, see addSeen).
+# If a state is given (dict with the hashes of the seen WONOs and records, the kept WONOs and the watermark (ADDDTTM, WONO)
+# of the last ingested record), only the records from the watermark are read, the duplicates are also searched in the
+# previous ingestions, the addresses include the new records of the kept WONOs and the state is updated.
+@SM.instrumented()
+def readWorkOrders(fname, SR_ToFilter, ACTCODERepair, chunksize=500000, state=None):
+
+    dtypes = {WC.WONO:'str', WC.ACTCODE:'str', WC.SERVNO:'str', WC.SR_PROB:'str', WC.ADDDTTM:'str', WC.COMPKEY:'int64',
+              WC.WO_COST:'float64', WC.STR_TYPE:'str', WC.STR_NAME:'str', WC.SUBURB:'str', 'FLAT':'str', 'HOUSENO':'str',
+              'POSTCODE':'str'}
+    reader = pd.read_csv(fname, delimiter = ',', usecols=list(dtypes), dtype=dtypes, parse_dates=[WC.ADDDTTM],
+                         chunksize=chunksize)
+
+    seenWONO, seenRecords, keptWONO = NO_HASHES, NO_HASHES, set()
+    #only the watermark of a previous ingestion filters the records, the newest one of this read is kept apart
+    since, newest = None, None
+    if state is not None:
+        seenWONO, seenRecords, since = state['seenWONO'], state['seenRecords'], state['watermark']
+        keptWONO = set(state['keptWONO'])
+        newest = since
+    failures, addresses, costs = [], [], []
+    counts = {'read': 0, 'WONO': 0, 'records': 0, '3P': 0, 'repair': 0}
+
+    for chunk in reader:
+        if since is not None:
+            chunk = chunk[isAfterWatermark(chunk, since)]
+        newest = getWatermark(chunk, newest)
+        counts['read'] += chunk.shape[0]
+
+        #costs include every work order
+        costs.append(chunk.groupby(WC.SERVNO)[WC.WO_COST].sum())
+
+        #first record of each WONO (in this chunk and not seen in the previous ones)
+        wonoHashes = pd.util.hash_array(chunk[WC.WONO].to_numpy(dtype='object'))
+        firstWONO = ~chunk[WC.WONO].duplicated().to_numpy() & ~isSeen(wonoHashes, seenWONO)
+        seenWONO = addSeen(seenWONO, wonoHashes)
+        records = chunk[firstWONO]
+        counts['WONO'] += records.shape[0]
+
+        #same attributes (e.g. different contractor reference numbers)
+        hashes = pd.util.hash_pandas_object(records[FAILURE_COLS], index=False).to_numpy()
+        newRecord = ~pd.Series(hashes).duplicated().to_numpy() & ~isSeen(hashes, seenRecords)
+        seenRecords = addSeen(seenRecords, hashes)
+        records = records[newRecord]
+        counts['records'] += records.shape[0]
+
+        records = records[~records[WC.SR_PROB].isin(SR_ToFilter['SR_PROB_TO_FILTER'])]
+        counts['3P'] += records.shape[0]
+        records = records[records[WC.ACTCODE].isin(ACTCODERepair[WC.ACTCODE])]
+        counts['repair'] += records.shape[0]
+
+        failures.append(records.set_index(WC.WONO)[FAILURE_COLS])
+        keptWONO.update(records[WC.WONO])
+
+        #addresses of the failures that are kept, including the ones of their duplicated records
+        addresses.append(chunk.loc[chunk[WC.WONO].isin(keptWONO), [WC.WONO] + ADDRESS_COLS].drop_duplicates())
+
+    SM.logRows(counts['read'], 'Number of records from the DB query: {rows}')
+    SM.logRows(counts['WONO'], 'Number of failure records: {rows}  Deleted records duplicated WONO:  {dropped}',
+               counts['read'] - counts['WONO'], 'duplicated WONO')
+    SM.logRows(counts['records'], 'Number of failure records: {rows}  Deleted records:  {dropped}',
+               counts['WONO'] - counts['records'], 'duplicated records')
+    SM.logRows(counts['3P'], 'Number of failure records: {rows}  3P Deleted records:  {dropped}',
+               counts['records'] - counts['3P'], '3P')
+    SM.logRows(counts['repair'], 'Number of failure records: {rows}  Not repair Deleted records:  {dropped}',
+               counts['3P'] - counts['repair'], 'not repair')
+
+    if state is not None:
+        state.update(watermark=newest, seenWONO=seenWONO, seenRecords=seenRecords)
+
+    failureRecords = pd.concat(failures)
+    addressRecords = pd.concat(addresses).drop_duplicates().set_index(WC.WONO, drop=True)
+    failureCosts = pd.concat(costs).groupby(level=0).sum().to_frame()
+
+    return failureRecords, addressRecords, failureCosts
+
+#Columns of the asset files used for the mains and the service lines
+ASSET_COLS = [1,2,3,4,5,6,7]
+ASSET_SL_COLS = [1,2,3,7,23,24]
+ASSET_CATEGORIES = [WC.ASSET_TYPECODE,WC.ASSET_SERV_STA,'Asset Status']
+
+# Concatenates the dataframes keeping the categorical columns as categories (union of the categories of all of them).
+# The empty dataframes are left out (their categories can have another dtype); if all are empty the first one is returned,
+# and without dataframes an empty one with the categorical columns
+def concatCategorical(frames, columns=ASSET_CATEGORIES):
+
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame({col: pd.Categorical([]) for col in columns})
+
+    frames = [df for df in frames if df.shape[0]] or frames[:1]
+
+    for col in columns:
+        categories = pd.api.types.union_categoricals([df[col] for df in frames], ignore_order=True).categories
+        frames = [df.assign(**{col: df[col].cat.set_categories(categories)}) for df in frames]
+
+    return pd.concat(frames)
+
+# Reads one asset file in chunks keeping only the assets of the given type 
+def readAssetsFile(fname, assetType, usecols, chunksize=500000):
+
+    dtypes = {col:'category' for col in ASSET_CATEGORIES}
+    dtypes.update({'Asset Compkey':'int64', 'Water Service Line Pipe Type':'str'})
+
+    #the index is set after the read (index_col with usecols takes a wrong column in a file without rows)
+    reader = pd.read_csv(fname, delimiter = ',', dtype = dtypes, usecols=usecols, chunksize=chunksize)
+    chunks = [chunk[chunk[WC.ASSET_TYPECODE] == assetType].set_index('Asset Compkey') for chunk in reader]
+
+    #without assets of the type, an empty table with the columns and dtypes of the file
+    return concatCategorical(chunks)
+
+# Reads the 3 assets files concurrently (one thread per file) and returns the assets of the given type
+def readAssets(assetType=WC.WMN, usecols=ASSET_COLS, fnames=None, chunksize=500000):
 
-    fname = FILES.ASSETS1
-    fname2 = FILES.ASSETS2
-    fname3 = FILES.ASSETS3
+    fnames = [FILES.ASSETS1, FILES.ASSETS2, FILES.ASSETS3] if fnames is None else fnames
 
-    AllAssets = pd.read_csv(fname, delimiter = ',', index_col=['Asset Compkey'],
-                        dtype = {WC.ASSET_TYPECODE:'str',WC.ASSET_SERV_STA:'str','Asset Status':'str','Asset Compkey':'int64' },     
-                        usecols=[1,2,3,4,5,6,7])
-    AllAssets2 = pd.read_csv(fname2, delimiter = ',', index_col=['Asset Compkey'],
-                        dtype = {WC.ASSET_TYPECODE:'str',WC.ASSET_SERV_STA:'str','Asset Status':'str','Asset Compkey':'int64' },     
-                        usecols=[1,2,3,4,5,6,7])
-    AllAssets3 = pd.read_csv(fname3, delimiter = ',', index_col=['Asset Compkey'],
-                        dtype = {WC.ASSET_TYPECODE:'str',WC.ASSET_SERV_STA:'str','Asset Status':'str','Asset Compkey':'int64' },     
-                        usecols=[1,2,3,4,5,6,7])
+    with ThreadPoolExecutor(max_workers=len(fnames)) as executor:
+        frames = list(executor.map(lambda f: readAssetsFile(f, assetType, usecols, chunksize), fnames))
 
-    AllAssetsCom = AllAssets.append(AllAssets2).append(AllAssets3).copy()
+    return concatCategorical(frames)
 
-    WaterMain = AllAssetsCom[AllAssetsCom[WC.ASSET_TYPECODE] == WC.WMN].copy()
+# True for the work orders from the date of the watermark (ADDDTTM, WONO). The WONOs are not ordered within a date, so the 
+# records of the last date are read again and the ones already ingested are removed as duplicated WONOs. Records without
+# date are always read (as in the first ingestion), the ones already ingested are also removed as duplicated WONOs
+def isAfterWatermark(workOrders, watermark):
 
-    print("There are ", WaterMain.shape[0], " water mains in the database (NOT GIS)")
+    return (workOrders[WC.ADDDTTM] >= pd.Timestamp(watermark[0])) | workOrders[WC.ADDDTTM].isna()
+
+# Last (ADDDTTM, WONO) of the work orders and the previous watermark
+def getWatermark(workOrders, watermark=None):
+
+    dated = workOrders[workOrders[WC.ADDDTTM].notna()]
+    if dated.shape[0] == 0:
+        return watermark
+
+    date = dated[WC.ADDDTTM].max()
+    last = (date, dated.loc[dated[WC.ADDDTTM] == date, WC.WONO].max())
+
+    if watermark is None or last > (pd.Timestamp(watermark[0]), watermark[1]):
+        return last
+    return watermark
+
+# Creates a dataset combining all 3 assets files, separate mains from other assests, remove duplicates and return the mains dataset
+@SM.instrumented()
+def getAssetsRecords():
+
+    WaterMain = readAssets(WC.WMN, ASSET_COLS)
+
+    SM.logRows(WaterMain.shape[0], 'There are  {rows}  water mains in the database (NOT GIS)')
 
     waterMains = WaterMain[~WaterMain.index.duplicated(keep='first')]
 
-    print("There are ", WaterMain.shape[0], " water mains not duplicated in the database (NOT GIS)")
+    SM.logRows(waterMains.shape[0], 'There are  {rows}  water mains not duplicated in the database (NOT GIS)',
+               WaterMain.shape[0] - waterMains.shape[0], 'duplicated COMPKEY')
     
     #rename the index
     waterMains.index.names = [WC.COMPKEY]
 
     return waterMains
 
+# Same as getAssetsRecords but for the service lines (with their pipe type)
+@SM.instrumented()
+def getAssetsSERVRecords():
+
+    waterSL = readAssets(WC.WSL, ASSET_SL_COLS)
+
+    SM.logRows(waterSL.shape[0], 'There are  {rows}  service lines in the database (NOT GIS)')
+    numSL = waterSL.shape[0]
+
+    waterSL = waterSL[~waterSL.index.duplicated(keep='first')]
+
+    SM.logRows(waterSL.shape[0], 'There are  {rows}  service lines not duplicated in the database (NOT GIS)',
+               numSL - waterSL.shape[0], 'duplicated COMPKEY')
+    
+    #rename the index
+    waterSL.index.names = [WC.COMPKEY]
+
+    return waterSL
+
 def getFilterCodesAndSR() :
 
-	fileACTCODE = 'Data/01-ACTCODERepair.csv'
-	fileSR_Prob = 'Data/02-SR_PROB_TO_FILTER.csv'
+	fileACTCODE = FILES.ACTCODE_REPAIR
+	fileSR_Prob = FILES.SR_PROB_FILTER
 
 	#read the filter files
 	ACTCODERepair = pd.read_csv(fileACTCODE)
@@ -94,67 +281,75 @@ def getFilterCodesAndSR() :
 
 # It removes records associated to 3rd party caused failures or with service requests that did not include a repair 
 # From the dataset of service requests and returns the cleaned dataset
+@SM.instrumented()
 def filters3PandNotRepairs(failureRecords, SR_ToFilter, ACTCODERepair, numFailureRecordsOri):
 	#filters the service codes related to third parties---------------------------------------------------------------
     failureRecords= failureRecords[~failureRecords[WC.SR_PROB].isin(SR_ToFilter['SR_PROB_TO_FILTER'])].copy()
     
-    print('Number of failure records:', failureRecords.shape[0], ' 3P Deleted records: ', numFailureRecordsOri - failureRecords.shape[0])
+    SM.logRows(failureRecords.shape[0], 'Number of failure records: {rows}  3P Deleted records:  {dropped}',
+               numFailureRecordsOri - failureRecords.shape[0], '3P')
     numFailureRecordsOri = failureRecords.shape[0]
 
 
 	#filters the activities with actcodes not related to repairs------------------------------------------------------
     failureRecords= failureRecords[failureRecords[WC.ACTCODE].isin(ACTCODERepair[WC.ACTCODE])].copy()
     
-    print('Number of failure records:', failureRecords.shape[0], ' Not repair Deleted records: ', numFailureRecordsOri - failureRecords.shape[0])
+    SM.logRows(failureRecords.shape[0], 'Number of failure records: {rows}  Not repair Deleted records:  {dropped}',
+               numFailureRecordsOri - failureRecords.shape[0], 'not repair')
     
     return failureRecords
 
-def filterFailuresbyInconsistentAddress(failures, addressRecords, assetAddresses):
+# Keeps the failures whose address records match the address of their asset in the fields of FILTER_FIELDS (exact or 
+# fuzzy match, see AI.matchField). Failures with a different suburb from their asset or without an address to compare 
+# are removed
+def filterFailuresbyInconsistentAddress(failures, addressRecords, assetAddresses, index=None):
 
 	#adds the compkeys to the addressess of the failure table 
-    failAddr= failures.join(addressRecords)[[WC.COMPKEY,'Street_Type','Street_Name',WC.SUBURB]]
+    failAddr= failures[[WC.COMPKEY]].join(addressRecords[AI.FIELDS])
     failAddr=failAddr.astype({WC.COMPKEY: 'int64'})
 
-	#creates the table to compare addresses 
-    addrComp= failAddr.join(assetAddresses, on=WC.COMPKEY)
+	#compares the normalised addresses with the ones of the assets and drop the failures with a record that does not match
+    index = AI.buildAddressIndex(assetAddresses) if index is None else index
+    matches = AI.matchAddresses(failAddr, index)
+    fields = [f + ' match' for f in FILTER_FIELDS if f in assetAddresses.columns]
+    consistent = matches[fields].isin([AI.EXACT, AI.FUZZY]).all(axis=1)
 
-	#compare the suburbs and drop the values that dont match
-    indexToFilter= addrComp[addrComp[WC.SUBURB].str.upper()!=addrComp[WC.SUBURB].str.upper()].index
+    indexToFilter= consistent.index[~consistent.to_numpy()].unique()
     failures.drop(indexToFilter , inplace=True)
     
     return failures
 
+# Number of failures of each pipe (COMPKEY)
+def countFailuresPerPipe(failures):
+
+	countNumFPerPipe = failures.groupby([WC.COMPKEY]).agg({WC.SERVNO: 'count'})
+	countNumFPerPipe.rename(columns={WC.SERVNO:DAC.NUM_FAILURES}, inplace= True)
+
+	return countNumFPerPipe
+
+@SM.instrumented()
 def manage_GISPipes(mainFailures,WMNFromAssetRecordsIndex):
 
 	failuresWithPipesInGIS, wPipesGIS = getFailuresWithPipes(mainFailures,WMNFromAssetRecordsIndex)
 
-	countNumFPerPipe = failuresWithPipesInGIS.groupby([WC.COMPKEY]).agg({WC.SERVNO: 'count', WC.ACTCODE : 'first'})
-	countNumFPerPipe.rename(columns={WC.SERVNO:'Num of failures'}, inplace= True)
+	countNumFPerPipe = countFailuresPerPipe(failuresWithPipesInGIS)
 
+	return joinFailuresToPipes(wPipesGIS, countNumFPerPipe)
 
-	#asign the number of failures per pipe including 0 to all the main pipe table and change formats
+# Asigns the number of failures per pipe including 0 to all the main pipe table and changes formats
+def joinFailuresToPipes(wPipesGIS, countNumFPerPipe):
+
+	wPipesGIS = wPipesGIS.copy()
 	wPipesGIS[WC.NOM_DIA_MM] = pd.to_numeric(wPipesGIS[WC.NOM_DIA_MM],errors='coerce')
-	wPipesGISNfailures = wPipesGIS.join(countNumFPerPipe[['Num of failures']])
-	wPipesGISNfailures["Num of failures"].fillna(0, inplace=True)
+	wPipesGISNfailures = wPipesGIS.join(countNumFPerPipe[[DAC.NUM_FAILURES]])
+	wPipesGISNfailures[DAC.NUM_FAILURES] = wPipesGISNfailures[DAC.NUM_FAILURES].fillna(0)
 	wPipesGISNfailures['Shape_Leng'] = wPipesGISNfailures['Shape_Leng']/1000
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.UNKNOWN, np.nan)
-    
-    #Combine AC
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.FB, WC.AC)
     
-    #Combine PE
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.ALK, WC.PE)
+    #Combine the materials in their groups (FB in AC, ALK in PE and CI, CLCI, DI, ELCI, CLDI and GI in Iron) and categoricals
+	wPipesGISNfailures = SCHEMA.applySchema(wPipesGISNfailures)
     
-    #combine CI
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.CLCI, DAC.IRON)
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.DI, DAC.IRON)
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.ELCI, DAC.IRON)
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.CLDI, DAC.IRON)
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.GI, DAC.IRON)
-	wPipesGISNfailures[WC.MATERIAL] = wPipesGISNfailures[WC.MATERIAL].replace(WC.CI, DAC.IRON) 
-    
-	wPipesGISNfailures[WC.NOM_DIA_MM].fillna(0, inplace=True)
-	wPipesGISNfailures["Age Today"] = (pd.to_datetime('today').tz_localize('UTC')-pd.to_datetime(wPipesGISNfailures["INSTALLED"])).astype('<m8[Y]')
+	wPipesGISNfailures[WC.NOM_DIA_MM] = wPipesGISNfailures[WC.NOM_DIA_MM].fillna(0)
+	wPipesGISNfailures = setCurrentAge(wPipesGISNfailures)
 	
 
 	#uniStatus = failuresWithPipesInGIS[WC.ASSET_SERV_STA].value_counts()
@@ -165,9 +360,21 @@ def manage_GISPipes(mainFailures,WMNFromAssetRecordsIndex):
 
 	return wPipesGISNfailures
 
-def getFailuresWithPipes(mainFailures, WMNFromAssetRecordsIndex):
+# Age today of the pipes in complete years (same as the former astype('<m8[Y]')). Tables loaded from a cache are passed
+# again, so the ages are never the ones of the day they were built
+def setCurrentAge(wPipesGISNfailures):
 
-	fWPipes = 'Data/00-Water_Pipe.csv'
+	wPipesGISNfailures = wPipesGISNfailures.copy()
+	age = pd.to_datetime('today').tz_localize('UTC')-pd.to_datetime(wPipesGISNfailures["INSTALLED"])
+	wPipesGISNfailures[DAC.CURRENT_AGE] = np.floor(age / pd.Timedelta(days=365.2425))
+
+	return wPipesGISNfailures
+
+# Reads the GIS pipes, merges the duplicated COMPKEYs and keeps the ones that are mains in the assets dataset
+@SM.instrumented()
+def getGISMainPipes(WMNFromAssetRecordsIndex):
+
+	fWPipes = FILES.WATER_PIPES
 
 	wPipesGIS = pd.read_csv(fWPipes, delimiter = ',', 
 		                                dtype = {WC.COMPKEY:'int64',WC.STATUS:'str',WC.MATERIAL:'str',
@@ -178,48 +385,66 @@ def getFailuresWithPipes(mainFailures, WMNFromAssetRecordsIndex):
 		                                index_col=[WC.COMPKEY]
 		                                )
 
-	print("Records of pipes (GIS) ",  wPipesGIS.shape[0], " length ", "%.2f" % wPipesGIS['Shape_Leng'].sum())
+	SM.logRows(wPipesGIS.shape[0], 'Records of pipes (GIS)  {rows}  length  {length:.2f}', length=wPipesGIS['Shape_Leng'].sum())
 	originalGIS = wPipesGIS.shape[0]
     
     #merge duplicates compkeys
 	wPipesGIS = wPipesGIS.groupby(wPipesGIS.index).agg({'Shape_Leng':sum, WC.STATUS: 'first', WC.NOM_DIA_MM: 'first', WC.MATERIAL : 'first', WC.INSTALLED:'first'})
-	print("Records of pipes (GIS) ",  wPipesGIS.shape[0], " total length ", "%.2f" % wPipesGIS['Shape_Leng'].sum(),". Removed COMPKEY duplicates: ", originalGIS - wPipesGIS.shape[0])
+	SM.logRows(wPipesGIS.shape[0], 'Records of pipes (GIS)  {rows}  total length  {length:.2f} . Removed COMPKEY duplicates:  {dropped}',
+			   originalGIS - wPipesGIS.shape[0], 'duplicated COMPKEY', length=wPipesGIS['Shape_Leng'].sum())
 	originalGIS = wPipesGIS.shape[0]
 	
 	#Delete no main pipes by the all assets dataset
 	wPipesGIS = wPipesGIS[wPipesGIS.index.isin(WMNFromAssetRecordsIndex)].copy()
-	print("Records of main pipes (GIS) ",  wPipesGIS.shape[0], ". Removed pipes with all assets WMN: ", originalGIS - wPipesGIS.shape[0])
-	
+	SM.logRows(wPipesGIS.shape[0], 'Records of main pipes (GIS)  {rows} . Removed pipes with all assets WMN:  {dropped}',
+			   originalGIS - wPipesGIS.shape[0], 'not WMN in assets')
+
+	return wPipesGIS
+
+@SM.instrumented()
+def getFailuresWithPipes(mainFailures, WMNFromAssetRecordsIndex):
+
+	wPipesGIS = getGISMainPipes(WMNFromAssetRecordsIndex)
     
 	#look for the pipes of the failures and create a table with number of failure per pipe
 	mainF_GISPipes= mainFailures.join(wPipesGIS, on= WC.COMPKEY).copy()
 	failuresWithPipesMissingInGIS = mainF_GISPipes[pd.isna(mainF_GISPipes['Shape_Leng'])].copy()
 	failuresWithPipesInGIS = mainF_GISPipes[~pd.isna(mainF_GISPipes['Shape_Leng'])].copy()
-	print('Failures with pipes in the GIS ', failuresWithPipesInGIS.shape[0], '. Failures with pipes missing in GIS ', failuresWithPipesMissingInGIS.shape[0])
+	SM.logRows(failuresWithPipesInGIS.shape[0], 'Failures with pipes in the GIS  {rows} . Failures with pipes missing in GIS  {dropped}',
+			   failuresWithPipesMissingInGIS.shape[0], 'pipe missing in GIS')
 
 
 	return failuresWithPipesInGIS, wPipesGIS
 
-def getFailures(fname):
-      
-	failuresDF, numFailures = getFailureRecords(fname)
-	addressFromFailureRecords = getAddressFromFailureRecords(fname)
-	WMNFromAssetRecords = getAssetsRecords()
-
-	ACTCODERepair, SR_ToFilter = getFilterCodesAndSR()
-
-	failuresDF = filters3PandNotRepairs(failuresDF, SR_ToFilter, ACTCODERepair,numFailures)
+# Keeps the failures of mains whose address is consistent with the one of the asset (index is the address index of the assets)
+@SM.instrumented()
+def getMainFailures(failuresDF, addressFromFailureRecords, WMNFromAssetRecords, index=None):
 
 	#divide between MAIN and SERViCE LINES------------------------------------------------
 	mainFailures = failuresDF[(failuresDF[WC.ACTCODE]==WC.WMNRM) | (failuresDF[WC.ACTCODE]== WC.WMNRPL)].copy()
 
 	numFailRecordsOriM = mainFailures.shape[0]
-	print('Number of failures in Mains :', numFailRecordsOriM)
+	SM.logRows(numFailRecordsOriM, 'Number of failures in Mains : {rows}', failuresDF.shape[0] - numFailRecordsOriM,
+			   'not main')
+
+	mainFailures = filterFailuresbyInconsistentAddress(mainFailures, addressFromFailureRecords, WMNFromAssetRecords, index)
+	SM.logRows(mainFailures.shape[0], 'Number of failures in Mains : {rows}  Different address Deleted records:  {dropped}',
+			   numFailRecordsOriM - mainFailures.shape[0], 'different address')
+
+	return mainFailures
+
+@SM.instrumented()
+def getFailures(fname):
+      
+	ACTCODERepair, SR_ToFilter = getFilterCodesAndSR()
+
+	failuresDF, addressFromFailureRecords, _ = readWorkOrders(fname, SR_ToFilter, ACTCODERepair)
+	WMNFromAssetRecords = getAssetsRecords()
 
-	mainFailures = filterFailuresbyInconsistentAddress(mainFailures, addressFromFailureRecords, WMNFromAssetRecords)
-	print('Number of failures in Mains :', mainFailures.shape[0], ' Different address Deleted records: ', numFailRecordsOriM - mainFailures.shape[0])
+	mainFailures = getMainFailures(failuresDF, addressFromFailureRecords, WMNFromAssetRecords,
+								AI.getAddressIndex(WMNFromAssetRecords))
 
 	#returns the shape_length in km
 	wPipesGISNfailures = manage_GISPipes(mainFailures,WMNFromAssetRecords.index)
 
-	return wPipesGISNfailures, mainFailures
+	return wPipesGISNfailures, SCHEMA.applySchema(mainFailures)
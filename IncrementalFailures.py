@@ -0,0 +1,185 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import GetFailures as gf
+import AddressIndex as AI
+import processData as PD
+import Schema as SCHEMA
+import FailuresCache as fc
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+import Files as FILES
+
+
+STATE_DIR = 'Cache/Incremental'
+WATERMARK_FILE = 'watermark.json'
+
+#Tables of the state: hashes of the seen WONOs and records (duplicates), main failures, failures per pipe and the assets and GIS
+#pipes read in the first ingestion (they are not part of the work orders extracts)
+STATE_TABLES = ['seenWONO', 'seenRecords', 'mainFailures', 'failureCounts', 'assets', 'pipes']
+
+
+def loadState(stateDir:str=STATE_DIR)->dict:
+    """
+        Loads the state of the incremental ingestion.
+    Args:
+        stateDir (str): Directory of the state.
+    Returns:
+        dict: watermark, first date, sorted hashes of the seen WONOs and records and the tables of the state. None if there is
+        no state yet.
+    """
+    fWatermark = os.path.join(stateDir, WATERMARK_FILE)
+    if not os.path.exists(fWatermark):
+        return None
+
+    with open(fWatermark) as f:
+        state = json.load(f)
+
+    state['watermark'] = None if state['watermark'] is None else (pd.Timestamp(state['watermark'][0]), state['watermark'][1])
+    for t in STATE_TABLES:
+        state[t] = fc.loadTable(os.path.join(stateDir, t + '.parquet'))
+
+    #states saved before the WONOs were hashed have the WONOs
+    seenWONO = state['seenWONO']
+    state['seenWONO'] = np.sort(pd.util.hash_array(seenWONO[WC.WONO].to_numpy(dtype='object'))) \
+        if WC.WONO in seenWONO.columns else seenWONO['Hash'].to_numpy(dtype='uint64')
+    state['seenRecords'] = np.sort(state['seenRecords']['Hash'].to_numpy(dtype='uint64'))
+
+    return state
+
+def saveState(state:dict, stateDir:str=STATE_DIR):
+    """
+        Saves the state of the incremental ingestion. The watermark is written last so an interrupted save is not
+        taken as a complete state.
+    """
+    os.makedirs(stateDir, exist_ok=True)
+
+    tables = dict(state)
+    tables['seenWONO'] = pd.DataFrame({'Hash': state['seenWONO']}, dtype='uint64')
+    tables['seenRecords'] = pd.DataFrame({'Hash': state['seenRecords']}, dtype='uint64')
+    for t in STATE_TABLES:
+        fc.saveTable(tables[t], os.path.join(stateDir, t + '.parquet'))
+
+    watermark = None if state['watermark'] is None else [str(state['watermark'][0]), state['watermark'][1]]
+    with open(os.path.join(stateDir, WATERMARK_FILE) + '.tmp', 'w') as f:
+        json.dump({'watermark': watermark, 'firstDate': state['firstDate']}, f)
+    os.replace(os.path.join(stateDir, WATERMARK_FILE) + '.tmp', os.path.join(stateDir, WATERMARK_FILE))
+
+def createState()->dict:
+    """
+        Empty state with the assets (WMN) and the GIS main pipes.
+    """
+    assets = gf.getAssetsRecords()
+
+    return {'watermark': None, 'firstDate': None, 'seenWONO': gf.NO_HASHES, 'seenRecords': gf.NO_HASHES,
+            'mainFailures': pd.DataFrame(), 'failureCounts': pd.DataFrame({DAC.NUM_FAILURES: pd.Series(dtype='int64')},
+                                                                          index=pd.Index([], dtype='int64', name=WC.COMPKEY)),
+            'assets': assets, 'pipes': gf.getGISMainPipes(assets.index)}
+
+def ingestWorkOrders(fname:str=FILES.WORK_ORDERS, stateDir:str=STATE_DIR, rebuild:bool=False,
+                     chunksize:int=500000)->tuple[pd.DataFrame,pd.DataFrame]:
+    """
+        Reads the work orders after the watermark of the last ingestion, filters them as getFailures does and adds
+        their failures to the persisted number of failures per pipe (pipes not in the GIS are ignored when joined to
+        the pipes). Work orders added to an extract with a date before the watermark are not read, a rebuild is needed
+        for them (or if the assets or GIS pipes change).
+    Args:
+        fname (str): Work orders extract.
+        stateDir (str): Directory of the state.
+        rebuild (bool): If True, the previous state is removed and all the extract is ingested.
+        chunksize (int): Rows per chunk of the extract.
+    Returns:
+        tuple[pd.DataFrame,pd.DataFrame]: wPipesGISNfailures, mainFailures (same as getFailures).
+    """
+    state = None if rebuild else loadState(stateDir)
+    if state is None:
+        state = createState()
+
+    ACTCODERepair, SR_ToFilter = gf.getFilterCodesAndSR()
+    state['keptWONO'] = state['mainFailures'].index
+    failuresDF, addressRecords, _ = gf.readWorkOrders(fname, SR_ToFilter, ACTCODERepair, chunksize, state)
+
+    index = AI.getAddressIndex(state['assets'])
+    newFailures = gf.getMainFailures(failuresDF, addressRecords, state['assets'], index)
+
+    print('New failures with pipes in the GIS ', newFailures[WC.COMPKEY].isin(state['pipes'].index).sum())
+
+    #new records of ingested failures can have an inconsistent address, these failures are removed
+    removed = newFailures.iloc[:0]
+    if state['mainFailures'].shape[0]:
+        oldFailures = state['mainFailures'][state['mainFailures'].index.isin(addressRecords.index)]
+        consistent = gf.filterFailuresbyInconsistentAddress(oldFailures.copy(), addressRecords, state['assets'], index)
+        removed = oldFailures.drop(consistent.index)
+        print('Ingested failures removed by the address of new records ', removed.shape[0])
+
+    counts = state['failureCounts'].add(gf.countFailuresPerPipe(newFailures), fill_value=0)
+    counts = counts.sub(gf.countFailuresPerPipe(removed), fill_value=0)
+    state['failureCounts'] = counts[counts[DAC.NUM_FAILURES] > 0].astype('int64')
+
+    mainFailures = state['mainFailures'].drop(removed.index)
+    state['mainFailures'] = pd.concat([mainFailures, newFailures]) if mainFailures.shape[0] else newFailures
+
+    if state['firstDate'] is None and state['mainFailures'].shape[0]:
+        state['firstDate'] = str(state['mainFailures'][WC.ADDDTTM].min())
+
+    saveState(state, stateDir)
+
+    return gf.joinFailuresToPipes(state['pipes'], state['failureCounts']), SCHEMA.applySchema(state['mainFailures'])
+
+def getYearsOfRecords(stateDir:str=STATE_DIR)->float:
+    """
+        Years between the first failure and the watermark of the ingested work orders.
+    """
+    state = loadState(stateDir)
+
+    return (state['watermark'][0] - pd.Timestamp(state['firstDate'])) / pd.Timedelta(days=365.25)
+
+def getFailureRates(stateDir:str=STATE_DIR, years:float=None)->pd.DataFrame:
+    """
+        Failures/Km/year of each material from the persisted number of failures per pipe.
+    Args:
+        stateDir (str): Directory of the state.
+        years (float): Years of failure records. Default is the period of the ingested work orders.
+    Returns:
+        pd.DataFrame: Number of failures, length (km) and failure rate per material.
+    """
+    state = loadState(stateDir)
+    years = getYearsOfRecords(stateDir) if years is None else years
+
+    return PD.getFailureRatesByMaterial(gf.joinFailuresToPipes(state['pipes'], state['failureCounts']), years)
+
+def compareWithFullRebuild(fname:str=FILES.WORK_ORDERS, stateDir:str=STATE_DIR)->bool:
+    """
+        Checks that the incremental state gives the same failures per pipe and failure rates as ingesting all the
+        extract at once (in a temporary state, with the same assets and GIS pipes).
+    Args:
+        fname (str): Last work orders extract (it has to include the previous ones).
+        stateDir (str): Directory of the incremental state.
+    Returns:
+        bool: True if the failures per pipe and the failure rates are the same.
+    """
+    state = loadState(stateDir)
+    fullDir = tempfile.mkdtemp()
+
+    try:
+        full = {'watermark': None, 'firstDate': None, 'seenWONO': gf.NO_HASHES, 'seenRecords': gf.NO_HASHES,
+                'mainFailures': state['mainFailures'].iloc[:0], 'failureCounts': state['failureCounts'].iloc[:0],
+                'assets': state['assets'], 'pipes': state['pipes']}
+        saveState(full, fullDir)
+        ingestWorkOrders(fname, fullDir)
+
+        fullState = loadState(fullDir)
+        sameCounts = fullState['failureCounts'].sort_index().equals(state['failureCounts'].sort_index())
+        sameFailures = fullState['mainFailures'].index.sort_values().equals(state['mainFailures'].index.sort_values())
+        sameRates = getFailureRates(fullDir).equals(getFailureRates(stateDir))
+    finally:
+        shutil.rmtree(fullDir)
+
+    print("Same failures per pipe: ", sameCounts, ". Same failures: ", sameFailures, ". Same failure rates: ", sameRates)
+
+    return sameCounts and sameFailures and sameRates
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import NamedTuple, Callable
+
+import pandas as pd
+
+import FailuresCache as fc
+import FailureRateCube as FRC
+import GetFailures as gf
+import AddressIndex as AI
+import Schema as SCHEMA
+import SpatialJoins as SJ
+import WatercareConstants as WC
+import DataAnalysisConstants as DAC
+import Files as FILES
+
+
+PIPELINE_DIR = 'Cache/Pipeline'
+OUTPUT_FILE = 'output_{}.parquet'
+#written after the tables of an output, only outputs with it are complete
+META_FILE = 'meta.json'
+MAX_STAGE_BYTES = 2 * 1024**3 #2 GB per stage
+
+#Code of the constants used by every stage (part of all the keys)
+CONSTANTS_CODE = [WC.__file__, DAC.__file__, FILES.__file__]
+
+#Outputs of the stages already loaded or built in this session by (stage, key)
+_MEMORY = {}
+
+
+class Stage(NamedTuple):
+    """
+        Stage of the pipeline: function that builds its output (DataFrame or tuple of DataFrames) from the outputs of
+        its dependencies (in the same order), and the files and code it reads (part of its key). The key of a dated
+        stage also has the date, for outputs that depend on it (e.g. the current age of the pipes).
+    """
+    name: str
+    func: Callable
+    deps: list[str]
+    files: list[str]
+    code: list[str]
+    dated: bool = False
+
+
+def getBaseTable(pipes:pd.DataFrame, pressures:pd.DataFrame, geounits:pd.DataFrame)->pd.DataFrame:
+    """
+        GIS pipes with failures joined with the pressures and the main rock (getFailuresWithPressures and
+        joinWithGeoUnits of the notebooks, without removing pipes).
+    """
+    base = pipes.join(pressures).join(geounits)
+    assert base.shape[0] == pipes.shape[0]
+
+    return base
+
+def getBinnedTable(base:pd.DataFrame)->pd.DataFrame:
+    """
+        Base table with the ranges of age, diameter, max pressure and pressure fluctuation of each pipe (as putInRanges,
+        NaN for the values out of the bins or of the validity window of the material).
+    """
+    binned = base.copy()
+    for dim in FRC.RANGES:
+        codes, labels = FRC.getCodes(base, dim)
+        binned[dim] = pd.Categorical.from_codes(codes, labels)
+
+    #values out of the validity window of the material
+    materials = binned[WC.MATERIAL].astype('object')
+    windows = FRC.getValidityWindows(materials.dropna().unique().tolist()).reindex(materials)
+    for dim, (lower, upper) in FRC.VALIDITY.items():
+        values = pd.to_numeric(base[FRC.RANGES[dim][0]], errors='coerce').to_numpy(dtype='float64')
+        invalid = (values < windows[lower].to_numpy()) | (values > windows[upper].to_numpy())
+        binned[dim] = binned[dim].where(~invalid)
+
+    return binned
+
+def getStages(fname:str=FILES.WORK_ORDERS)->dict[str, Stage]:
+    """
+        Stages from the work orders to the binned base table.
+    """
+    stages = [Stage('filterCodes', lambda: gf.getFilterCodesAndSR(), [], [FILES.ACTCODE_REPAIR, FILES.SR_PROB_FILTER],
+                    []),
+              Stage('workOrders', lambda codes: gf.readWorkOrders(fname, codes[1], codes[0]), ['filterCodes'], [fname],
+                    [gf.__file__]),
+              Stage('assets', gf.getAssetsRecords, [], [FILES.ASSETS1, FILES.ASSETS2, FILES.ASSETS3], [gf.__file__]),
+              Stage('mainFailures', lambda orders, assets: SCHEMA.applySchema(
+                        gf.getMainFailures(orders[0], orders[1], assets, AI.getAddressIndex(assets))),
+                    ['workOrders', 'assets'], [], [gf.__file__, AI.__file__, SCHEMA.__file__]),
+              Stage('pipes', lambda failures, assets: gf.manage_GISPipes(failures, assets.index),
+                    ['mainFailures', 'assets'], [FILES.WATER_PIPES], [gf.__file__, SCHEMA.__file__], dated=True),
+              Stage('pressures', SJ.readPressureJoin, [], [FILES.PRESSURE_JOIN], [SJ.__file__]),
+              Stage('geounits', SJ.readGeounitsJoin, [], [FILES.GEOUNITS, FILES.GEOUNITS_PIPES_IDS,
+                                                          FILES.GEOUNITS_PIPES_JOIN], [SJ.__file__]),
+              Stage('base', getBaseTable, ['pipes', 'pressures', 'geounits'], [], [__file__]),
+              Stage('binned', getBinnedTable, ['base'], [FILES.MAT_CONSTS], [__file__, FRC.__file__])]
+
+    return {s.name: s for s in stages}
+
+def getDate()->str:
+    """
+        Date that is part of the keys of the dated stages.
+    """
+    return pd.Timestamp.today().date().isoformat()
+
+def getKeys(stages:dict[str, Stage], target:str, cacheDir:str=PIPELINE_DIR)->dict[str, str]:
+    """
+        Key of the target and of all its dependencies: hash of the name, files and code of the stage (with the
+        constants), the date for the dated stages and the keys of its dependencies (so a change in an input
+        invalidates every stage after it).
+    """
+    keys, knownHashes = {}, {}
+    fHashes = os.path.join(cacheDir, fc.HASHES_FILE)
+    if os.path.exists(fHashes):
+        with open(fHashes) as f:
+            knownHashes = json.load(f)
+
+    def getKey(name):
+        if name not in keys:
+            stage = stages[name]
+            h = hashlib.sha1(name.encode())
+            for fname in stage.files + stage.code + CONSTANTS_CODE:
+                h.update(os.path.basename(fname).encode())
+                h.update(fc.getFileHash(fname, knownHashes).encode())
+            if stage.dated:
+                h.update(getDate().encode())
+            for dep in stage.deps:
+                h.update(getKey(dep).encode())
+            keys[name] = h.hexdigest()
+        return keys[name]
+
+    getKey(target)
+
+    os.makedirs(cacheDir, exist_ok=True)
+    with open(fHashes, 'w') as f:
+        json.dump(knownHashes, f)
+
+    return keys
+
+def getOutputFiles(cacheDir:str, name:str, key:str)->list[str]:
+    """
+        Parquet files of the saved output of a stage (empty if it is not saved or its save was interrupted).
+    """
+    versionDir = os.path.join(cacheDir, name, key)
+    fMeta = os.path.join(versionDir, META_FILE)
+    if not os.path.exists(fMeta):
+        return []
+
+    with open(fMeta) as f:
+        n = json.load(f)['tables']
+    return [os.path.join(versionDir, OUTPUT_FILE.format(i)) for i in range(n)]
+
+def saveOutput(output, cacheDir:str, name:str, key:str):
+    """
+        Saves the output of a stage (a DataFrame or tuple of DataFrames) in parquet. The number of tables is written
+        last (META_FILE), so an interrupted save is never loaded.
+    """
+    versionDir = os.path.join(cacheDir, name, key)
+    fMeta = os.path.join(versionDir, META_FILE)
+    os.makedirs(versionDir, exist_ok=True)
+    if os.path.exists(fMeta):
+        os.remove(fMeta)
+
+    tables = output if isinstance(output, tuple) else (output,)
+    for i, df in enumerate(tables):
+        fc.saveTable(df, os.path.join(versionDir, OUTPUT_FILE.format(i)))
+
+    with open(fMeta + '.tmp', 'w') as f:
+        json.dump({'tables': len(tables)}, f)
+    os.replace(fMeta + '.tmp', fMeta)
+
+    fc.evictOldVersions(os.path.join(cacheDir, name), MAX_STAGE_BYTES, keep=key)
+
+def loadOutput(fnames:list[str]):
+    """
+        Output of a stage saved by saveOutput.
+    """
+    tables = tuple(fc.loadTable(f) for f in fnames)
+    return tables[0] if len(tables) == 1 else tables
+
+def shallowCopy(output):
+    """
+        Copy of an output that shares the data (copy on write), so changes made by the caller do not reach the memory.
+    """
+    if isinstance(output, tuple):
+        return tuple(df.copy(deep=False) for df in output)
+    return output.copy(deep=False)
+
+def getPlan(target:str, fname:str=FILES.WORK_ORDERS, cacheDir:str=PIPELINE_DIR)->pd.DataFrame:
+    """
+        Stages needed by the target with their key, dependencies and where their output is (memory, disk or none).
+    """
+    stages = getStages(fname)
+    keys = getKeys(stages, target, cacheDir)
+
+    plan = []
+    for name, key in keys.items():
+        where = 'memory' if (name, key) in _MEMORY else 'disk' if getOutputFiles(cacheDir, name, key) else 'none'
+        plan.append({'Stage': name, 'Key': key, 'Dependencies': stages[name].deps, 'Output': where})
+
+    return pd.DataFrame(plan).set_index('Stage')
+
+def run(target:str, fname:str=FILES.WORK_ORDERS, cacheDir:str=PIPELINE_DIR, workers:int=4, rebuild:bool=False):
+    """
+        Output of a stage of the pipeline (e.g. 'pipes', 'base' or 'binned'). Each stage is only built if its output is
+        not in memory or on disk for the current inputs; the stages whose dependencies are ready run concurrently (e.g.
+        the assets, the pressures and the geounits).
+    Args:
+        target (str): Name of the stage (see getStages).
+        fname (str): Work orders file.
+        cacheDir (str): Directory of the saved outputs.
+        workers (int): Number of stages run at the same time.
+        rebuild (bool): If True, the target and its dependencies are built again.
+    Returns:
+        DataFrame or tuple of DataFrames: Output of the target.
+    """
+    stages = getStages(fname)
+    keys = getKeys(stages, target, cacheDir)
+    outputs = {}
+
+    #stages in memory or on disk are not built (their dependencies are not needed unless another stage needs them)
+    needed, pending = set(), [target]
+    while pending:
+        name = pending.pop()
+        if name in needed or name in outputs:
+            continue
+        key = keys[name]
+        fnames = getOutputFiles(cacheDir, name, key)
+        if not rebuild and (name, key) in _MEMORY:
+            outputs[name] = _MEMORY[(name, key)]
+        elif not rebuild and fnames:
+            start = time.perf_counter()
+            outputs[name] = _MEMORY[(name, key)] = loadOutput(fnames)
+            print("Loaded ", name, " from the cache in ", "%.2f" % (time.perf_counter() - start), " s")
+        else:
+            needed.add(name)
+            pending.extend(stages[name].deps)
+
+    def build(name):
+        start = time.perf_counter()
+        output = stages[name].func(*[outputs[d] for d in stages[name].deps])
+        saveOutput(output, cacheDir, name, keys[name])
+        print("Built ", name, " in ", "%.2f" % (time.perf_counter() - start), " s")
+        return output
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while needed or running:
+            ready = [n for n in needed if all(d in outputs for d in stages[n].deps)]
+            for name in ready:
+                needed.remove(name)
+                running[pool.submit(build, name)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                outputs[name] = _MEMORY[(name, keys[name])] = future.result()
+
+    return shallowCopy(outputs[target])
+
+def clearMemory():
+    """
+        Removes the outputs kept in memory (the ones on disk are kept).
+    """
+    _MEMORY.clear()
+
+def compareWithGetFailures(fname:str=FILES.WORK_ORDERS, cacheDir:str=PIPELINE_DIR)->bool:
+    """
+        Checks that the pipes and main failures of the pipeline are the same as the ones of getFailures.
+    """
+    pipes, mainFailures = gf.getFailures(fname)
+    found = run('pipes', fname, cacheDir)
+    foundFailures = run('mainFailures', fname, cacheDir)
+
+    same = pipes.equals(found) and mainFailures.equals(foundFailures)
+    print("Same tables as getFailures: ", same)
+
+    return same
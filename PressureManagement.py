@@ -0,0 +1,249 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import crackGrowthCalculations as cc
+import crackGrowthSensitivity as cs
+import crackGrowthSurrogate as cgs
+import DataAnalysisConstants as DAC
+import SpatialJoins as SJ
+import WatercareConstants as WC
+
+
+PRESSURE = 'MOD_MAXPRE'
+LBL_PRESSURE_RANGE = 'Maximum pressure (m)'
+
+#Columns of the calibrated equations of each material: burst rate = slope*age + intercept at the mean pressure of the
+#low and high pressure categories (getBurstRateColMatPerRegression and cateSelec of the calibration notebook)
+EQUATION_COLS = ['Slope low', 'Intercept low', 'Pressure low', 'Slope high', 'Intercept high', 'Pressure high']
+
+EXPECTED_FAILURES = 'Expected failures/year'
+LEAKAGE = 'Leakage (m3/day)'
+
+#Days a leak runs before it is repaired (awareness, location and repair)
+LEAK_RUN_DAYS = 2
+
+
+
+class PressureNetwork(NamedTuple):
+    """
+        Pipes of the scenario engine sorted by pressure zone (MODEL_NAME): the pipes of zones[i] are the rows
+        zoneStarts[i] to zoneStarts[i+1]. The burst rate equation of each pipe is kept as the coefficients of
+        rate = (age + a0 + t*(a1-a0)) / (c0 + t*(c1-c0)) with t = (h - hLow) / (hHigh - hLow), whose denominator
+        keeps its sign in the pressure range (see checkEquations).
+    """
+    zones: list[str]
+    zoneStarts: np.ndarray
+    compkeys: np.ndarray
+    length: np.ndarray
+    age: np.ndarray
+    pressure: np.ndarray
+    hLow: np.ndarray
+    hHigh: np.ndarray
+    a0: np.ndarray
+    a1: np.ndarray
+    c0: np.ndarray
+    c1: np.ndarray
+    leakArea: float
+    leakCd: float
+    leakSlope: np.ndarray
+    runDays: float
+    pressureRange: tuple[float, float] = (0, np.inf)
+
+
+def getCalibratedEquations(dfGroup:pd.DataFrame, slp:list[float], bs:list[float], slpH:list[float], bsH:list[float],
+                           materials:list[str], cateSelec:dict)->pd.DataFrame:
+    """
+        Calibrated equations per material from the outputs of the calibration notebook: the slopes and intercepts of
+        the low and high pressure categories and their mean pressure (as getFailureRateCountourLines).
+    Args:
+        dfGroup (pd.DataFrame): Grouped table of getAgeMaxPressRegreGraphs (MATERIAL, Maximum pressure (m), MOD_MAXPRE
+            and Shape_Leng).
+        slp, bs, slpH, bsH (list[float]): Slopes and intercepts of the low and high categories per material.
+        materials (list[str]): Materials of the lists (MATERIALS_PREDOMI).
+        cateSelec (dict): Low and high pressure category of each material.
+    Returns:
+        pd.DataFrame: EQUATION_COLS per material.
+    """
+    dfG = dfGroup.groupby([WC.MATERIAL, LBL_PRESSURE_RANGE], observed=True).agg({PRESSURE: 'mean'})
+
+    equations = pd.DataFrame({'Slope low': slp, 'Intercept low': bs,
+                              'Pressure low': [dfG.loc[(m, cateSelec[m]['Low']), PRESSURE] for m in materials],
+                              'Slope high': slpH, 'Intercept high': bsH,
+                              'Pressure high': [dfG.loc[(m, cateSelec[m]['High']), PRESSURE] for m in materials]},
+                             index=pd.Index(materials, name=WC.MATERIAL))
+    return equations
+
+def checkEquations(equations:pd.DataFrame, pressureRange:tuple[float, float]):
+    """
+        Raises a ValueError if the equation of a material does not give finite burst rates in the pressure range: a slope
+        of zero (or not finite), the same pressure in both categories or a denominator of the rate (see PressureNetwork)
+        that is zero or changes of sign in the range (it is linear in the pressure, so its borders are checked).
+    Args:
+        equations (pd.DataFrame): Calibrated equations per material (getCalibratedEquations).
+        pressureRange (tuple[float, float]): Minimum and maximum pressure in m.
+    """
+    eq = equations[EQUATION_COLS].to_numpy(dtype='float64')
+    sL, bL, hL, sH, bH, hH = eq.T
+    invalid = ~np.isfinite(eq).all(axis=1) | (sL == 0) | (sH == 0) | (hL == hH)
+
+    with np.errstate(all='ignore'):
+        c0, c1 = 1/sL, 1/sH
+        cMin, cMax = [c0 + (h - hL) / (hH - hL) * (c1 - c0) for h in pressureRange]
+    invalid |= ~(cMin * cMax > 0)
+
+    if invalid.any():
+        raise ValueError("Equations without finite burst rates between " + str(pressureRange[0]) + " and " +
+                         str(pressureRange[1]) + " m: " + ', '.join(map(str, equations.index[invalid])))
+
+def getLeakSlopes(diameter:np.ndarray, material:np.ndarray, thickness:dict[str, float],
+                  crackLength:float)->np.ndarray:
+    """
+        Head-area slope (FAVAD) of a typical longitudinal crack of each pipe (getHeadAreaSlopeLong), evaluated once per
+        combination of diameter and material.
+    Args:
+        diameter (np.ndarray): Internal diameter of the pipes in m.
+        material (np.ndarray): Material of the pipes.
+        thickness (dict[str, float]): Wall thickness in m per material.
+        crackLength (float): Length of the crack in m.
+    Returns:
+        np.ndarray: Head-area slope in m^2/m per pipe (0 for pipes without constants).
+    """
+    E = cgs.getMaterialCrackConstants()['E']
+    combos = pd.DataFrame({'D': diameter, 'M': material})
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(combos))
+
+    slopes = np.zeros(len(uniques))
+    for i, (d, m) in enumerate(uniques):
+        if m in E.index and m in thickness and d > 0:
+            slopes[i] = cc.getHeadAreaSlopeLong(crackLength, d, E[m], thickness[m])
+
+    return slopes[codes]
+
+def buildNetwork(pipes:pd.DataFrame, equations:pd.DataFrame, crackWidth:float, crackLength:float,
+                 thickness:dict[str, float]=None, leakCd:float=None, runDays:float=LEAK_RUN_DAYS,
+                 pressureRange:tuple[float, float]=None)->PressureNetwork:
+    """
+        Prepares the pipes with pressures (getFailuresWithPressures or SpatialJoins) for the scenario engine. Pipes
+        without pressure zone, pressure, age or an equation of their material are not included. The equations are
+        checked in the pressure range (checkEquations).
+    Args:
+        pipes (pd.DataFrame): Pipes with MATERIAL, Shape_Leng (km), Age Today, MOD_MAXPRE, MODEL_NAME and NOM_DIA_MM.
+        equations (pd.DataFrame): Calibrated equations per material (getCalibratedEquations).
+        crackWidth (float): Width of the crack of the leaks in m.
+        crackLength (float): Length of the crack of the leaks in m.
+        thickness (dict[str, float]): Wall thickness in m per material for the head-area slope of the leaks. Default is
+            None (leaks with a fixed area).
+        leakCd (float): Discharge coefficient of the leaks. Default is None (typical Cd of the sensitivity ranges).
+        runDays (float): Days a leak runs before it is repaired.
+        pressureRange (tuple[float, float]): Minimum and maximum pressure in m of the burst rates, the pressures of
+            the scenarios are bounded to it. Default is None (0 to the maximum pressure of the pipes, the equations are
+            not extrapolated to higher pressures).
+    Returns:
+        PressureNetwork: Pipes sorted by zone with the coefficients of their equations.
+    """
+    leakCd = cs.getSensitivityRanges().loc['Cd', 'Typical'] if leakCd is None else leakCd
+
+    material = pipes[WC.MATERIAL].astype('object')
+    valid = (material.isin(equations.index) & pipes[SJ.MODEL_NAME].notna() & pipes[PRESSURE].notna()
+             & pipes[DAC.CURRENT_AGE].notna())
+    print("Pipe length in the scenario engine ", "%.2f" % pipes.loc[valid, WC.LENG].sum(), " from original ",
+          "%.2f" % pipes[WC.LENG].sum())
+
+    data = pipes[valid].sort_values(SJ.MODEL_NAME, kind='stable')
+    pressureRange = (0, data[PRESSURE].max()) if pressureRange is None else tuple(pressureRange)
+    checkEquations(equations.loc[equations.index.isin(data[WC.MATERIAL].astype('object'))], pressureRange)
+    zoneCodes, zones = pd.factorize(data[SJ.MODEL_NAME], sort=True)
+    eq = equations.reindex(data[WC.MATERIAL].astype('object')).to_numpy(dtype='float64')
+    sL, bL, hL, sH, bH, hH = eq.T
+
+    if thickness is None:
+        leakSlope = np.zeros(data.shape[0])
+    else:
+        leakSlope = getLeakSlopes(data[WC.NOM_DIA_MM].to_numpy(dtype='float64') / 1000,
+                                  data[WC.MATERIAL].astype('object').to_numpy(), thickness, crackLength)
+
+    return PressureNetwork(list(zones), np.searchsorted(zoneCodes, np.arange(len(zones))),
+                           data.index.to_numpy(), data[WC.LENG].to_numpy(dtype='float64'),
+                           data[DAC.CURRENT_AGE].to_numpy(dtype='float64'), data[PRESSURE].to_numpy(dtype='float64'),
+                           hL, hH, bL/sL, bH/sH, 1/sL, 1/sH, crackWidth * crackLength, leakCd, leakSlope, runDays,
+                           pressureRange)
+
+def getBurstRates(network:PressureNetwork, pressure:np.ndarray)->np.ndarray:
+    """
+        Calibrated burst rate (Failures/Km/year) of the pipes at the given pressures: the age of the pipe is placed on
+        the straight line between the low and high pressure equations (the contour lines of the calibration notebook).
+        Pressures out of the range of the network are taken at its border.
+    Args:
+        network (PressureNetwork): Pipes of the engine.
+        pressure (np.ndarray): Pressure of each pipe in m (nPipes) or per scenario (nScenarios, nPipes).
+    Returns:
+        np.ndarray: Burst rate of each pipe (not negative).
+    """
+    pressure = np.clip(pressure, *network.pressureRange)
+    t = (pressure - network.hLow) / (network.hHigh - network.hLow)
+    rate = (network.age + network.a0 + t * (network.a1 - network.a0)) / (network.c0 + t * (network.c1 - network.c0))
+
+    return np.maximum(rate, 0)
+
+def evaluateScenarios(network:PressureNetwork, deltas:np.ndarray)->tuple[np.ndarray,np.ndarray]:
+    """
+        Expected failures/year and leakage of every zone for each scenario of pressure changes.
+    Args:
+        network (PressureNetwork): Pipes of the engine.
+        deltas (np.ndarray): Pressure change (m) of each zone per scenario (nScenarios, nZones).
+    Returns:
+        tuple[np.ndarray,np.ndarray]: Expected failures/year and leakage (m3/day) per scenario and zone.
+    """
+    #pressure of each pipe in each scenario (pipes are sorted by zone)
+    counts = np.diff(np.append(network.zoneStarts, network.length.size))
+    pressure = np.maximum(network.pressure + np.repeat(deltas, counts, axis=1), 0)
+
+    failures = getBurstRates(network, pressure) * network.length
+    flow = cc.calculateQWithFAVAD(network.leakCd, pressure, network.leakArea, network.leakSlope) * 86400 #m3/day
+    leakage = failures * network.runDays / 365 * flow
+
+    return (np.add.reduceat(failures, network.zoneStarts, axis=1),
+            np.add.reduceat(leakage, network.zoneStarts, axis=1))
+
+def evaluateChunk(args:tuple[PressureNetwork,np.ndarray])->tuple[np.ndarray,np.ndarray]:
+    """
+        Evaluates one chunk of scenarios. Used by the process pool.
+    """
+    return evaluateScenarios(*args)
+
+def runScenarios(network:PressureNetwork, scenarios:pd.DataFrame, chunkSize:int=20, workers:int=None)->pd.DataFrame:
+    """
+        Evaluates the scenarios of pressure changes over the whole network in chunks over a process pool.
+    Args:
+        network (PressureNetwork): Pipes of the engine.
+        scenarios (pd.DataFrame): Pressure change (m) per scenario (rows) and zone (columns, MODEL_NAME). Zones that
+            are not in the columns keep their pressure.
+        chunkSize (int): Number of scenarios per chunk.
+        workers (int): Number of processes. Default is None (number of CPUs), 1 runs without the pool.
+    Returns:
+        pd.DataFrame: Expected failures/year and leakage (m3/day) per scenario and zone.
+    """
+    deltas = scenarios.reindex(columns=network.zones, fill_value=0).to_numpy(dtype='float64')
+    chunks = [(network, deltas[s:s + chunkSize]) for s in range(0, deltas.shape[0], chunkSize)]
+
+    if workers == 1:
+        results = [evaluateChunk(c) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(evaluateChunk, chunks))
+
+    failures = np.concatenate([r[0] for r in results])
+    leakage = np.concatenate([r[1] for r in results])
+
+    index = pd.MultiIndex.from_product([scenarios.index, network.zones], names=[scenarios.index.name or 'Scenario',
+                                                                              SJ.MODEL_NAME])
+    return pd.DataFrame({EXPECTED_FAILURES: failures.ravel(), LEAKAGE: leakage.ravel()}, index=index)
+
+def getScenarioTotals(results:pd.DataFrame)->pd.DataFrame:
+    """
+        Expected failures/year and leakage of the whole network per scenario.
+    """
+    return results.groupby(level=0, sort=False).sum()
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+
+
+#Canonical material group of the raw GIS material codes (codes not in the table are kept as they are)
+MATERIAL_GROUPS = {WC.UNKNOWN: np.nan,
+                   WC.FB: WC.AC,
+                   WC.ALK: WC.PE,
+                   WC.CLCI: DAC.IRON, WC.DI: DAC.IRON, WC.ELCI: DAC.IRON, WC.CLDI: DAC.IRON, WC.GI: DAC.IRON,
+                   WC.CI: DAC.IRON}
+
+#Fixed categories of the categorical columns. Columns with None get the values found in the data, and values that are not
+#in a fixed set are added at the end of its categories.
+CATEGORIES = {WC.MATERIAL: [WC.AC, DAC.IRON, WC.PE, WC.PVC, DAC.OTHER],
+              WC.STATUS: None,
+              WC.ACTCODE: None,
+              WC.SR_PROB: None}
+
+
+def toCategorical(values:pd.Series, categories:list[str]=None, mapping:dict=None)->pd.Series:
+    """
+        Converts a column to a categorical with the given categories in one pass over the values: the unique values are
+        mapped (mapping) and placed in the categories, and then the codes of all the values are taken from them.
+    Args:
+        values (pd.Series): Column to convert.
+        categories (list[str]): Categories of the result. Default is the sorted (mapped) values.
+        mapping (dict): Lookup table of the values (e.g. MATERIAL_GROUPS), values not in it are kept.
+    Returns:
+        pd.Series: Categorical column with the same index.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    uniques = pd.Series(np.asarray(uniques, dtype='object'))
+    if mapping is not None:
+        uniques = uniques.map(lambda v: mapping.get(v, v))
+
+    found = sorted(uniques.dropna().unique())
+    if categories is None:
+        categories = found
+    else:
+        extra = [c for c in found if c not in categories]
+        if extra:
+            print("Values of ", values.name, " not in its categories: ", extra)
+        categories = list(categories) + extra
+
+    #code of each unique value in the categories (-1 is NaN)
+    uniqueCodes = pd.Index(categories).get_indexer(uniques)
+    codes = np.where(codes >= 0, uniqueCodes[codes], -1) if uniqueCodes.size else np.full(codes.size, -1)
+
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=values.index, name=values.name)
+
+def normaliseMaterials(materials:pd.Series)->pd.Series:
+    """
+        Canonical material groups (MATERIAL_GROUPS) of the raw material codes as a categorical.
+    """
+    return toCategorical(materials, CATEGORIES[WC.MATERIAL], MATERIAL_GROUPS)
+
+def applySchema(df:pd.DataFrame)->pd.DataFrame:
+    """
+        Converts the columns of the schema (CATEGORIES) that are in the table to categoricals. MATERIAL is also
+        normalised to its groups if it is not already categorical.
+    Args:
+        df (pd.DataFrame): Table (pipes, failures, etc.).
+    Returns:
+        pd.DataFrame: Copy of the table with the categorical columns.
+    """
+    df = df.copy()
+    for col, categories in CATEGORIES.items():
+        if col not in df.columns or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if col == WC.MATERIAL:
+            df[col] = normaliseMaterials(df[col])
+        else:
+            df[col] = toCategorical(df[col], categories)
+
+    return df
+
+def getMemoryReport(df:pd.DataFrame, before:pd.DataFrame=None)->pd.DataFrame:
+    """
+        Memory (deep) used by each column of a table and, if the table before the schema is given, the reduction.
+    Args:
+        df (pd.DataFrame): Table.
+        before (pd.DataFrame): Same table before applySchema.
+    Returns:
+        pd.DataFrame: dtype and MB per column (and the total), MB before and ratio if before is given.
+    """
+    report = pd.DataFrame({'dtype': df.dtypes.astype('str'), 'MB': df.memory_usage(deep=True, index=False) / 1024**2})
+    report.loc['Total'] = ['', report['MB'].sum()]
+
+    if before is not None:
+        report['MB before'] = before.memory_usage(deep=True, index=False) / 1024**2
+        report.loc['Total', 'MB before'] = report['MB before'].iloc[:-1].sum()
+        report['Ratio'] = report['MB before'] / report['MB']
+
+    return report
@@ -0,0 +1,276 @@
+import os
+import pickle
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import NamedTuple, Callable
+
+import numpy as np
+import pandas as pd
+
+
+ALIGNMENT = 64 #bytes, so every column starts in its own cache line
+INDEX_COLUMN = '__index__'
+LAYOUT_FILE = 'layout.pkl'
+DATA_FILE = 'data.bin'
+
+#Buffers of the tables exported or attached in this process by name, and table of the workers of mapChunks
+_BUFFERS = {}
+_TABLE = {}
+
+
+class SharedTable(NamedTuple):
+    """
+        Layout of a table exported in a shared memory block (name) or in a memory mapped file (path). Each column is a
+        contiguous array at an offset of the buffer: numeric and datetime columns keep their values and the
+        categoricals and strings are stored as integer codes (their categories are in the layout). The layout is small,
+        so it is what is sent to the workers.
+    """
+    name: str
+    path: str
+    nbytes: int
+    rows: int
+    index: str
+    columns: dict
+
+
+def getColumnArrays(series:pd.Series)->tuple[np.ndarray, dict]:
+    """
+        Array stored for a column and how to rebuild it.
+    Returns:
+        tuple[np.ndarray, dict]: Values (or codes) and the description of the column (kind and dtype or categories).
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), {'kind': 'categorical', 'categories': dtype.categories,
+                                             'ordered': dtype.ordered}
+    if isinstance(dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(dtype):
+        values = series.array._ndarray if isinstance(dtype, pd.DatetimeTZDtype) else series.to_numpy()
+        return values.view('int64'), {'kind': 'datetime', 'dtype': dtype}
+    if pd.api.types.is_bool_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+        return series.to_numpy(), {'kind': 'numeric', 'dtype': np.dtype(bool)}
+    if pd.api.types.is_numeric_dtype(dtype):
+        #nullable integers and floats are stored as float64 (NaN for the missing values)
+        values = series.to_numpy() if isinstance(dtype, np.dtype) else series.to_numpy(dtype='float64', na_value=np.nan)
+        return values, {'kind': 'numeric', 'dtype': values.dtype}
+
+    #strings and other objects are stored as categoricals
+    codes, categories = pd.factorize(series, use_na_sentinel=True)
+    cat = pd.Categorical.from_codes(codes, categories=categories)
+    return cat.codes, {'kind': 'categorical', 'categories': cat.categories, 'ordered': False}
+
+def getColumnView(buffer, rows:int, layout:dict):
+    """
+        Column rebuilt over the buffer without copying (read only).
+    """
+    values = np.ndarray(rows, dtype=layout['storage'], buffer=buffer, offset=layout['offset'])
+    values.flags.writeable = False
+
+    if layout['kind'] == 'categorical':
+        return pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(layout['categories'], layout['ordered']),
+                                         validate=False)
+    if layout['kind'] == 'datetime':
+        dtype = layout['dtype']
+        unit = dtype.unit if isinstance(dtype, pd.DatetimeTZDtype) else np.datetime_data(dtype)[0]
+        dates = values.view('M8[' + unit + ']')
+        return pd.arrays.DatetimeArray._simple_new(dates, dtype=dtype) if isinstance(dtype, pd.DatetimeTZDtype) \
+            else dates
+
+    return values
+
+def exportTable(df:pd.DataFrame, name:str=None, path:str=None)->SharedTable:
+    """
+        Exports a table (e.g. wPipesGISNfailures) once so the workers can attach to it by name without copying it.
+        The buffer is kept open in this process until releaseTable.
+    Args:
+        df (pd.DataFrame): Table to export (the index is exported as a column).
+        name (str): Name of the shared memory block. Default is None (a new name).
+        path (str): Directory of a memory mapped file to use instead of the shared memory (e.g. to keep the table
+            between sessions). Default is None (shared memory).
+    Returns:
+        SharedTable: Layout of the table.
+    """
+    start = time.perf_counter()
+    arrays, columns, offset = {}, {}, 0
+    series = [(INDEX_COLUMN, df.index.to_series())] + list(df.items())
+    for col, values in series:
+        array, layout = getColumnArrays(values)
+        array = np.ascontiguousarray(array)
+        layout.update(storage=array.dtype, offset=offset)
+        arrays[col], columns[col] = array, layout
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    nbytes = max(offset, 1)
+
+    if path is None:
+        name = name or 'wds_' + uuid.uuid4().hex[:12]
+        shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        buffer, handle = shm.buf, shm
+    else:
+        os.makedirs(path, exist_ok=True)
+        name = name or os.path.abspath(path)
+        handle = np.memmap(os.path.join(path, DATA_FILE), dtype='uint8', mode='w+', shape=(nbytes,))
+        buffer = handle
+
+    for col, array in arrays.items():
+        target = np.ndarray(array.shape, dtype=array.dtype, buffer=buffer, offset=columns[col]['offset'])
+        target[:] = array
+
+    table = SharedTable(name, path, nbytes, df.shape[0], df.index.name, columns)
+    _BUFFERS[name] = {'handle': handle, 'owner': True}
+    if path is not None:
+        handle.flush()
+        with open(os.path.join(path, LAYOUT_FILE), 'wb') as f:
+            pickle.dump(table, f)
+
+    print("Exported table of ", df.shape[0], " rows and ", df.shape[1], " columns (", "%.1f" % (nbytes / 1024**2),
+          " MB) in ", "%.2f" % (time.perf_counter() - start), " s")
+
+    return table
+
+def loadLayout(path:str)->SharedTable:
+    """
+        Layout of a table exported in a memory mapped file.
+    """
+    with open(os.path.join(path, LAYOUT_FILE), 'rb') as f:
+        return pickle.load(f)
+
+def getBuffer(table:SharedTable):
+    """
+        Buffer of a table (attached to the shared memory or the file the first time it is used in the process).
+    """
+    if table.name not in _BUFFERS:
+        if table.path is None:
+            shm = shared_memory.SharedMemory(name=table.name)
+            _BUFFERS[table.name] = {'handle': shm, 'owner': False}
+        else:
+            mm = np.memmap(os.path.join(table.path, DATA_FILE), dtype='uint8', mode='r', shape=(table.nbytes,))
+            _BUFFERS[table.name] = {'handle': mm, 'owner': False}
+
+    handle = _BUFFERS[table.name]['handle']
+    return handle.buf if isinstance(handle, shared_memory.SharedMemory) else handle
+
+def attachTable(table:SharedTable, columns:list[str]=None)->pd.DataFrame:
+    """
+        Table over the shared buffer: the columns are views of it (read only, nothing is copied). The strings come back
+        as categoricals and the nullable numbers as float64.
+    Args:
+        table (SharedTable): Layout returned by exportTable (or loadLayout).
+        columns (list[str]): Columns to attach. Default is None (all).
+    Returns:
+        pd.DataFrame: Table with the same index.
+    """
+    buffer = getBuffer(table)
+    columns = [c for c in table.columns if c != INDEX_COLUMN] if columns is None else columns
+
+    index = pd.Index(getColumnView(buffer, table.rows, table.columns[INDEX_COLUMN]), name=table.index, copy=False)
+    data = {c: getColumnView(buffer, table.rows, table.columns[c]) for c in columns}
+
+    return pd.DataFrame(data, index=index, columns=columns, copy=False)
+
+def getArrays(table:SharedTable, columns:list[str]=None)->dict[str, np.ndarray]:
+    """
+        Stored arrays of the columns (values or codes) over the shared buffer, for numeric work without pandas.
+    """
+    buffer = getBuffer(table)
+    columns = list(table.columns) if columns is None else columns
+    arrays = {}
+    for c in columns:
+        layout = table.columns[c]
+        arrays[c] = np.ndarray(table.rows, dtype=layout['storage'], buffer=buffer, offset=layout['offset'])
+        arrays[c].flags.writeable = False
+
+    return arrays
+
+def releaseTable(table:SharedTable, unlink:bool=None):
+    """
+        Closes the buffer of a table in this process. The shared memory is removed by the process that exported it
+        (the memory mapped files are kept).
+    Args:
+        table (SharedTable): Layout of the table.
+        unlink (bool): Remove the shared memory. Default is None (only if this process exported it).
+    """
+    buffer = _BUFFERS.pop(table.name, None)
+    if buffer is None:
+        return
+
+    handle = buffer['handle']
+    if isinstance(handle, shared_memory.SharedMemory):
+        handle.close()
+        if buffer['owner'] if unlink is None else unlink:
+            handle.unlink()
+
+@contextmanager
+def sharedTable(df:pd.DataFrame, name:str=None):
+    """
+        Exports a table in shared memory for the block and removes it at the end.
+    Yields:
+        SharedTable: Layout of the table.
+    """
+    table = exportTable(df, name)
+    try:
+        yield table
+    finally:
+        releaseTable(table)
+
+def setTable(table:SharedTable, columns:list[str]):
+    """
+        Attaches the table in the worker. Used as initializer of the pool.
+    """
+    _TABLE.update(df=attachTable(table, columns))
+
+def runChunk(task:tuple[Callable, int, int, tuple]):
+    """
+        Applies the function to the rows [start, stop) of the table of the worker.
+    """
+    func, start, stop, args = task
+    return func(_TABLE['df'].iloc[start:stop], *args)
+
+def getChunks(rows:int, chunks:int)->list[tuple[int, int]]:
+    """
+        Limits [start, stop) of chunks of rows of similar size.
+    """
+    limits = np.linspace(0, rows, max(1, min(chunks, rows)) + 1).astype(int)
+    return list(zip(limits[:-1].tolist(), limits[1:].tolist()))
+
+def mapChunks(func:Callable, table:SharedTable, args:tuple=(), chunks:int=None, workers:int=None,
+              columns:list[str]=None)->list:
+    """
+        Maps a function over chunks of rows of a shared table with a process pool (e.g. bootstrap replicates, scoring of
+        the crack model or the folds of a model). Each worker attaches to the table once, so only the limits of the
+        chunks and the results are sent between the processes.
+    Args:
+        func (Callable): Function of the chunk (a view of the rows) and the args. It must be defined in a module (not in
+            a notebook) to be sent to the workers.
+        table (SharedTable): Layout of the table.
+        args (tuple): Other arguments of the function.
+        chunks (int): Number of chunks. Default is None (4 per worker).
+        workers (int): Number of processes. Default is None (number of CPUs).
+        columns (list[str]): Columns attached by the workers. Default is None (all).
+    Returns:
+        list: Result of each chunk, in the order of the rows.
+    """
+    workers = workers or os.cpu_count() or 1
+    limits = getChunks(table.rows, chunks or 4 * workers)
+    tasks = [(func, start, stop, args) for start, stop in limits]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=setTable, initargs=(table, columns)) as pool:
+        return list(pool.map(runChunk, tasks))
+
+def getPrivateMemory()->float:
+    """
+        Memory of the current process that is not shared with other processes in MB (linux only, NaN otherwise).
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            return sum(int(line.split()[1]) for line in f if line.startswith(('Private_Clean', 'Private_Dirty'))) / 1024
+    except OSError:
+        return np.nan
+
+def getChunkMemory(df:pd.DataFrame)->tuple[float, float]:
+    """
+        Sum of the numeric columns of a chunk (so all its pages are read) and the private memory of the worker after it.
+    """
+    total = float(sum(np.nansum(df[c].to_numpy(dtype='float64')) for c in df.select_dtypes('number').columns))
+    return total, getPrivateMemory()
@@ -0,0 +1,276 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import shapely
+
+import WatercareConstants as WC
+import Files as FILES
+
+
+PRESSURE_COLS = ['MOD_MAXPRE', 'MOD_MINPRE', 'Press_fluc']
+MODEL_NAME = 'MODEL_NAME'
+DISTANCE = 'Distance'
+MAIN_ROCK = 'main_rock'
+WKT = 'WKT'
+
+
+class PipeNeighbours(NamedTuple):
+    """
+        Non failed pipes within a radius of each failed pipe as a CSR adjacency: the neighbours of failed[i] are
+        nonFailed[indices[indptr[i]:indptr[i+1]]].
+    """
+    failed: np.ndarray
+    nonFailed: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    radius: float
+
+
+def readPipeGeometries(fname:str=FILES.PIPES_GEOMETRY)->pd.DataFrame:
+    """
+        Geometries of the GIS pipes (one row per feature, in the order of the features as Water_pipes.csv).
+    Args:
+        fname (str): CSV with COMPKEY and the geometry in WKT.
+    Returns:
+        pd.DataFrame: COMPKEY and geometry (shapely) per feature.
+    """
+    pipes = pd.read_csv(fname, delimiter = ',', dtype = {WC.COMPKEY:'int64', WKT:'str'}, usecols=[WC.COMPKEY, WKT])
+    pipes['geometry'] = shapely.from_wkt(pipes.pop(WKT).to_numpy())
+
+    return pipes
+
+def readPressureNodes(fname:str=FILES.PRESSURE_NODES)->pd.DataFrame:
+    """
+        Nodes of the hydraulic models with their pressures (X, Y in the same coordinate system as the pipes).
+    """
+    nodes = pd.read_csv(fname, delimiter = ',', dtype = {'X':'float64', 'Y':'float64', MODEL_NAME:'str'})
+    nodes['geometry'] = shapely.points(nodes['X'].to_numpy(), nodes['Y'].to_numpy())
+
+    return nodes
+
+def readGeounitPolygons(fname:str=FILES.GEOUNITS_GEOMETRY)->pd.DataFrame:
+    """
+        Polygons of the geounits with their main rock (one row per feature, in the order of Geounits.csv).
+    """
+    geounits = pd.read_csv(fname, delimiter = ',', dtype = {MAIN_ROCK:'str', WKT:'str'}, usecols=[MAIN_ROCK, WKT])
+    geounits['geometry'] = shapely.from_wkt(geounits.pop(WKT).to_numpy())
+
+    return geounits
+
+def getNearestPressures(pipes:pd.DataFrame, nodes:pd.DataFrame)->pd.DataFrame:
+    """
+        Pressures of the nearest node of each pipe (distance from the line to the node as the GIS near join) using a
+        STR-tree of the nodes. The features of the same COMPKEY are merged as in getFailuresWithPressures (mean of the
+        values and first model name).
+    Args:
+        pipes (pd.DataFrame): COMPKEY and geometry per feature (readPipeGeometries).
+        nodes (pd.DataFrame): Nodes with geometry, pressures and MODEL_NAME (readPressureNodes).
+    Returns:
+        pd.DataFrame: MOD_MAXPRE, MOD_MINPRE, Press_fluc, Distance and MODEL_NAME per COMPKEY.
+    """
+    tree = shapely.STRtree(nodes['geometry'].to_numpy())
+    (iPipe, iNode), distance = tree.query_nearest(pipes['geometry'].to_numpy(), return_distance=True, all_matches=False)
+
+    near = nodes.iloc[iNode][PRESSURE_COLS + [MODEL_NAME]].reset_index(drop=True)
+    near[DISTANCE] = distance
+    near[WC.COMPKEY] = pipes[WC.COMPKEY].to_numpy()[iPipe]
+
+    return near.groupby(WC.COMPKEY).agg({'MOD_MAXPRE': 'mean', 'MOD_MINPRE': 'mean', 'Press_fluc': 'mean',
+                                         DISTANCE: 'mean', MODEL_NAME: 'first'})
+
+def getGeounitIntersections(pipes:pd.DataFrame, geounits:pd.DataFrame)->pd.DataFrame:
+    """
+        Length of each pipe feature inside each geounit (as IntersectGeounitsVsWaterP.csv), using a STR-tree of the
+        polygons and the vectorised intersection of all the candidate pairs.
+    Args:
+        pipes (pd.DataFrame): COMPKEY and geometry per feature (readPipeGeometries).
+        geounits (pd.DataFrame): main_rock and geometry per geounit (readGeounitPolygons).
+    Returns:
+        pd.DataFrame: FID_Water_, FID_250KGe and Shape_Leng per intersection.
+    """
+    tree = shapely.STRtree(geounits['geometry'].to_numpy())
+    iPipe, iGeo = tree.query(pipes['geometry'].to_numpy(), predicate='intersects')
+
+    length = shapely.length(shapely.intersection(pipes['geometry'].to_numpy()[iPipe], geounits['geometry'].to_numpy()[iGeo]))
+
+    intersections = pd.DataFrame({'FID_Water_': iPipe, 'FID_250KGe': iGeo, 'Shape_Leng': length})
+
+    return intersections[intersections['Shape_Leng'] > 0]
+
+def getGeounits(pipes:pd.DataFrame, geounits:pd.DataFrame)->pd.DataFrame:
+    """
+        Main rock of the geounit with the longest intersection of each COMPKEY (as joinWithGeoUnits). Pipes without
+        intersections get NaN.
+    Args:
+        pipes (pd.DataFrame): COMPKEY and geometry per feature (readPipeGeometries).
+        geounits (pd.DataFrame): main_rock and geometry per geounit (readGeounitPolygons).
+    Returns:
+        pd.DataFrame: main_rock per COMPKEY.
+    """
+    intersections = getGeounitIntersections(pipes, geounits)
+
+    return getLongestGeounit(pipes[[WC.COMPKEY]], intersections, geounits[[MAIN_ROCK]])
+
+def getLongestGeounit(pipesIDs:pd.DataFrame, intersections:pd.DataFrame, geounits:pd.DataFrame)->pd.DataFrame:
+    """
+        Main rock of the longest intersection of each COMPKEY from the tables of the features of the pipes, the
+        intersections (indexed by FID_Water_ or with it as a column) and the geounits (indexed by FID_250KGe).
+    """
+    if 'FID_Water_' in intersections.columns:
+        intersections = intersections.set_index('FID_Water_')
+
+    pipesCKGeoUnits = pipesIDs.join(intersections).join(geounits, on='FID_250KGe')
+    pipesCKGeoUnits[MAIN_ROCK] = pipesCKGeoUnits[MAIN_ROCK].replace(" ", np.nan)
+
+    pipesGeounits = pipesCKGeoUnits.sort_values('Shape_Leng', ascending=False, kind='stable').drop_duplicates([WC.COMPKEY], keep='first')
+
+    return pipesGeounits.set_index(WC.COMPKEY)[[MAIN_ROCK]].sort_index()
+
+def readPressureJoin(fname:str=FILES.PRESSURE_JOIN)->pd.DataFrame:
+    """
+        Pressures per COMPKEY from the GIS join of the pipes and the nodes (as getFailuresWithPressures).
+    """
+    GISpipesVsPressures = pd.read_csv(fname, delimiter = ',',
+                                      dtype = {WC.COMPKEY:'int64', 'MOD_MAXPRE':'float64','MOD_MINPRE':'float64',
+                                               'Press_fluc':'float64', DISTANCE: 'float64'},
+                                      usecols=[3,25,26,38,39,35], index_col=[WC.COMPKEY])
+
+    return GISpipesVsPressures.groupby(GISpipesVsPressures.index).agg({'MOD_MAXPRE': 'mean', 'MOD_MINPRE': 'mean',
+                                                                       'Press_fluc': 'mean', DISTANCE: 'mean',
+                                                                       MODEL_NAME: 'first'})
+
+def readGeounitsJoin(fGeoUnits:str=FILES.GEOUNITS, fPipesIDs:str=FILES.GEOUNITS_PIPES_IDS,
+                     fIntersections:str=FILES.GEOUNITS_PIPES_JOIN)->pd.DataFrame:
+    """
+        Main rock per COMPKEY from the GIS intersection of the pipes and the geounits (as joinWithGeoUnits).
+    """
+    geoUnits = pd.read_csv(fGeoUnits, delimiter = ',', usecols=[MAIN_ROCK])
+    waterPipesGISIDs = pd.read_csv(fPipesIDs, delimiter = ',', dtype = {WC.COMPKEY:'int64'}, usecols=[WC.COMPKEY])
+    geoUnitsIPipes = pd.read_csv(fIntersections, delimiter = ',', dtype = {'FID_Water_':'int64'}, usecols=[1,2,3],
+                                 index_col=['FID_Water_'])
+
+    return getLongestGeounit(waterPipesGISIDs, geoUnitsIPipes, geoUnits)
+
+def compareWithGISJoins(pressures:pd.DataFrame, geounits:pd.DataFrame, GISPressures:pd.DataFrame=None,
+                        GISGeounits:pd.DataFrame=None, atol:float=1e-6)->bool:
+    """
+        Checks that the spatial joins give the same pressures, distances and main rocks as the GIS joins.
+    Args:
+        pressures (pd.DataFrame): Result of getNearestPressures.
+        geounits (pd.DataFrame): Result of getGeounits.
+        GISPressures (pd.DataFrame): Pressures of the GIS join. Default is readPressureJoin().
+        GISGeounits (pd.DataFrame): Main rocks of the GIS join. Default is readGeounitsJoin().
+        atol (float): Tolerance of the pressures and distances.
+    Returns:
+        bool: True if both joins are the same.
+    """
+    GISPressures = readPressureJoin() if GISPressures is None else GISPressures
+    GISGeounits = readGeounitsJoin() if GISGeounits is None else GISGeounits
+
+    pressures = pressures.reindex(GISPressures.index)
+    cols = PRESSURE_COLS + [DISTANCE]
+    samePressures = np.allclose(pressures[cols].to_numpy(dtype='float64'), GISPressures[cols].to_numpy(dtype='float64'),
+                                atol=atol, equal_nan=True)
+    sameModels = pressures[MODEL_NAME].fillna('').equals(GISPressures[MODEL_NAME].fillna(''))
+    sameGeounits = geounits[MAIN_ROCK].reindex(GISGeounits.index).fillna('').equals(GISGeounits[MAIN_ROCK].fillna(''))
+
+    print("Same pressures: ", samePressures, ". Same models: ", sameModels, ". Same geounits: ", sameGeounits)
+
+    return samePressures and sameModels and sameGeounits
+
+def getFailedNeighbours(pipes:pd.DataFrame, failedKeys:np.ndarray, radius:float)->PipeNeighbours:
+    """
+        Pairs of failed and non failed pipes at less than the radius from each other (as the intersection of the buffers
+        of the failed pipes with the non failed pipes in GIS), using a STR-tree of the non failed pipes.
+    Args:
+        pipes (pd.DataFrame): COMPKEY and geometry per feature (readPipeGeometries).
+        failedKeys (np.ndarray): COMPKEYs of the pipes with failures.
+        radius (float): Radius of the buffer (units of the coordinate system, m).
+    Returns:
+        PipeNeighbours: CSR adjacency of the failed pipes.
+    """
+    isFailed = pipes[WC.COMPKEY].isin(failedKeys).to_numpy()
+    failed, nonFailed = pipes[isFailed], pipes[~isFailed]
+
+    tree = shapely.STRtree(nonFailed['geometry'].to_numpy())
+    iFailed, iNonFailed = tree.query(failed['geometry'].to_numpy(), predicate='dwithin', distance=radius)
+
+    #pairs of COMPKEYs (a COMPKEY can have several features)
+    failedCodes, failedUniques = pd.factorize(failed[WC.COMPKEY].to_numpy()[iFailed], sort=True)
+    nonFailedCodes, nonFailedUniques = pd.factorize(nonFailed[WC.COMPKEY].to_numpy()[iNonFailed], sort=True)
+    pairs = np.unique(failedCodes.astype('int64') * len(nonFailedUniques) + nonFailedCodes)
+    rows, cols = np.divmod(pairs, len(nonFailedUniques))
+
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(failedUniques)))])
+
+    return PipeNeighbours(np.asarray(failedUniques), np.asarray(nonFailedUniques), indptr.astype('int64'),
+                          cols.astype('int32'), radius)
+
+def getNeighbourPairs(neighbours:PipeNeighbours)->pd.DataFrame:
+    """
+        Flat table of the pairs of the adjacency (COMPKEY of the failed pipe and COMPKEY_NotFails).
+    """
+    return pd.DataFrame({WC.COMPKEY: np.repeat(neighbours.failed, np.diff(neighbours.indptr)),
+                         'COMPKEY_NotFails': neighbours.nonFailed[neighbours.indices]})
+
+def getComparisonPipes(neighbours:PipeNeighbours, pipesAttributes:pd.DataFrame, maxLenDiff:float=0.25)->pd.DataFrame:
+    """
+        Non failed pipe to compare with each failed pipe (as getComparisonPipeForFailurePipes): same material and
+        diameter, length difference under maxLenDiff of the length of the failed pipe and the smallest length difference.
+    Args:
+        neighbours (PipeNeighbours): Adjacency of the failed pipes.
+        pipesAttributes (pd.DataFrame): MATERIAL, NOM_DIA_MM and Shape_Leng per COMPKEY.
+        maxLenDiff (float): Maximum length difference (fraction of the length of the failed pipe).
+    Returns:
+        pd.DataFrame: COMPKEY_NotFails per COMPKEY of the failed pipes that have a comparable pipe.
+    """
+    attrs = pipesAttributes[[WC.MATERIAL, WC.NOM_DIA_MM, WC.LENG]]
+    failedAttrs = attrs.reindex(neighbours.failed)
+    nonFailedAttrs = attrs.reindex(neighbours.nonFailed)
+
+    rows = np.repeat(np.arange(len(neighbours.failed)), np.diff(neighbours.indptr))
+    cols = neighbours.indices
+
+    #the material and diameter are compared by codes of the same categories
+    same = np.ones(len(rows), dtype=bool)
+    for col in (WC.MATERIAL, WC.NOM_DIA_MM):
+        codes = pd.Categorical(pd.concat([failedAttrs[col], nonFailedAttrs[col]]).astype('object')).codes
+        fCodes, nfCodes = codes[:len(failedAttrs)], codes[len(failedAttrs):]
+        same &= (fCodes[rows] == nfCodes[cols]) & (fCodes[rows] >= 0)
+
+    length = failedAttrs[WC.LENG].to_numpy(dtype='float64')[rows]
+    lenDiff = np.abs(nonFailedAttrs[WC.LENG].to_numpy(dtype='float64')[cols] - length)
+    valid = same & (lenDiff < length * maxLenDiff)
+
+    comparison = pd.DataFrame({WC.COMPKEY: neighbours.failed[rows[valid]],
+                               'COMPKEY_NotFails': neighbours.nonFailed[cols[valid]], 'Len_Diff': lenDiff[valid]})
+    print('Number of filtered (mat,diam,len) relationships Failed-NON F', comparison.shape[0])
+
+    #leaves only one relationship per failed pipe
+    comparison = comparison.sort_values('Len_Diff', kind='stable').drop_duplicates([WC.COMPKEY], keep='first')
+    print('Final number of failed pipes with a non failed connected pipe', comparison.shape[0])
+
+    return comparison.set_index(WC.COMPKEY)[['COMPKEY_NotFails']]
+
+def getBufferSensitivity(pipes:pd.DataFrame, failedKeys:np.ndarray, pipesAttributes:pd.DataFrame,
+                         radii:list[float]=[100, 200, 400, 800], maxLenDiff:float=0.25)->pd.DataFrame:
+    """
+        Number of pairs and of failed pipes with neighbours and with a comparable pipe for several buffer radii.
+    Args:
+        pipes (pd.DataFrame): COMPKEY and geometry per feature (readPipeGeometries).
+        failedKeys (np.ndarray): COMPKEYs of the pipes with failures.
+        pipesAttributes (pd.DataFrame): MATERIAL, NOM_DIA_MM and Shape_Leng per COMPKEY.
+        radii (list[float]): Radii of the buffer (m).
+        maxLenDiff (float): Maximum length difference (fraction of the length of the failed pipe).
+    Returns:
+        pd.DataFrame: Pairs, failed pipes with neighbours and failed pipes with a comparable pipe per radius.
+    """
+    results = []
+    for radius in radii:
+        neighbours = getFailedNeighbours(pipes, failedKeys, radius)
+        comparison = getComparisonPipes(neighbours, pipesAttributes, maxLenDiff)
+        results.append([radius, len(neighbours.indices), int((np.diff(neighbours.indptr) > 0).sum()), comparison.shape[0]])
+
+    return pd.DataFrame(results, columns=['Radius (m)', 'Pairs', 'Failed pipes with neighbours',
+                                          'Failed pipes with comparable pipe']).set_index('Radius (m)')
@@ -0,0 +1,225 @@
+import functools
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+#Metrics of the stages of the current collection (None when nothing is collected)
+_RUN = {'records': None, 'verbose': True, 'memory': True}
+
+#Stack of the running stages of each thread (e.g. the stages run concurrently by Pipeline.run), and records of the running
+#stages by thread, so a stage does not reset the peak memory while a stage of another thread is running
+_LOCAL = threading.local()
+_ACTIVE = {}
+_LOCK = threading.Lock()
+
+
+def getPeakRSS()->float:
+    """
+        Peak resident memory of the current process in MB (since the start or the last resetPeakRSS). On linux VmHWM is
+        used because ru_maxrss keeps the peak of the parent process when the new process is started.
+    """
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+
+    #ru_maxrss is in KB on linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024**2 if sys.platform == 'darwin' else 1024)
+
+def getStack()->list[dict]:
+    """
+        Stages running in the current thread (the last one is the current stage).
+    """
+    if not hasattr(_LOCAL, 'stack'):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+def resetPeakRSS()->bool:
+    """
+        Resets the peak resident memory to the current one (linux only).
+    Returns:
+        bool: False if the peak could not be reset (then the peak of a stage is the peak of the process).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+@contextmanager
+def collect(verbose:bool=True, memory:bool=True):
+    """
+        Collects the metrics of the stages run inside the block.
+    Args:
+        verbose (bool): Prints the messages of the stages (the former prints of GetFailures).
+        memory (bool): Measures the peak resident memory of each stage.
+    Yields:
+        list[dict]: Metrics of the stages, in the order they finish (filled when the block ends).
+    """
+    previous, previousStack = dict(_RUN), getStack()
+    records = []
+    _RUN.update(records=records, verbose=verbose, memory=memory)
+    _LOCAL.stack = []
+    try:
+        yield records
+    finally:
+        _RUN.update(previous)
+        _LOCAL.stack = previousStack
+
+@contextmanager
+def stage(name:str):
+    """
+        Measures the wall time, the peak memory and the rows of a stage of the pipeline. The rows in and out are taken
+        from the first and the last logRows of the stage. Stages can be nested (the parent is kept in the metrics) and
+        run in several threads (each thread has its own stack). The peak memory is of the process, so the stages that
+        overlap with a stage of another thread are marked as concurrent and their peak includes the other stages.
+    Args:
+        name (str): Name of the stage.
+    Yields:
+        dict: Metrics of the stage ('Rows in' and 'Rows out' can be set directly).
+    """
+    stack = getStack()
+    parent = stack[-1] if stack else None
+    record = {'Stage': name, 'Parent': parent['Stage'] if parent is not None else None, 'Wall time (s)': np.nan,
+              'Peak RSS (MB)': np.nan, 'Concurrent': False, 'Rows in': None, 'Rows out': None, 'Dropped': {},
+              'Messages': []}
+
+    thread = threading.get_ident()
+    measureMemory = _RUN['records'] is not None and _RUN['memory']
+    with _LOCK:
+        others = [r for t, running in _ACTIVE.items() if t != thread for r in running]
+        for r in others:
+            r['Concurrent'] = True
+        record['Concurrent'] = len(others) > 0
+        _ACTIVE.setdefault(thread, []).append(record)
+
+        if measureMemory:
+            #the peak of the parent until now, as the reset also clears it
+            if parent is not None:
+                parent['Peak RSS (MB)'] = np.nanmax([parent['Peak RSS (MB)'], getPeakRSS()])
+            #the peak is not reset while the stages of other threads are running (it would clear theirs)
+            measureMemory = True if others else resetPeakRSS()
+
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['Wall time (s)'] = time.perf_counter() - start
+        if measureMemory:
+            record['Peak RSS (MB)'] = np.nanmax([record['Peak RSS (MB)'], getPeakRSS()])
+            if parent is not None:
+                parent['Peak RSS (MB)'] = np.nanmax([parent['Peak RSS (MB)'], record['Peak RSS (MB)']])
+        stack.pop()
+        with _LOCK:
+            _ACTIVE[thread].pop()
+            if not _ACTIVE[thread]:
+                del _ACTIVE[thread]
+        if _RUN['records'] is not None:
+            _RUN['records'].append(record)
+
+def instrumented(name:str=None):
+    """
+        Decorator that runs the function as a stage (named as the function by default).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(func.__name__ if name is None else name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def logRows(rows:int, message:str, dropped:int=0, reason:str=None, **values):
+    """
+        Records the rows of the current stage after a step and prints its message.
+    Args:
+        rows (int): Rows after the step.
+        message (str): Message with the fields {rows}, {dropped} and the ones of values.
+        dropped (int): Rows removed by the step.
+        reason (str): Reason of the removed rows (e.g. 'duplicated WONO').
+        values: Other values of the message (e.g. the length).
+    """
+    rows, dropped = int(rows), int(dropped)
+    text = message.format(rows=rows, dropped=dropped, **values)
+
+    stack = getStack()
+    if stack:
+        record = stack[-1]
+        if record['Rows in'] is None:
+            record['Rows in'] = rows + dropped
+        record['Rows out'] = rows
+        if reason is not None:
+            record['Dropped'][reason] = record['Dropped'].get(reason, 0) + dropped
+        record['Messages'].append(text)
+
+    if _RUN['verbose']:
+        print(text)
+
+def toDataFrame(records:list[dict])->pd.DataFrame:
+    """
+        One row per stage with the time, memory, rows in/out and one column per reason of the dropped rows.
+    """
+    metrics = pd.DataFrame([{k: v for k, v in r.items() if k not in ['Dropped', 'Messages']} for r in records])
+    dropped = pd.DataFrame([{'Dropped ' + k: v for k, v in r['Dropped'].items()} for r in records])
+
+    return pd.concat([metrics, dropped], axis=1).astype({'Rows in': 'Int64', 'Rows out': 'Int64'})
+
+def toJSON(records:list[dict])->str:
+    """
+        Metrics of the stages as JSON (list of stages), e.g. to send them to the monitoring.
+    """
+    def convert(value):
+        return None if isinstance(value, float) and np.isnan(value) else value
+
+    return json.dumps([{k: convert(v) for k, v in r.items()} for r in records], indent=1)
+
+def saveMetrics(records:list[dict], fname:str):
+    """
+        Saves the metrics of the stages as JSON.
+    """
+    with open(fname, 'w') as f:
+        f.write(toJSON(records))
+
+def loadMetrics(fname:str)->list[dict]:
+    """
+        Metrics saved by saveMetrics.
+    """
+    with open(fname) as f:
+        return json.load(f)
+
+def render(records:list[dict])->str:
+    """
+        Human readable report of the stages: the messages of each one (as printed by GetFailures) and its time and
+        memory.
+    """
+    lines = []
+    for r in records:
+        lines += r['Messages']
+        peak = r['Peak RSS (MB)']
+        lines.append('[' + r['Stage'] + '] ' + '%.2f' % r['Wall time (s)'] + ' s' +
+                     ('' if peak is None or np.isnan(peak) else ', peak ' + '%.0f' % peak + ' MB') +
+                     (' (concurrent)' if r.get('Concurrent') else ''))
+
+    return '\n'.join(lines)
+
+def compareMetrics(base:list[dict], new:list[dict], tolerance:float=0.2)->pd.DataFrame:
+    """
+        Stages whose time or peak memory grew more than the tolerance (relative) between two runs.
+    """
+    cols = ['Wall time (s)', 'Peak RSS (MB)', 'Rows in']
+    both = toDataFrame(base).groupby('Stage')[cols].sum().join(toDataFrame(new).groupby('Stage')[cols].sum(),
+                                                               rsuffix=' new', how='inner')
+    for col in cols[:2]:
+        both[col + ' ratio'] = both[col + ' new'] / both[col]
+
+    return both[(both['Wall time (s) ratio'] > 1 + tolerance) | (both['Peak RSS (MB) ratio'] > 1 + tolerance)]
@@ -0,0 +1,323 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import WatercareConstants as WC
+import DataAnalysisConstants as DAC
+import Files as FILES
+import SpatialJoins as SJ
+import crackGrowthCalculations as cc
+
+
+#Columns of the synthetic files in the positions read by GetFailures and SpatialJoins (FIELD_i are not read)
+WORK_ORDER_COLUMNS = [WC.WONO, WC.ACTCODE, 'FIELD_2', 'FIELD_3', 'FIELD_4', WC.SERVNO, 'FIELD_6', WC.SR_PROB,
+                      WC.ADDDTTM, WC.COMPKEY, WC.WO_COST, 'FIELD_11', WC.STR_TYPE, WC.STR_NAME, WC.SUBURB, 'FLAT',
+                      'HOUSENO', 'POSTCODE']
+ASSET_COLUMNS = (['Asset Id', WC.ASSET_TYPECODE, WC.ASSET_SERV_STA, 'Asset Status', WC.STR_TYPE, WC.STR_NAME, WC.SUBURB,
+                  'Asset Compkey'] + ['FIELD_' + str(i) for i in range(8, 23)] +
+                 ['Water Service Line Pipe Type', 'Water Service Line Material'])
+PIPE_COLUMNS = ['FIELD_' + str(i) for i in range(19)]
+PIPE_COLUMNS[2], PIPE_COLUMNS[8], PIPE_COLUMNS[9] = WC.COMPKEY, WC.STATUS, WC.MATERIAL
+PIPE_COLUMNS[11], PIPE_COLUMNS[12], PIPE_COLUMNS[18] = WC.NOM_DIA_MM, WC.INSTALLED, WC.LENG
+PRESSURE_COLUMNS = ['FIELD_' + str(i) for i in range(40)]
+PRESSURE_COLUMNS[3], PRESSURE_COLUMNS[25], PRESSURE_COLUMNS[26] = WC.COMPKEY, 'MOD_MAXPRE', 'MOD_MINPRE'
+PRESSURE_COLUMNS[35], PRESSURE_COLUMNS[38], PRESSURE_COLUMNS[39] = SJ.MODEL_NAME, 'Press_fluc', SJ.DISTANCE
+COORDINATE_COLUMNS = ['FIELD_' + str(i) for i in range(26)]
+COORDINATE_COLUMNS[3], COORDINATE_COLUMNS[24], COORDINATE_COLUMNS[25] = WC.COMPKEY, 'LAT', 'LONG'
+
+#Raw GIS material codes with their share of the pipes and their failures/km/year
+MATERIALS = pd.DataFrame({'Share': [0.30, 0.35, 0.12, 0.06, 0.05, 0.04, 0.03, 0.02, 0.02, 0.01],
+                          'Rate': [0.15, 0.05, 0.08, 0.25, 0.12, 0.10, 0.30, 0.15, 0.35, 0.20]},
+                         index=[WC.AC, WC.PE, WC.PVC, WC.CI, WC.CLCI, WC.DI, WC.GI, WC.FB, WC.ALK, WC.UNKNOWN])
+#Validity windows and colours of the material groups (Const-Materials.csv) and ranges of their crack model parameters
+#(sensitivity analysis parameters file: min, typical and max rows of each material). The Paris constants are chosen so
+#that most of the cracks of getCrackInputs reach detection in MAX_DAYS.
+MATERIAL_CONSTS = pd.DataFrame({WC.MATERIAL: [WC.AC, WC.PVC, DAC.IRON, WC.PE], 'YearIni': [1920, 1960, 1900, 1970],
+                                'YearFinal': [1985, 2021, 2021, 2021], 'MinD': [50, 50, 50, 20],
+                                'MaxD': [600, 400, 800, 500], 'Color': ['tab:orange', 'tab:green', 'tab:red', 'tab:blue']})
+CRACK_PARAMS = pd.DataFrame({'Material': np.repeat([WC.AC, WC.PVC, DAC.IRON, WC.PE], 3),
+                             'Elastic modulus (Gpa)': [20, 24, 30, 2.5, 3, 3.5, 80, 120, 170, 0.6, 0.9, 1.2],
+                             'Cparis ((m/c)/(Mpa*sqrt(m))^m)': [1e-5, 1e-4, 1e-3, 1e-4, 3e-4, 1e-3, 3e-5, 1e-4, 3e-4,
+                                                                3e-4, 1e-3, 3e-3],
+                             'mParis': [2.5, 3, 3.5, 2.8, 3, 3.5, 2.8, 3.2, 3.6, 2.8, 3.2, 3.6],
+                             'Thickness (mm)': [8, 12, 20, 2, 5, 15, 6, 9, 15, 2, 6, 30],
+                             'Dint (mm)': [50, 150, 600, 50, 100, 400, 50, 150, 800, 20, 100, 500]})
+DIAMETERS = ['20', '25', '50', '100', '150', '200', '300', '375', '450', 'UNK']
+STREET_TYPES = ['Road', 'Street', 'Avenue', 'Drive', 'Place', 'Crescent']
+SR_PROBLEMS = ['LEAK', 'BURST', 'NOWATER', 'LOWPRESS', 'DAMAGED3P', 'CONTRACTOR']
+SR_TO_FILTER = ['DAMAGED3P', 'CONTRACTOR']
+REPAIR_CODES = [WC.WMNRM, WC.WMNRPL, WC.WSLRPR]
+OTHER_CODES = ['INSPECT', 'FLUSH']
+
+#Records of the files per pipe and rates of the records removed by the filters
+SERVICE_LINES_PER_PIPE = 1
+SERVICE_COMPKEYS = 10**9 #added to the COMPKEY of the pipe
+DUPLICATED_PIPES = 0.01
+NOT_IN_ASSETS = 0.02
+DUPLICATED_ASSETS = 0.03
+SPLIT_COSTS = 0.25
+OTHER_ADDRESS = 0.05
+MISSING_PRESSURE = 0.03
+NUM_GEOUNITS = 500
+NUM_SUBURBS = 300
+NUM_STREETS = 5000
+YEARS = 6
+START_DATE = pd.Timestamp('2013-01-01')
+
+CHUNK_PIPES = 500000
+
+
+def getDataFiles(root:str)->dict:
+    """
+        Paths of the synthetic files in root (same relative paths as Files).
+    """
+    names = {'workOrders': FILES.WORK_ORDERS, 'pipes': FILES.WATER_PIPES, 'actcode': FILES.ACTCODE_REPAIR,
+             'srProb': FILES.SR_PROB_FILTER, 'assets1': FILES.ASSETS1, 'assets2': FILES.ASSETS2,
+             'assets3': FILES.ASSETS3, 'pressures': FILES.PRESSURE_JOIN, 'geounits': FILES.GEOUNITS,
+             'geounitsPipes': FILES.GEOUNITS_PIPES_IDS, 'geounitsJoin': FILES.GEOUNITS_PIPES_JOIN,
+             'coordinates': FILES.COORDINATES, 'materials': FILES.MAT_CONSTS, 'crackParams': FILES.CRACK_SENSITIVITY_PARAMS}
+
+    return {k: os.path.join(root, v) for k, v in names.items()}
+
+def generatePipes(start:int, n:int, rng:np.random.Generator)->pd.DataFrame:
+    """
+        Attributes of the pipes start..start+n (COMPKEYs from 100000).
+    """
+    material = rng.choice(MATERIALS.index.to_numpy(), n, p=MATERIALS['Share'].to_numpy())
+    installed = pd.Timestamp('1930-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 85 * 365, n), unit='D')
+
+    return pd.DataFrame({WC.COMPKEY: np.arange(start, start + n) + 100000,
+                         WC.STATUS: rng.choice([WC.INSERV_PROCESS, 'Abandoned'], n, p=[0.9, 0.1]),
+                         WC.MATERIAL: material,
+                         WC.NOM_DIA_MM: rng.choice(DIAMETERS, n),
+                         WC.INSTALLED: installed,
+                         WC.LENG: rng.lognormal(np.log(60), 0.8, n),
+                         WC.SUBURB: 'Suburb ' + pd.Series(rng.integers(0, NUM_SUBURBS, n)).astype('str'),
+                         WC.STR_NAME: 'Street ' + pd.Series(rng.integers(0, NUM_STREETS, n)).astype('str'),
+                         WC.STR_TYPE: rng.choice(STREET_TYPES, n),
+                         'Rate': MATERIALS['Rate'].reindex(material).to_numpy()})
+
+def getGISTable(pipes:pd.DataFrame, rng:np.random.Generator)->pd.DataFrame:
+    """
+        GIS features of the pipes. Some pipes are split in two features with the same COMPKEY.
+    """
+    split = rng.random(pipes.shape[0]) < DUPLICATED_PIPES
+    gis = pd.concat([pipes, pipes[split]]).sort_index(kind='stable')
+    #the length of the split pipes is shared between the two features
+    gis[WC.LENG] = np.where(gis.index.isin(pipes.index[split]), gis[WC.LENG] / 2, gis[WC.LENG])
+
+    table = pd.DataFrame('', index=range(gis.shape[0]), columns=PIPE_COLUMNS)
+    for col in [WC.COMPKEY, WC.STATUS, WC.MATERIAL, WC.NOM_DIA_MM, WC.INSTALLED, WC.LENG]:
+        table[col] = gis[col].to_numpy()
+
+    return table
+
+def getCoordinatesTable(gis:pd.DataFrame, rng:np.random.Generator)->pd.DataFrame:
+    """
+        Coordinates of the middle point of the GIS features (around Auckland).
+    """
+    table = pd.DataFrame('', index=range(gis.shape[0]), columns=COORDINATE_COLUMNS)
+    table[WC.COMPKEY] = gis[WC.COMPKEY].to_numpy()
+    table['LAT'] = rng.uniform(-37.1, -36.6, gis.shape[0])
+    table['LONG'] = rng.uniform(174.5, 175.0, gis.shape[0])
+
+    return table
+
+def getAssetsTable(pipes:pd.DataFrame, rng:np.random.Generator)->pd.DataFrame:
+    """
+        Asset records of the mains (some duplicated and some missing) and of their service lines.
+    """
+    mains = pipes[rng.random(pipes.shape[0]) >= NOT_IN_ASSETS]
+    mains = pd.concat([mains, mains[rng.random(mains.shape[0]) < DUPLICATED_ASSETS]])
+    services = pipes.loc[np.repeat(pipes.index, SERVICE_LINES_PER_PIPE)]
+
+    n = mains.shape[0] + services.shape[0]
+    table = pd.DataFrame('', index=range(n), columns=ASSET_COLUMNS)
+    table['Asset Id'] = np.arange(n)
+    table[WC.ASSET_TYPECODE] = [WC.WMN] * mains.shape[0] + [WC.WSL] * services.shape[0]
+    table[WC.ASSET_SERV_STA] = 'In Service'
+    table['Asset Status'] = 'Active'
+    for col in [WC.STR_TYPE, WC.STR_NAME, WC.SUBURB]:
+        table[col] = np.concatenate([mains[col].to_numpy(), services[col].to_numpy()])
+    #the service lines have their own COMPKEYs (after the ones of the pipes)
+    table['Asset Compkey'] = np.concatenate([mains[WC.COMPKEY].to_numpy(),
+                                             services[WC.COMPKEY].to_numpy() + SERVICE_COMPKEYS])
+    #the notebooks take the pipe type as the material of the service line
+    table['Water Service Line Pipe Type'] = np.where(table[WC.ASSET_TYPECODE] == WC.WSL, WC.PE, '')
+    table['Water Service Line Material'] = np.where(table[WC.ASSET_TYPECODE] == WC.WSL, WC.PE, '')
+
+    return table
+
+def getWorkOrdersTable(pipes:pd.DataFrame, firstWONO:int, rng:np.random.Generator)->pd.DataFrame:
+    """
+        Work orders of the pipes: failures of the mains (Poisson with the rate of the material), the same number of
+        service line repairs and other activities, some third party problems, costs split in several records and
+        addresses that do not match the one of the asset.
+    """
+    nFailures = rng.poisson(pipes['Rate'].to_numpy() * pipes[WC.LENG].to_numpy() / 1000 * YEARS)
+    idx = np.repeat(np.arange(pipes.shape[0]), nFailures)
+    n = idx.size
+    orders = pipes.iloc[idx].reset_index(drop=True)
+
+    kind = rng.choice(3, n, p=[0.5, 0.3, 0.2])
+    mainCodes = rng.choice([WC.WMNRM, WC.WMNRPL], n, p=[0.9, 0.1])
+    otherCodes = rng.choice(REPAIR_CODES[2:] + OTHER_CODES, n)
+    actcode = np.where(kind == 0, mainCodes, otherCodes)
+    #the service line repairs are on the service line of the pipe (see getAssetsTable)
+    service = actcode == WC.WSLRPR
+
+    table = pd.DataFrame('', index=range(n), columns=WORK_ORDER_COLUMNS)
+    table[WC.WONO] = (firstWONO + np.arange(n)).astype('str')
+    table[WC.ACTCODE] = actcode
+    table[WC.SERVNO] = (firstWONO + rng.permutation(n)).astype('str')
+    table[WC.SR_PROB] = rng.choice(SR_PROBLEMS, n, p=[0.4, 0.3, 0.1, 0.1, 0.05, 0.05])
+    table[WC.ADDDTTM] = (START_DATE + pd.to_timedelta(rng.integers(0, YEARS * 365 * 24 * 60, n), unit='min')).astype('str')
+    table[WC.COMPKEY] = orders[WC.COMPKEY].to_numpy() + np.where(service, SERVICE_COMPKEYS, 0)
+    table[WC.WO_COST] = np.round(rng.lognormal(np.log(1500), 1, n), 2)
+    for col in [WC.STR_TYPE, WC.STR_NAME, WC.SUBURB]:
+        table[col] = orders[col].to_numpy()
+    other = rng.random(n) < OTHER_ADDRESS
+    table.loc[other, WC.SUBURB] = 'Suburb ' + pd.Series(rng.integers(0, NUM_SUBURBS, other.sum())).astype('str').to_numpy()
+    table['HOUSENO'] = rng.integers(1, 300, n).astype('str')
+    table['POSTCODE'] = '0' + rng.integers(600, 2700, n).astype('str')
+
+    #costs added in several records of the same work order
+    split = table[rng.random(n) < SPLIT_COSTS].copy()
+    split[WC.WO_COST] = np.round(split[WC.WO_COST] * rng.random(split.shape[0]), 2)
+
+    return pd.concat([table, split]).sort_index(kind='stable').reset_index(drop=True)
+
+def getPressureTable(pipes:pd.DataFrame, rng:np.random.Generator)->pd.DataFrame:
+    """
+        Pressures of the nearest node of each pipe (some pipes without pressure).
+    """
+    withPressure = pipes[rng.random(pipes.shape[0]) >= MISSING_PRESSURE]
+    n = withPressure.shape[0]
+    maxPressure = rng.uniform(20, 110, n)
+    minPressure = maxPressure - rng.gamma(2, 6, n)
+
+    table = pd.DataFrame('', index=range(n), columns=PRESSURE_COLUMNS)
+    table[WC.COMPKEY] = withPressure[WC.COMPKEY].to_numpy()
+    table['MOD_MAXPRE'] = np.round(maxPressure, 2)
+    table['MOD_MINPRE'] = np.round(minPressure, 2)
+    table['Press_fluc'] = np.round(maxPressure - minPressure, 2)
+    table[SJ.DISTANCE] = np.round(rng.exponential(0.4, n), 3)
+    table[SJ.MODEL_NAME] = 'MODEL_' + (withPressure[WC.COMPKEY].to_numpy() // 20000).astype('str')
+
+    return table
+
+def getGeounitTables(gis:pd.DataFrame, firstFID:int, rng:np.random.Generator)->tuple[pd.DataFrame,pd.DataFrame]:
+    """
+        COMPKEY of each GIS feature (its FID is its row) and intersections of the features with 1 or 2 geounits.
+    """
+    n = gis.shape[0]
+    fids = firstFID + np.arange(n)
+    two = rng.random(n) < 0.2
+    fid = np.concatenate([fids, fids[two]])
+    length = gis[WC.LENG].to_numpy(dtype='float64')
+    #share of the length in the second geounit
+    share = np.where(two, rng.uniform(0.1, 0.9, n), 0)
+    lengths = np.concatenate([length * (1 - share), (length * share)[two]])
+
+    intersections = pd.DataFrame({'FID': np.arange(fid.size), 'FID_Water_': fid,
+                                  'FID_250KGe': rng.integers(0, NUM_GEOUNITS, fid.size),
+                                  WC.LENG: np.round(lengths, 3)})
+
+    return pd.DataFrame({WC.COMPKEY: gis[WC.COMPKEY].to_numpy()}), intersections
+
+def writeTable(table:pd.DataFrame, fname:str, append:bool):
+    """
+        Writes (or appends without header) a table as csv.
+    """
+    table.to_csv(fname, index=False, mode='a' if append else 'w', header=not append)
+
+def generateDataset(root:str, nPipes:int, seed:int=0, chunkPipes:int=CHUNK_PIPES)->dict:
+    """
+        Writes synthetic files with the layout of the Watercare files (work orders, assets, GIS pipes and their
+        coordinates, pressures join, geounits join, material constants and crack model parameters) in root, with the
+        same relative paths as Files. The pipes are generated in chunks, so the memory does not depend on nPipes (10k
+        to 10M pipes).
+    Args:
+        root (str): Directory of the dataset (run the pipeline with it as working directory).
+        nPipes (int): Number of pipes.
+        seed (int): Seed of the dataset (the same seed and nPipes give the same files).
+        chunkPipes (int): Pipes generated at once.
+    Returns:
+        dict: Number of records per file.
+    """
+    files = getDataFiles(root)
+    for fname in files.values():
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+
+    pd.DataFrame({WC.ACTCODE: REPAIR_CODES}).to_csv(files['actcode'], index=False)
+    pd.DataFrame({'SR_PROB_TO_FILTER': SR_TO_FILTER}).to_csv(files['srProb'], index=False)
+    MATERIAL_CONSTS.to_csv(files['materials'], index=False)
+    CRACK_PARAMS.to_csv(files['crackParams'], index=False)
+    rocks = np.random.default_rng(seed).choice(['Sandstone', 'Mudstone', 'Basalt', 'Alluvium', 'Tuff', ' '], NUM_GEOUNITS)
+    pd.DataFrame({'FID': np.arange(NUM_GEOUNITS), SJ.MAIN_ROCK: rocks}).to_csv(files['geounits'], index=False)
+
+    counts = dict.fromkeys(['pipes', 'assets', 'workOrders', 'pressures', 'geounitsJoin'], 0)
+    for i, start in enumerate(range(0, nPipes, chunkPipes)):
+        rng = np.random.default_rng([seed, i])
+        append = i > 0
+        pipes = generatePipes(start, min(chunkPipes, nPipes - start), rng)
+
+        gis = getGISTable(pipes, rng)
+        writeTable(gis, files['pipes'], append)
+        #own generator, so the coordinates do not change the draws of the other files
+        writeTable(getCoordinatesTable(gis, np.random.default_rng([seed, i, 1])), files['coordinates'], append)
+        pipesIDs, intersections = getGeounitTables(gis, counts['pipes'], rng)
+        intersections['FID'] += counts['geounitsJoin']
+        writeTable(pipesIDs, files['geounitsPipes'], append)
+        writeTable(intersections, files['geounitsJoin'], append)
+        counts['pipes'] += gis.shape[0]
+        counts['geounitsJoin'] += intersections.shape[0]
+
+        #the assets are spread over the 3 files
+        assets = getAssetsTable(pipes, rng)
+        part = rng.integers(0, 3, assets.shape[0])
+        for k in range(3):
+            writeTable(assets[part == k], files['assets' + str(k + 1)], append)
+        counts['assets'] += assets.shape[0]
+
+        orders = getWorkOrdersTable(pipes, counts['workOrders'] + 1, rng)
+        writeTable(orders, files['workOrders'], append)
+        counts['workOrders'] += orders.shape[0]
+
+        pressures = getPressureTable(pipes, rng)
+        writeTable(pressures, files['pressures'], append)
+        counts['pressures'] += pressures.shape[0]
+
+        print("Generated pipes ", start + pipes.shape[0], " of ", nPipes)
+
+    return counts
+
+def getCrackInputs(n:int, seed:int=0, crackParams:pd.DataFrame=CRACK_PARAMS)->dict:
+    """
+        Inputs of createCurvesUntilDetectableBatch for n cracks. The material of each crack is drawn at random and its
+        wall thickness, diameter, elasticity modulus and Paris constants between the min and max of the material in the
+        crack model parameters (E and Cparis in log scale, as in the sensitivity ranges).
+    Args:
+        n (int): Number of cracks.
+        seed (int): Seed of the draws.
+        crackParams (pd.DataFrame): Rows of the sensitivity analysis parameters file. Default is CRACK_PARAMS.
+    Returns:
+        dict: Arguments of createCurvesUntilDetectableBatch.
+    """
+    rng = np.random.default_rng(seed)
+    ranges = crackParams.groupby('Material').agg(['min', 'max'])
+    material = rng.integers(0, ranges.shape[0], n)
+
+    def draw(col:str, factor:float=1, log:bool=False)->np.ndarray:
+        low, high = [ranges[col][b].to_numpy(dtype='float64')[material] * factor for b in ('min', 'max')]
+        if log:
+            return 10**rng.uniform(np.log10(low), np.log10(high))
+        return rng.uniform(low, high)
+
+    return {'widthC': rng.uniform(1e-6, 2e-5, n), 'Cd': rng.uniform(0.5, 0.8, n),
+            'ElasticityModulus': draw('Elastic modulus (Gpa)', 10**9, log=True),
+            'Cparis': draw('Cparis ((m/c)/(Mpa*sqrt(m))^m)', log=True), 'Mparis': draw('mParis'),
+            'Wthickness': draw('Thickness (mm)', 1/1000), 'Dint': draw('Dint (mm)', 1/1000),
+            'iniCrackLength': rng.uniform(0.001, 0.01, n), 'nCycles': rng.integers(1, 14, n).astype('float64'),
+            'Pmax': rng.uniform(40, 100, n), 'deltaP': cc.convertmToMPa(rng.uniform(5, 40, n))}
@@ -4,6 +4,7 @@ WMN = 'WMN'
 WSL = 'WSL'
 WMNRM = 'WMNRM'
 WMNRPL = 'WMNRPL'
+WSLRPR = 'WSLRPR'
 ACTCODE = 'ACTCODE'
 WONO = 'WONO'
 COMPKEY = 'COMPKEY'
@@ -18,6 +19,7 @@ INSERV_PROCESS = 'In Service'
 LENG = 'Shape_Leng'
 STR_TYPE = 'Street_Type'
 STR_NAME = 'Street_Name'
+WO_COST = 'WoCost'
 
 
 ASSET_TYPECODE = 'Asset Type Code'
@@ -1,4 +1,8 @@
+import inspect
 import math
+from typing import NamedTuple, Optional
+
+import numpy as np
 
 
 #universal constants
@@ -8,6 +12,7 @@ W_DENSITY= 900 #kg/m³
 DETECTABLE_FLOW_M3S = 0.250/3600 #m3/s
 
 DELTA_DAYS = 1 #delta time of one day 
+MAX_DAYS = 200*365 #simulated days after which a crack is considered too slow
 
 
 def convertmToMPa(pressureInm:float)->float:
@@ -125,7 +130,7 @@ def createCurveUntilDetectable(widthC:float,Cd:float,ElasticityModulus:float,Cpa
         deltaK = getStressIntensityFactor(Wthickness, Dint, li, deltaP, Y)
         da = calculateChangeInCrackLength(Cparis, Mparis, nCiclesPerIter, deltaK) 
         
-        lf = (da - li/2)*2  #Final lenght of the crack in m
+        lf = (li/2 + da)*2  #Final lenght of the crack in m
        
         # FAVAD--- from paper 012---------------------------------------------------
         lengthLeaking = lf-nonLeakingL   #m
@@ -172,7 +177,7 @@ def calculateChangeInCrackLength(Cparis:float, Mparis:float, nCycles:int, deltaK
     """    
     return (Cparis * (deltaK**Mparis))* nCycles
 
-def getStressIntensityFactor(thickness:float, Dint:float, halfCrackLength:float, deltaP:float, geometricFactor:float)->float:
+def getStressIntensityFactor(thickness:float, Dint:float, crackLength:float, deltaP:float, geometricFactor:float)->float:
     """
         Calculates the stress intensity factor of a crack given the characteristics of the crack and the pipe.
         #TODO put reference to paper
@@ -190,7 +195,7 @@ def getStressIntensityFactor(thickness:float, Dint:float, halfCrackLength:float,
 
     return deltaK
 
-def getGeometricFactorCylindricalShell(thickness:float, Dint:float, halfCrackLength:float)->tuple[bool,float]:
+def getGeometricFactorCylindricalShell(thickness:float, Dint:float, crackLength:float)->tuple[bool,float]:
     """
         Calculates the geometric factor of a crack on a cylindrical shell (pipe, pressure vessel).
         #TODO put the reference to the paper 
@@ -207,11 +212,487 @@ def getGeometricFactorCylindricalShell(thickness:float, Dint:float, halfCrackLen
     a = crackLength/2
     lam = a/(Dint*thickness/2)**0.5 #lambda
 
-    if (lam <= 1) and (lam < 0):
+    if lam <= 1:
         Y = (1+(1.25* lam**2))**0.5   
     elif lam <= 5:
         Y = 0.6 + (0.9 * lam)
     else:
         critical = True
 
-    return critical,Y
\ No newline at end of file
+    return critical,Y
+
+
+class CrackGrowthBatch(NamedTuple):
+    """
+        Results of simulating many cracks at once, one entry per crack (struct of arrays).
+        Times are in days and are NaN when the event was not reached within the simulated time.
+    """
+    critical: np.ndarray
+    daysToDetection: np.ndarray
+    daysToCritical: np.ndarray
+    finalLength: np.ndarray
+    finalFlow: np.ndarray
+    trajectories: Optional[list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]] = None
+
+
+def createCurvesUntilDetectableBatch(widthC:np.ndarray, Cd:np.ndarray, ElasticityModulus:np.ndarray, Cparis:np.ndarray, 
+                                     Mparis:np.ndarray, Wthickness:np.ndarray, Dint:np.ndarray, iniCrackLength:np.ndarray,
+                                     nCycles:np.ndarray, Pmax:np.ndarray, deltaP:np.ndarray, nonLeakingL:np.ndarray=0,
+                                     stopFlow:float=DETECTABLE_FLOW_M3S, maxDays:int=MAX_DAYS,
+                                     trajectories:bool=False, method:str='euler', rtol:float=1e-6)->CrackGrowthBatch:
+    """
+        Batch version of createCurveUntilDetectable. With the euler method (reference), it grows every crack in lock-step
+        with the same daily Euler steps of the Paris equation, removing from the active set the cracks that reach the 
+        critical length or a flow at Pmax of at least stopFlow. With the analytic method, it integrates the Paris equation
+        between the events instead (see integrateCurvesUntilDetectableBatch). Arguments can be arrays of the same shape 
+        or scalars (broadcasted).
+    Args:
+        widthC (np.ndarray): Crack widths in m.
+        Cd (np.ndarray): Discharge coeficients of the leaks.
+        ElasticityModulus (np.ndarray): Elasticity modulus of the pipe materials in Pa.
+        Cparis (np.ndarray): C paris constants of the pipe materials in m/cycle/(Mpa m^0.5)^m.
+        Mparis (np.ndarray): m paris constants of the pipe materials.
+        Wthickness (np.ndarray): Pipe wall thicknesses in m.
+        Dint (np.ndarray): Pipe internal diameters in m.
+        iniCrackLength (np.ndarray): Initial crack lengths in m.
+        nCycles (np.ndarray): Number of cycles per day.
+        Pmax (np.ndarray): Maximum pressures of the pressure cycles in m.
+        deltaP (np.ndarray): Delta pressures in MPa.
+        nonLeakingL (np.ndarray): Lengths of the cracks that do not leak in m. Default is zero.
+        stopFlow (float): Flow in m3/s at which a crack stops being simulated. Default is the detectable flow.
+        maxDays (int): Maximum number of simulated days. 
+        trajectories (bool): If True, it also returns for every crack the days, pressure indexes in m, crack lengths in m
+            and flowrates in m3/s of each step (same lists as createCurveUntilDetectable). Only for the euler method.
+        method (str): 'euler' for daily steps or 'analytic' for the integration between events.
+        rtol (float): Relative tolerance of the times of the analytic method.
+    Returns:
+        CrackGrowthBatch: results per crack with the shape of the broadcasted arguments.
+    """
+    if method == 'analytic':
+        return integrateCurvesUntilDetectableBatch(widthC, Cd, ElasticityModulus, Cparis, Mparis, Wthickness, Dint, 
+                                                   iniCrackLength, nCycles, Pmax, deltaP, nonLeakingL, stopFlow, maxDays, rtol)
+    if method != 'euler':
+        raise ValueError("Unknown integration method: " + str(method))
+
+    params = np.broadcast_arrays(*[np.asarray(p, dtype='float64') for p in 
+                                   (widthC, Cd, ElasticityModulus, Cparis, Mparis, Wthickness, Dint, iniCrackLength,
+                                    nCycles, Pmax, deltaP, nonLeakingL)])
+    shape = params[0].shape
+    widthC, Cd, E, Cparis, Mparis, t, Dint, li, nCycles, Pmax, deltaP, nonLeakingL = [p.ravel() for p in params]
+    
+    n = li.size
+    critical = np.zeros(n, dtype=bool)
+    daysToDetection = np.full(n, np.nan)
+    daysToCritical = np.full(n, np.nan)
+    finalLength = li.copy()
+    finalFlow = np.zeros(n)
+
+    #constant factors of each crack, so that every step only evaluates what depends on the length
+    #rows: half length, m paris, growth per iteration, stress factor, lambda denominator, 
+    # head-area slope factor, flow factor, leak area factor, pressure factor, non leaking length, index
+    state = np.stack([li/2, Mparis, Cparis * DELTA_DAYS * nCycles, deltaP * Dint / (2*t), np.sqrt(Dint*t/2),
+                      2.93157*(Dint**0.3379)*W_DENSITY*GRAVITY/(E*(t**1.746)), Cd*((2*GRAVITY)**0.5), 
+                      widthC*(Pmax**0.5), Pmax**1.5, nonLeakingL, np.arange(n)])
+    steps = []
+    day = 0
+
+    #Euler in lock-step, the state only keeps the active cracks
+    while state.shape[1] > 0:
+
+        a, M, growth, stressFactor, lamDen, slopeFactor, flowFactor, areaFactor, pressFactor, nonLeaking, idx = state
+        active = idx.astype('int64')
+
+        #Paris Law------------------------------------------------------------------
+        lam = a/lamDen
+        crit = lam > 5
+
+        if crit.any():
+            critical[active[crit]] = True
+            daysToCritical[active[crit]] = day
+            state = state[:, ~crit]
+            continue
+
+        Y = np.where(lam <= 1, np.sqrt(1 + 1.25*lam**2), 0.6 + 0.9*lam)
+        deltaK = stressFactor * Y * np.sqrt(math.pi * a)
+        a = a + growth * deltaK**M
+        lf = a*2
+
+        # FAVAD--- from paper 012---------------------------------------------------
+        lengthLeaking = lf - nonLeaking
+        leaking = lengthLeaking > 0
+        logL = np.log10(np.where(leaking, lengthLeaking, 1))
+        mFAVAD = slopeFactor * 10**(logL*(4.8 + 0.5997*logL))
+        Q = np.where(leaking, flowFactor*(areaFactor*lengthLeaking + mFAVAD*pressFactor), 0)
+
+        finalLength[active] = lf
+        finalFlow[active] = Q
+
+        detected = (Q >= DETECTABLE_FLOW_M3S) & np.isnan(daysToDetection[active])
+        daysToDetection[active[detected]] = day
+
+        if trajectories:
+            hd = np.where(leaking, getPressureToBeDiscover(Cd[active], mFAVAD, lengthLeaking*widthC[active], 
+                                                           DETECTABLE_FLOW_M3S), np.nan)
+            steps.append((active, day, hd, lf, Q))
+
+        state[0] = a
+        day += DELTA_DAYS
+
+        if day > maxDays:
+            print("Too Slow: ", active.size, " cracks")
+            break
+
+        done = Q >= stopFlow
+        if done.any():
+            state = state[:, ~done]
+
+    curves = None
+    if trajectories:
+        curves = getTrajectoriesPerCrack(steps, n)
+
+    return CrackGrowthBatch(critical.reshape(shape), daysToDetection.reshape(shape), daysToCritical.reshape(shape),
+                            finalLength.reshape(shape), finalFlow.reshape(shape), curves)
+
+def getTrajectoriesPerCrack(steps:list[tuple[np.ndarray,int,np.ndarray,np.ndarray,np.ndarray]], 
+                            n:int)->list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+        Splits the steps recorded in lock-step into the ragged trajectory of each crack.
+    Args:
+        steps (list[tuple[np.ndarray,int,np.ndarray,np.ndarray,np.ndarray]]): Per step, the indexes of the active cracks, 
+            the day, and their pressure indexes, lengths and flowrates.
+        n (int): Number of cracks.
+    Returns:
+        list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]: Per crack, the days, pressure indexes in m, 
+            crack lengths in m and flowrates in m3/s.
+    """    
+    if not steps:
+        empty = np.array([])
+        return [(empty, empty, empty, empty) for _ in range(n)]
+
+    idx = np.concatenate([s[0] for s in steps])
+    days = np.concatenate([np.full(s[0].size, s[1]) for s in steps])
+    hds, lengths, flows = [np.concatenate([s[i] for s in steps]) for i in (2, 3, 4)]
+
+    #stable sort keeps the days in order inside each crack
+    order = np.argsort(idx, kind='stable')
+    bounds = np.cumsum(np.bincount(idx, minlength=n))[:-1]
+
+    return list(zip(*[np.split(col[order], bounds) for col in (days, hds, lengths, flows)]))
+
+
+
+GAUSS_NODES, GAUSS_WEIGHTS = np.polynomial.legendre.leggauss(10) #nodes per panel of the time integrals
+MAX_PANELS = 1024 #panels per geometric factor regime after which the time integral stops being refined
+
+
+def getFlowAtPmax(length:np.ndarray, flowFactor:np.ndarray, areaFactor:np.ndarray, slopeFactor:np.ndarray, 
+                  pressFactor:np.ndarray)->np.ndarray:
+    """
+        Calculates with FAVAD the flowrate at Pmax of arrays of leaking lengths, using the factors that only depend on 
+        the pipe (see integrateCurvesUntilDetectableBatch). Lengths smaller or equal to zero do not leak.
+    Args:
+        length (np.ndarray): Leaking lengths of the cracks in m.
+        flowFactor (np.ndarray): Cd*(2g)^0.5.
+        areaFactor (np.ndarray): Crack width * Pmax^0.5.
+        slopeFactor (np.ndarray): Head-area slope without the terms of the crack length.
+        pressFactor (np.ndarray): Pmax^1.5.
+    Returns:
+        np.ndarray: Flowrates in m3/s.
+    """
+    leaking = length > 0
+    logL = np.log10(np.where(leaking, length, 1))
+    mFAVAD = slopeFactor * 10**(logL*(4.8 + 0.5997*logL))
+
+    return np.where(leaking, flowFactor*(areaFactor*length + mFAVAD*pressFactor), 0)
+
+def getHalfLengthAtFlow(flow:float, aIni:np.ndarray, aMax:np.ndarray, nonLeakingL:np.ndarray, 
+                        flowFactors:tuple[np.ndarray,...])->np.ndarray:
+    """
+        Finds by bisection the half crack length at which the flowrate at Pmax reaches a value. 
+    Args:
+        flow (float): Flowrate to reach in m3/s.
+        aIni (np.ndarray): Initial half lengths of the cracks in m (returned if the flow is already reached).
+        aMax (np.ndarray): Maximum half lengths to search in m (infinite is returned if the flow is not reached). 
+        nonLeakingL (np.ndarray): Lengths of the cracks that do not leak in m.
+        flowFactors (tuple[np.ndarray,...]): flowFactor, areaFactor, slopeFactor and pressFactor of getFlowAtPmax.
+    Returns:
+        np.ndarray: Half lengths of the cracks in m.
+    """
+    lo, hi = np.log(aIni), np.log(np.maximum(aMax, aIni))
+
+    reachedIni = getFlowAtPmax(2*aIni - nonLeakingL, *flowFactors) >= flow
+    reachable = getFlowAtPmax(2*np.exp(hi) - nonLeakingL, *flowFactors) >= flow
+
+    #the flow increases with the length, 60 halvings are below the float resolution of the lengths
+    for _ in range(60):
+        mid = (lo + hi)/2
+        above = getFlowAtPmax(2*np.exp(mid) - nonLeakingL, *flowFactors) >= flow
+        hi = np.where(above, mid, hi)
+        lo = np.where(above, lo, mid)
+
+    return np.where(reachedIni, aIni, np.where(reachable, np.exp(hi), np.inf))
+
+def getDaysOfGrowthInRegime(aIni:np.ndarray, aFin:np.ndarray, growthPerDay:np.ndarray, stressFactor:np.ndarray,
+                            Mparis:np.ndarray, lamDen:np.ndarray, panels:int)->np.ndarray:
+    """
+        Integrates with Gauss-Legendre panels in log(a) the days that the Paris equation takes to grow the half length 
+        of the cracks from aIni to aFin, i.e. the integral of da/(C*N*deltaK(a)^m). 
+    Args:
+        aIni (np.ndarray): Initial half lengths in m.
+        aFin (np.ndarray): Final half lengths in m (equal or bigger than aIni).
+        growthPerDay (np.ndarray): C paris constants times the cycles per day.
+        stressFactor (np.ndarray): deltaP*Dint/(2*thickness) in MPa.
+        Mparis (np.ndarray): m paris constants.
+        lamDen (np.ndarray): Denominator of lambda (Dint*thickness/2)^0.5 in m.
+        panels (int): Number of panels.
+    Returns:
+        np.ndarray: Days of growth.
+    """
+    edges = np.arange(panels)/panels
+    x = (edges[:, None] + (GAUSS_NODES[None, :] + 1)/(2*panels)).ravel()
+    w = np.tile(GAUSS_WEIGHTS, panels)/(2*panels)
+
+    uIni, uFin = np.log(aIni), np.log(aFin)
+    a = np.exp(uIni[:, None] + (uFin - uIni)[:, None]*x[None, :])
+
+    lam = a/lamDen[:, None]
+    Y = np.where(lam <= 1, np.sqrt(1 + 1.25*lam**2), 0.6 + 0.9*lam)
+    deltaK = stressFactor[:, None] * Y * np.sqrt(math.pi * a)
+
+    #da = a du, days = a/(growth deltaK^m) du
+    integrand = a/(growthPerDay[:, None] * deltaK**Mparis[:, None])
+
+    return (uFin - uIni) * (integrand @ w)
+
+def getDaysOfGrowth(aIni:np.ndarray, aFin:np.ndarray, growthPerDay:np.ndarray, stressFactor:np.ndarray,
+                    Mparis:np.ndarray, lamDen:np.ndarray, rtol:float)->np.ndarray:
+    """
+        Days that the Paris equation takes to grow the half length of the cracks from aIni to aFin. The integral is split
+        at lambda = 1 where the geometric factor changes of equation, and the panels of each regime are doubled until two 
+        consecutive estimates agree within rtol. 
+    Args:
+        aIni (np.ndarray): Initial half lengths in m.
+        aFin (np.ndarray): Final half lengths in m (zero days if smaller than aIni).
+        growthPerDay (np.ndarray): C paris constants times the cycles per day.
+        stressFactor (np.ndarray): deltaP*Dint/(2*thickness) in MPa.
+        Mparis (np.ndarray): m paris constants.
+        lamDen (np.ndarray): Denominator of lambda (Dint*thickness/2)^0.5 in m.
+        rtol (float): Relative tolerance of the days.
+    Returns:
+        np.ndarray: Days of growth.
+    """
+    days = np.zeros(aIni.size)
+
+    for lo, hi in ((aIni, np.minimum(aFin, lamDen)), (np.maximum(aIni, lamDen), aFin)):
+
+        idx = np.flatnonzero(hi > lo)
+        panels = 2
+        prev = getDaysOfGrowthInRegime(lo[idx], hi[idx], growthPerDay[idx], stressFactor[idx], Mparis[idx], lamDen[idx], panels)
+
+        while idx.size > 0 and panels < MAX_PANELS:
+            panels *= 2
+            cur = getDaysOfGrowthInRegime(lo[idx], hi[idx], growthPerDay[idx], stressFactor[idx], Mparis[idx], lamDen[idx], 
+                                          panels)
+            converged = np.abs(cur - prev) <= rtol*np.abs(cur)
+            days[idx[converged]] += cur[converged]
+            idx, prev = idx[~converged], cur[~converged]
+
+        days[idx] += prev
+
+    return days
+
+def getHalfLengthAfterDays(days:np.ndarray, aIni:np.ndarray, aMax:np.ndarray, growth:list[np.ndarray], 
+                           rtol:float)->np.ndarray:
+    """
+        Finds by bisection the half length of the cracks after some days of growth with the Paris equation. 
+    Args:
+        days (np.ndarray): Days of growth.
+        aIni (np.ndarray): Initial half lengths in m.
+        aMax (np.ndarray): Maximum half lengths in m (returned if they are reached before the days).
+        growth (list[np.ndarray]): growthPerDay, stressFactor, Mparis and lamDen of getDaysOfGrowth.
+        rtol (float): Relative tolerance of the lengths and the days.
+    Returns:
+        np.ndarray: Half lengths in m.
+    """
+    days = np.broadcast_to(days, aIni.shape)
+    lo, hi = np.log(aIni), np.log(aMax)
+    reached = getDaysOfGrowth(aIni, aMax, *growth, rtol) <= days
+
+    while np.any((hi - lo > rtol) & ~reached):
+        mid = (lo + hi)/2
+        after = getDaysOfGrowth(aIni, np.exp(mid), *growth, rtol) > days
+        hi = np.where(after, mid, hi)
+        lo = np.where(after, lo, mid)
+
+    return np.where(reached, aMax, np.exp(lo))
+
+def getStrengthIndexAfterDays(days:np.ndarray, widthC:np.ndarray, Cd:np.ndarray, ElasticityModulus:np.ndarray, 
+                              Cparis:np.ndarray, Mparis:np.ndarray, Wthickness:np.ndarray, Dint:np.ndarray, 
+                              iniCrackLength:np.ndarray, nCycles:np.ndarray, deltaP:np.ndarray, nonLeakingL:np.ndarray=0,
+                              rtol:float=1e-6)->np.ndarray:
+    """
+        Strength index (pressure in m at which the leak is discoverable) of cracks after some days of growth with the 
+        Paris equation. Arguments can be arrays of the same shape or scalars (broadcasted).
+    Args:
+        days (np.ndarray): Days of growth.
+        widthC (np.ndarray): Crack widths in m.
+        Cd (np.ndarray): Discharge coeficients of the leaks.
+        ElasticityModulus (np.ndarray): Elasticity modulus of the pipe materials in Pa.
+        Cparis (np.ndarray): C paris constants of the pipe materials in m/cycle/(Mpa m^0.5)^m.
+        Mparis (np.ndarray): m paris constants of the pipe materials.
+        Wthickness (np.ndarray): Pipe wall thicknesses in m.
+        Dint (np.ndarray): Pipe internal diameters in m.
+        iniCrackLength (np.ndarray): Initial crack lengths in m.
+        nCycles (np.ndarray): Number of cycles per day.
+        deltaP (np.ndarray): Delta pressures in MPa.
+        nonLeakingL (np.ndarray): Lengths of the cracks that do not leak in m. Default is zero.
+        rtol (float): Relative tolerance of the lengths.
+    Returns:
+        np.ndarray: Strength indexes in m, NaN if the crack is critical or does not leak.
+    """
+    params = np.broadcast_arrays(*[np.asarray(p, dtype='float64') for p in 
+                                   (days, widthC, Cd, ElasticityModulus, Cparis, Mparis, Wthickness, Dint, iniCrackLength,
+                                    nCycles, deltaP, nonLeakingL)])
+    shape = params[0].shape
+    days, widthC, Cd, E, Cparis, Mparis, t, Dint, li, nCycles, deltaP, nonLeakingL = [p.ravel() for p in params]
+
+    lamDen = np.sqrt(Dint*t/2)
+    aCritical = 5*lamDen
+    aIni = np.minimum(li/2, aCritical)
+    a = getHalfLengthAfterDays(days, aIni, aCritical, [Cparis * nCycles, deltaP * Dint / (2*t), Mparis, lamDen], rtol)
+
+    lengthLeaking = 2*a - nonLeakingL
+    leaking = (lengthLeaking > 0) & (a < aCritical)
+    lengthLeaking = np.where(leaking, lengthLeaking, 1)
+
+    logL = np.log10(lengthLeaking)
+    mFAVAD = 2.93157*(Dint**0.3379)*W_DENSITY*GRAVITY/(E*(t**1.746)) * 10**(logL*(4.8 + 0.5997*logL))
+    hd = np.where(leaking, getPressureToBeDiscover(Cd, mFAVAD, lengthLeaking*widthC, DETECTABLE_FLOW_M3S), np.nan)
+
+    return hd.reshape(shape)
+
+def integrateCurvesUntilDetectableBatch(widthC:np.ndarray, Cd:np.ndarray, ElasticityModulus:np.ndarray, Cparis:np.ndarray, 
+                                        Mparis:np.ndarray, Wthickness:np.ndarray, Dint:np.ndarray, iniCrackLength:np.ndarray,
+                                        nCycles:np.ndarray, Pmax:np.ndarray, deltaP:np.ndarray, nonLeakingL:np.ndarray=0,
+                                        stopFlow:float=DETECTABLE_FLOW_M3S, maxDays:int=MAX_DAYS, 
+                                        rtol:float=1e-6)->CrackGrowthBatch:
+    """
+        Same results as createCurvesUntilDetectableBatch but without time steps. The flow only depends on the crack length,
+        so the lengths of the events (detectable flow, stopFlow and lambda = 5) are found first by root finding, and then 
+        the Paris equation is integrated in continuous time up to them. The cost does not depend on how slow the crack is.
+        Times are continuous, the daily Euler steps report them about one day earlier and slightly later for fast cracks.
+    Args:
+        widthC (np.ndarray): Crack widths in m.
+        Cd (np.ndarray): Discharge coeficients of the leaks.
+        ElasticityModulus (np.ndarray): Elasticity modulus of the pipe materials in Pa.
+        Cparis (np.ndarray): C paris constants of the pipe materials in m/cycle/(Mpa m^0.5)^m.
+        Mparis (np.ndarray): m paris constants of the pipe materials.
+        Wthickness (np.ndarray): Pipe wall thicknesses in m.
+        Dint (np.ndarray): Pipe internal diameters in m.
+        iniCrackLength (np.ndarray): Initial crack lengths in m.
+        nCycles (np.ndarray): Number of cycles per day.
+        Pmax (np.ndarray): Maximum pressures of the pressure cycles in m.
+        deltaP (np.ndarray): Delta pressures in MPa.
+        nonLeakingL (np.ndarray): Lengths of the cracks that do not leak in m. Default is zero.
+        stopFlow (float): Flow in m3/s at which a crack stops growing. Default is the detectable flow.
+        maxDays (int): Maximum number of days of growth. 
+        rtol (float): Relative tolerance of the times.
+    Returns:
+        CrackGrowthBatch: results per crack with the shape of the broadcasted arguments (without trajectories).
+    """
+    params = np.broadcast_arrays(*[np.asarray(p, dtype='float64') for p in 
+                                   (widthC, Cd, ElasticityModulus, Cparis, Mparis, Wthickness, Dint, iniCrackLength,
+                                    nCycles, Pmax, deltaP, nonLeakingL)])
+    shape = params[0].shape
+    widthC, Cd, E, Cparis, Mparis, t, Dint, li, nCycles, Pmax, deltaP, nonLeakingL = [p.ravel() for p in params]
+
+    lamDen = np.sqrt(Dint*t/2)
+    growth = (Cparis * nCycles, deltaP * Dint / (2*t), Mparis, lamDen)
+    flowFactors = (Cd*((2*GRAVITY)**0.5), widthC*(Pmax**0.5), 2.93157*(Dint**0.3379)*W_DENSITY*GRAVITY/(E*(t**1.746)),
+                   Pmax**1.5)
+
+    #events in length---------------------------------------------------------
+    aIni = li/2
+    aCritical = 5*lamDen
+    aDetect = getHalfLengthAtFlow(DETECTABLE_FLOW_M3S, aIni, aCritical, nonLeakingL, flowFactors)
+    aStop = getHalfLengthAtFlow(stopFlow, aIni, aCritical, nonLeakingL, flowFactors)
+
+    critical = np.isinf(aStop)
+    aFin = np.where(critical, np.maximum(aCritical, aIni), aStop)
+
+    #events in time----------------------------------------------------------
+    daysFin = getDaysOfGrowth(aIni, aFin, *growth, rtol)
+    detectable = np.isfinite(aDetect)
+    daysToDetection = np.full(li.size, np.nan)
+    daysToDetection[detectable] = getDaysOfGrowth(aIni[detectable], aDetect[detectable], 
+                                                  *[g[detectable] for g in growth], rtol)
+
+    #cracks that do not reach the end: the final length is at maxDays
+    slow = np.flatnonzero(daysFin > maxDays)
+    if slow.size > 0:
+        print("Too Slow: ", slow.size, " cracks")
+        aFin[slow] = getHalfLengthAfterDays(maxDays, aIni[slow], aFin[slow], [g[slow] for g in growth], rtol)
+        critical[slow] = False
+
+    daysToDetection[daysToDetection > maxDays] = np.nan
+    daysToCritical = np.where(critical, daysFin, np.nan)
+    finalLength = 2*aFin
+    finalFlow = getFlowAtPmax(finalLength - nonLeakingL, *flowFactors)
+
+    return CrackGrowthBatch(critical.reshape(shape), daysToDetection.reshape(shape), daysToCritical.reshape(shape),
+                            finalLength.reshape(shape), finalFlow.reshape(shape))
+
+def getEulerLagDays(Mparis:np.ndarray, Wthickness:np.ndarray, Dint:np.ndarray, iniCrackLength:np.ndarray)->np.ndarray:
+    """
+        Bound of the lag of the daily euler steps behind the exact growth of cracks until the critical length. Each step
+        misses the increase of the growth rate during the day, so the lag is at most DELTA_DAYS*ln(rate at the critical
+        length/initial rate), plus one step because the events are only checked once per day. The rate is proportional
+        to (Y*sqrt(a))^m. Arguments can be arrays of the same shape or scalars (broadcasted).
+    Args:
+        Mparis (np.ndarray): m paris constants of the pipe materials.
+        Wthickness (np.ndarray): Pipe wall thicknesses in m.
+        Dint (np.ndarray): Pipe internal diameters in m.
+        iniCrackLength (np.ndarray): Initial crack lengths in m.
+    Returns:
+        np.ndarray: Maximum lag in days.
+    """
+    lamDen = np.sqrt(np.asarray(Dint)*Wthickness/2)
+    lam = np.stack(np.broadcast_arrays(np.minimum(np.asarray(iniCrackLength)/2/lamDen, 5), 5.0))
+
+    #rate at the critical length (lambda = 5) over the initial rate
+    Y = np.where(lam <= 1, np.sqrt(1 + 1.25*lam**2), 0.6 + 0.9*lam)
+    logRate = Mparis * np.log(Y[1]*np.sqrt(lam[1]) / (Y[0]*np.sqrt(lam[0])))
+
+    return DELTA_DAYS * (1 + logRate)
+
+def compareIntegrationMethods(*args, rtol:float=0.01, atolDays:float=None, **kwargs)->tuple[bool,CrackGrowthBatch,CrackGrowthBatch]:
+    """
+        Runs createCurvesUntilDetectableBatch with the daily euler (reference) and the analytic methods and checks that
+        the times to detection, and the times to critical of the cracks that both methods find critical, agree within 
+        atolDays + rtol*days. Close to the critical length the daily steps can jump past it, so the flags can differ there.
+    Args:
+        args, kwargs: Arguments of createCurvesUntilDetectableBatch (without method).
+        rtol (float): Relative tolerance of the times. 
+        atolDays (float): Absolute tolerance of the times in days. Default is None (the lag of the euler steps of each
+            crack, see getEulerLagDays).
+    Returns:
+        tuple[bool,CrackGrowthBatch,CrackGrowthBatch]: True if both methods agree. Results of the euler and of the 
+            analytic methods.
+    """
+    euler = createCurvesUntilDetectableBatch(*args, method='euler', **kwargs)
+    analytic = createCurvesUntilDetectableBatch(*args, method='analytic', **kwargs)
+
+    if atolDays is None:
+        params = inspect.signature(createCurvesUntilDetectableBatch).bind(*args, **kwargs).arguments
+        atolDays = getEulerLagDays(params['Mparis'], params['Wthickness'], params['Dint'], params['iniCrackLength'])
+    atolDays = np.broadcast_to(atolDays, euler.critical.shape)
+
+    bothCritical = euler.critical & analytic.critical
+    detection = np.array_equal(np.isnan(euler.daysToDetection), np.isnan(analytic.daysToDetection))
+
+    agree = detection
+    for e, a, atol in ((euler.daysToDetection, analytic.daysToDetection, atolDays),
+                       (euler.daysToCritical[bothCritical], analytic.daysToCritical[bothCritical], atolDays[bothCritical])):
+        agree = agree and bool(np.all(np.isnan(e) | (np.abs(e - a) <= atol + rtol*np.abs(a))))
+
+    return agree, euler, analytic
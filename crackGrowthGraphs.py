@@ -1,7 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.cm as cmlib
-from matplotlib.ticker import AutoMinorLocator, MultipleLocator
 
 def graphsAllGrowth(fileName:str,times:list[int],Hdx:list[float],lengx:list[float],flowx:list[float],maxPre:float):
     """
@@ -14,7 +11,12 @@ def graphsAllGrowth(fileName:str,times:list[int],Hdx:list[float],lengx:list[floa
         lengx (list[float]): Lengths of the crack (m).
         flowx (list[float]): Flow rate (l/h) produced with the maximum pressure. 
     """    
-    col = [ cmlib.get_cmap('viridis')(x) for x in np.linspace(0, 1, 3)]
+    #matplotlib is imported here so importing this module does not load it
+    import matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import AutoMinorLocator
+
+    col = [ matplotlib.colormaps['viridis'](x) for x in np.linspace(0, 1, 3)]
 
     fig, ax = plt.subplots(1,figsize=(10, 8))
     ax2=ax.twinx()
@@ -59,3 +61,5 @@ def graphsAllGrowth(fileName:str,times:list[int],Hdx:list[float],lengx:list[floa
     ax3.spines['top'].set_visible(False)
 
     fig.savefig(fileName +'.png',dpi=200, bbox_inches='tight',transparent=True) #save as png
+
+    return fig
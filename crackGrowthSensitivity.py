@@ -0,0 +1,291 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+import crackGrowthCalculations as cc
+import Files as FILES
+
+
+#Parameters of the crack model in the order of the sample columns
+PARAMS = ["widthC", "Cd", "E", "Cparis", "mParis", "thickness", "Dint", "cLenght", "N", "PMax", "PMin"]
+
+#outputs of the crack model
+DAYS_DETECTION = 'Days to detection'
+DAYS_CRITICAL = 'Days to critical'
+OUTPUTS = [DAYS_DETECTION, DAYS_CRITICAL]
+
+SAMPLES_FILE = 'samples.npy'
+CHUNK_FILE = 'chunk_{:06d}.npy'
+#chunk size, maximum days and method of the chunks saved in a run directory
+SETTINGS_FILE = 'settings.json'
+
+#integration method of the crack model in the evaluation of the samples
+MODEL_METHOD = 'analytic'
+
+
+def getSensitivityRanges(material:str=None)->pd.DataFrame:
+    """
+        Ranges of the parameters of the crack model (same values as createSensivilityRanges of the sensitivity notebooks).
+        If a material is given, the pipe and material parameters are replaced by the ones of the material in the
+        sensitivity analysis parameters file (rows with the min, typical and max values of each material).
+    Args:
+        material (str): Material of the sensitivity analysis parameters file. Default is None (generic ranges).
+    Returns:
+        pd.DataFrame: Min, Typical and Max values of each parameter, and if it is sampled in log scale.
+    """
+    ranges = pd.DataFrame([[0.00001, 0.001, 0.05, True], # m  (min from paper 012)
+                           [0.5, 0.65, 0.8, False], #dimensionless (from paper 007)
+                           [300000000, 1000000000, 207000000000, True], #Pa (from excel material properties)
+                           [10**-13, 2.2*10**(-12), 10**-3, True], # (aprox from equation and Book C001)
+                           [2, 6.4, 9, False], # (aprox from equation and Book C001)
+                           [0.0003, 0.011, 0.015, False], #m (from paper 012, 001, 98)
+                           [0.010, 0.1, 0.9, False], #m (aprox from data wPipesGISNfailures[['NOM_DIA_MM']])
+                           [0.020, 0.1, 0.300, False], #m (assumtion)
+                           [1, 2, 14, False], #cycle per day (assumption)
+                           [100, 150, 400, False], #mca
+                           [0, 20, 100, False]], #mca
+                          index=PARAMS, columns=['Min', 'Typical', 'Max', 'Log'])
+
+    if material is not None:
+        attributes = pd.read_csv(FILES.CRACK_SENSITIVITY_PARAMS, delimiter = ',', index_col=['Material'])
+        mV = attributes.loc[[material]].reset_index()
+
+        for param, col, factor in (("E", 'Elastic modulus (Gpa)', 10**9), ("Cparis", 'Cparis ((m/c)/(Mpa*sqrt(m))^m)', 1),
+                                   ("mParis", 'mParis', 1), ("thickness", 'Thickness (mm)', 1/1000),
+                                   ("Dint", 'Dint (mm)', 1/1000)):
+            ranges.loc[param, ['Min', 'Typical', 'Max']] = mV.loc[0:2, col].to_numpy() * factor
+
+    return ranges
+
+def scaleSamples(unitSamples:np.ndarray, ranges:pd.DataFrame)->np.ndarray:
+    """
+        Scales samples of the unit hypercube to the ranges of the parameters (linear or log scale).
+    Args:
+        unitSamples (np.ndarray): Samples in [0,1) with one column per parameter.
+        ranges (pd.DataFrame): Ranges of the parameters (see getSensitivityRanges).
+    Returns:
+        np.ndarray: Samples of the parameters.
+    """
+    low, high = ranges['Min'].to_numpy(dtype='float64', copy=True), ranges['Max'].to_numpy(dtype='float64', copy=True)
+    log = ranges['Log'].to_numpy(dtype=bool)
+
+    low[log], high[log] = np.log10(low[log]), np.log10(high[log])
+    samples = low + unitSamples * (high - low)
+    samples[:, log] = 10**samples[:, log]
+
+    return samples
+
+def createSamples(ranges:pd.DataFrame, n:int, method:str='lhs', seed:int=0)->np.ndarray:
+    """
+        Draws samples of the parameters of the crack model with a Latin hypercube or a scrambled Sobol sequence.
+    Args:
+        ranges (pd.DataFrame): Ranges of the parameters (see getSensitivityRanges).
+        n (int): Number of samples (a power of 2 for sobol).
+        method (str): 'lhs' or 'sobol'.
+        seed (int): Seed of the sampler.
+    Returns:
+        np.ndarray: Samples with one column per parameter.
+    """
+    sampler = getSampler(method, ranges.shape[0], seed)
+
+    return scaleSamples(sampler.random(n), ranges)
+
+def getSampler(method:str, d:int, seed:int)->qmc.QMCEngine:
+    """
+        Creates the sampler of the unit hypercube of d dimensions for 'lhs' (Latin hypercube) or 'sobol'.
+    """
+    if method == 'lhs':
+        return qmc.LatinHypercube(d=d, seed=seed)
+    if method == 'sobol':
+        return qmc.Sobol(d=d, seed=seed)
+
+    raise ValueError("Unknown sampling method: " + str(method))
+
+def createSaltelliSamples(ranges:pd.DataFrame, n:int, method:str='sobol', seed:int=0)->np.ndarray:
+    """
+        Creates the samples needed for the Sobol indices: the matrices A and B of n samples each and the k matrices AB_i
+        (A with the column i of B), stacked in that order.
+        Saltelli, A. et al. (2010). Variance based sensitivity analysis of model output. Design and estimator for the
+        total sensitivity index. Computer Physics Communications, 181(2), 259–270. https://doi.org/10.1016/j.cpc.2009.09.018
+    Args:
+        ranges (pd.DataFrame): Ranges of the parameters (see getSensitivityRanges).
+        n (int): Number of base samples (a power of 2 for sobol).
+        method (str): 'lhs' or 'sobol'.
+        seed (int): Seed of the sampler.
+    Returns:
+        np.ndarray: n*(k+2) samples with one column per parameter.
+    """
+    k = ranges.shape[0]
+    base = getSampler(method, 2*k, seed).random(n)
+    A, B = base[:, :k], base[:, k:]
+
+    ABs = []
+    for i in range(k):
+        AB = A.copy()
+        AB[:, i] = B[:, i]
+        ABs.append(AB)
+
+    return scaleSamples(np.vstack([A, B] + ABs), ranges)
+
+def evaluateCrackModel(samples:np.ndarray, maxDays:int=cc.MAX_DAYS)->np.ndarray:
+    """
+        Evaluates the crack model for every sample until the crack is critical (the flow does not stop the growth).
+        Cracks that do not reach an event in maxDays are censored at maxDays.
+    Args:
+        samples (np.ndarray): Samples with one column per parameter (see PARAMS).
+        maxDays (int): Maximum number of days of growth.
+    Returns:
+        np.ndarray: Days to detection and days to critical of each sample.
+    """
+    widthC, Cd, E, Cparis, mParis, thickness, Dint, cLenght, N, PMax, PMin = samples.T
+
+    with np.errstate(all='ignore'):
+        res = cc.createCurvesUntilDetectableBatch(widthC, Cd, E, Cparis, mParis, thickness, Dint, cLenght, N, PMax,
+                                                  cc.convertmToMPa(np.maximum(PMax - PMin, 0)), stopFlow=np.inf,
+                                                  maxDays=maxDays, method=MODEL_METHOD)
+
+    days = np.column_stack([res.daysToDetection, res.daysToCritical])
+
+    return np.where(np.isnan(days), maxDays, days)
+
+def evaluateChunk(args:tuple[str,int,int,int,int])->int:
+    """
+        Evaluates one chunk of the samples file of a run directory and saves its results. Used by the process pool.
+    Args:
+        args (tuple[str,int,int,int,int]): Run directory, chunk number, first and last sample, maximum days.
+    Returns:
+        int: chunk number.
+    """
+    outDir, chunk, start, end, maxDays = args
+
+    samples = np.load(os.path.join(outDir, SAMPLES_FILE), mmap_mode='r')[start:end]
+    results = evaluateCrackModel(np.asarray(samples), maxDays)
+
+    #writes to a temporal file first so that an interrupted run never leaves a partial chunk
+    fname = os.path.join(outDir, CHUNK_FILE.format(chunk))
+    np.save(fname + '.tmp.npy', results)
+    os.replace(fname + '.tmp.npy', fname)
+
+    return chunk
+
+def runSamples(samples:np.ndarray, outDir:str, chunkSize:int=20000, workers:int=None,
+               maxDays:int=cc.MAX_DAYS)->np.ndarray:
+    """
+        Evaluates the crack model for the samples in chunks over a process pool, saving the results of every chunk in
+        outDir. If outDir already has the same samples, chunk size, maximum days and model method, the chunks already saved
+        are not evaluated again (resume). Otherwise the saved chunks are removed.
+    Args:
+        samples (np.ndarray): Samples with one column per parameter (see PARAMS).
+        outDir (str): Directory of the run.
+        chunkSize (int): Number of samples per chunk.
+        workers (int): Number of processes. Default is None (number of CPUs).
+        maxDays (int): Maximum number of days of growth.
+    Returns:
+        np.ndarray: Days to detection and days to critical of each sample.
+    """
+    os.makedirs(outDir, exist_ok=True)
+    fSamples = os.path.join(outDir, SAMPLES_FILE)
+    settings = {'chunkSize': int(chunkSize), 'maxDays': int(maxDays), 'method': MODEL_METHOD}
+
+    sameSamples = os.path.exists(fSamples) and np.array_equal(np.load(fSamples, mmap_mode='r'), samples)
+    if not (sameSamples and loadSettings(outDir) == settings):
+        for f in os.listdir(outDir):
+            if f.startswith('chunk_'):
+                os.remove(os.path.join(outDir, f))
+        np.save(fSamples, samples)
+        #the settings are saved last, a run interrupted before is cleared again
+        with open(os.path.join(outDir, SETTINGS_FILE), 'w') as f:
+            json.dump(settings, f)
+
+    starts = range(0, samples.shape[0], chunkSize)
+    pending = [(outDir, i, s, min(s + chunkSize, samples.shape[0]), maxDays) for i, s in enumerate(starts)
+               if not os.path.exists(os.path.join(outDir, CHUNK_FILE.format(i)))]
+    print("Chunks to evaluate: ", len(pending), " from ", len(starts))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for done, chunk in enumerate(pool.map(evaluateChunk, pending), 1):
+                if done % 10 == 0:
+                    print("Evaluated chunks: ", done, " of ", len(pending))
+
+    results = loadResults(outDir, len(starts))
+    if results.shape[0] != samples.shape[0]:
+        raise ValueError("The chunks of " + outDir + " have " + str(results.shape[0]) + " results for " +
+                         str(samples.shape[0]) + " samples")
+
+    return results
+
+def loadSettings(outDir:str)->dict:
+    """
+        Chunk size, maximum days and method of the chunks of a run (empty if the run has no settings file).
+    """
+    fSettings = os.path.join(outDir, SETTINGS_FILE)
+    if not os.path.exists(fSettings):
+        return {}
+
+    with open(fSettings) as f:
+        return json.load(f)
+
+def loadResults(outDir:str, numChunks:int)->np.ndarray:
+    """
+        Loads the results of the chunks of a run.
+    Args:
+        outDir (str): Directory of the run.
+        numChunks (int): Number of chunks.
+    Returns:
+        np.ndarray: Days to detection and days to critical of each sample.
+    """
+    return np.concatenate([np.load(os.path.join(outDir, CHUNK_FILE.format(i))) for i in range(numChunks)])
+
+def getSobolIndices(results:np.ndarray, n:int, params:list[str]=PARAMS)->pd.DataFrame:
+    """
+        Calculates the first-order and total Sobol indices from the results of the Saltelli samples, with the estimators
+        of Saltelli et al. (2010) (first order) and Jansen (total).
+    Args:
+        results (np.ndarray): Results of the samples of createSaltelliSamples (one column per output).
+        n (int): Number of base samples.
+        params (list[str]): Names of the parameters.
+    Returns:
+        pd.DataFrame: S1 and ST per parameter (rows) and output (columns).
+    """
+    k = len(params)
+    fA, fB = results[:n], results[n:2*n]
+    fAB = results[2*n:].reshape(k, n, -1)
+
+    var = np.var(np.vstack([fA, fB]), axis=0)
+
+    S1 = np.mean(fB * (fAB - fA), axis=1) / var
+    ST = 0.5 * np.mean((fA - fAB)**2, axis=1) / var
+
+    indices = pd.DataFrame(np.hstack([S1, ST]), index=params,
+                           columns=pd.MultiIndex.from_product([['S1', 'ST'], OUTPUTS]))
+
+    return indices
+
+def runSobolAnalysis(outDir:str, n:int, material:str=None, method:str='sobol', seed:int=0, chunkSize:int=20000,
+                     workers:int=None, maxDays:int=cc.MAX_DAYS)->pd.DataFrame:
+    """
+        Global sensitivity analysis of the crack model: creates the Saltelli samples of the ranges, evaluates them over a
+        process pool with checkpoints in outDir (run again with the same arguments to resume) and returns the Sobol
+        indices of the days to detection and to critical.
+    Args:
+        outDir (str): Directory of the run.
+        n (int): Number of base samples, the model is evaluated n*(k+2) times.
+        material (str): Material of the sensitivity analysis parameters file. Default is None (generic ranges).
+        method (str): 'sobol' or 'lhs'.
+        seed (int): Seed of the sampler.
+        chunkSize (int): Number of samples per chunk.
+        workers (int): Number of processes. Default is None (number of CPUs).
+        maxDays (int): Maximum number of days of growth.
+    Returns:
+        pd.DataFrame: S1 and ST per parameter (rows) and output (columns).
+    """
+    ranges = getSensitivityRanges(material)
+    samples = createSaltelliSamples(ranges, n, method, seed)
+    results = runSamples(samples, outDir, chunkSize, workers, maxDays)
+
+    return getSobolIndices(results, n, list(ranges.index))
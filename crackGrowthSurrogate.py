@@ -0,0 +1,236 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import RegularGridInterpolator
+
+import crackGrowthCalculations as cc
+import crackGrowthSensitivity as cs
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+import Files as FILES
+
+
+#Axes of the surrogate grid
+AXES = {'Dint': np.array([0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.45, 0.6, 0.9]), #m
+        'thickness': np.array([0.002, 0.004, 0.007, 0.011, 0.015, 0.02]), #m
+        'PMax': np.array([20, 40, 60, 80, 100, 130, 160]), #m
+        'deltaP': np.array([1, 3, 6, 10, 15, 20, 35, 50]), #m
+        'N': np.array([1, 2, 5, 10, 14]), #cycles per day
+        'age': np.arange(0, 130, 10)} #years, only for the strength index
+
+#The days to detection are interpolated in log and bounded to this number of days (never detected is MAX_DAYS)
+MIN_DAYS = 1
+
+
+class CrackSurrogate(NamedTuple):
+    """
+        Tables of the crack model over a grid of pipes, one per material.
+        daysToDetection has the axes Dint, thickness, PMax, deltaP and N; strengthIndex also has age.
+    """
+    materials: list[str]
+    axes: dict[str, np.ndarray]
+    daysToDetection: np.ndarray
+    strengthIndex: np.ndarray
+    crackParams: dict[str, float]
+
+
+def getMaterialCrackConstants()->pd.DataFrame:
+    """
+        Typical crack model constants of each material: the middle (typical) row of each material in the sensitivity
+        analysis parameters file (Const-Materials.csv only has the colours and validity windows of the materials).
+    Returns:
+        pd.DataFrame: E (Pa), Cparis and mParis per material.
+    """
+    attributes = pd.read_csv(FILES.CRACK_SENSITIVITY_PARAMS, delimiter = ',')
+    typical = attributes[attributes.groupby('Material').cumcount() == 1].set_index('Material')
+
+    consts = pd.DataFrame({'E': typical['Elastic modulus (Gpa)'] * 10**9,
+                           'Cparis': typical['Cparis ((m/c)/(Mpa*sqrt(m))^m)'],
+                           'mParis': typical['mParis']})
+    return consts
+
+def getCrackParams()->dict[str, float]:
+    """
+        Crack parameters that are not part of the grid: the initial crack is the smallest of the sensitivity ranges (min
+        width and length, the typical crack already leaks above the detectable flow at day 0) with the typical Cd.
+    """
+    ranges = cs.getSensitivityRanges()
+
+    return {'widthC': ranges.loc['widthC', 'Min'], 'Cd': ranges.loc['Cd', 'Typical'],
+            'cLenght': ranges.loc['cLenght', 'Min'], 'nonLeakingL': 0}
+
+def checkSurrogate(surrogate:CrackSurrogate):
+    """
+        Raises a ValueError if the table of a material is degenerate: the same days to detection in every cell (e.g. a
+        crack detectable at day 0 on the whole grid) or no finite strength index.
+    """
+    for i, material in enumerate(surrogate.materials):
+        days = surrogate.daysToDetection[i]
+        if np.nanmin(days) == np.nanmax(days):
+            raise ValueError("Constant days to detection (" + str(np.nanmin(days)) + ") in the surrogate of " +
+                             str(material) + ", check the crack parameters")
+        if not np.isfinite(surrogate.strengthIndex[i]).any():
+            raise ValueError("No finite strength index in the surrogate of " + str(material) +
+                             ", check the crack parameters")
+
+def buildSurrogate(materialConsts:pd.DataFrame=None, axes:dict[str, np.ndarray]=AXES, crackParams:dict[str, float]=None,
+                   rtol:float=1e-6)->CrackSurrogate:
+    """
+        Evaluates the crack model (analytic method of createCurvesUntilDetectableBatch) on every point of the grid of
+        each material. Degenerate tables raise a ValueError (see checkSurrogate).
+    Args:
+        materialConsts (pd.DataFrame): E (Pa), Cparis and mParis per material. Default is getMaterialCrackConstants().
+        axes (dict[str, np.ndarray]): Axes of the grid (see AXES).
+        crackParams (dict[str, float]): widthC, Cd, cLenght and nonLeakingL. Default is getCrackParams().
+        rtol (float): Relative tolerance of the crack model.
+    Returns:
+        CrackSurrogate: Tables of the grid.
+    """
+    materialConsts = getMaterialCrackConstants() if materialConsts is None else materialConsts
+    crackParams = getCrackParams() if crackParams is None else crackParams
+
+    D, t, PMax, dP, N = np.meshgrid(axes['Dint'], axes['thickness'], axes['PMax'], axes['deltaP'], axes['N'], indexing='ij')
+    daysAge = axes['age'] * 365
+
+    daysToDetection = []
+    strengthIndex = []
+
+    for material, consts in materialConsts.iterrows():
+        print("Building surrogate of ", material, " with ", D.size, " pipes")
+
+        with np.errstate(all='ignore'):
+            res = cc.createCurvesUntilDetectableBatch(crackParams['widthC'], crackParams['Cd'], consts['E'], consts['Cparis'],
+                                                      consts['mParis'], t, D, crackParams['cLenght'], N, PMax,
+                                                      cc.convertmToMPa(dP), crackParams['nonLeakingL'], method='analytic',
+                                                      rtol=rtol)
+            #the strength index does not depend on PMax, it is calculated for the first one only
+            hd = cc.getStrengthIndexAfterDays(daysAge, crackParams['widthC'], crackParams['Cd'], consts['E'],
+                                              consts['Cparis'], consts['mParis'], t[:, :, :1, ..., None], 
+                                              D[:, :, :1, ..., None], crackParams['cLenght'], N[:, :, :1, ..., None],
+                                              cc.convertmToMPa(dP)[:, :, :1, ..., None], crackParams['nonLeakingL'], rtol)
+
+        daysToDetection.append(np.where(np.isnan(res.daysToDetection), cc.MAX_DAYS, res.daysToDetection))
+        strengthIndex.append(np.broadcast_to(hd, D.shape + daysAge.shape))
+
+    surrogate = CrackSurrogate(list(materialConsts.index), dict(axes), np.stack(daysToDetection).astype('float32'),
+                               np.stack(strengthIndex).astype('float32'), dict(crackParams))
+    checkSurrogate(surrogate)
+
+    return surrogate
+
+def saveSurrogate(surrogate:CrackSurrogate, fname:str):
+    """
+        Saves the surrogate in a compressed numpy file (.npz).
+    """
+    axes = {'axis_' + k: v for k, v in surrogate.axes.items()}
+    np.savez_compressed(fname, materials=np.array(surrogate.materials), daysToDetection=surrogate.daysToDetection,
+                        strengthIndex=surrogate.strengthIndex, crackParamNames=np.array(list(surrogate.crackParams)),
+                        crackParamValues=np.array(list(surrogate.crackParams.values()), dtype='float64'), **axes)
+
+def loadSurrogate(fname:str)->CrackSurrogate:
+    """
+        Loads a surrogate saved with saveSurrogate.
+    """
+    with np.load(fname) as f:
+        axes = {k[len('axis_'):]: f[k] for k in f.files if k.startswith('axis_')}
+        crackParams = dict(zip(f['crackParamNames'].tolist(), f['crackParamValues'].tolist()))
+
+        return CrackSurrogate(f['materials'].tolist(), axes, f['daysToDetection'], f['strengthIndex'], crackParams)
+
+def lookup(surrogate:CrackSurrogate, material:np.ndarray, Dint:np.ndarray, thickness:np.ndarray, PMax:np.ndarray,
+           deltaP:np.ndarray, N:np.ndarray, age:np.ndarray)->tuple[np.ndarray,np.ndarray]:
+    """
+        Interpolates (multilinear) the days to detection and the strength index of arrays of pipes. Values outside the
+        grid are taken from its border. Pipes of materials that are not in the surrogate get NaN.
+    Args:
+        surrogate (CrackSurrogate): Tables of the grid.
+        material (np.ndarray): Materials of the pipes.
+        Dint (np.ndarray): Internal diameters in m.
+        thickness (np.ndarray): Wall thicknesses in m.
+        PMax (np.ndarray): Maximum pressures in m.
+        deltaP (np.ndarray): Pressure fluctuations in m.
+        N (np.ndarray): Cycles per day.
+        age (np.ndarray): Ages of the pipes in years.
+    Returns:
+        tuple[np.ndarray,np.ndarray]: Days to detection. Strength indexes in m.
+    """
+    material, *values = np.broadcast_arrays(np.asarray(material), Dint, thickness, PMax, deltaP, N, age)
+    axes = [surrogate.axes[k] for k in ('Dint', 'thickness', 'PMax', 'deltaP', 'N', 'age')]
+
+    points = np.column_stack([np.clip(np.ravel(v).astype('float64'), ax[0], ax[-1]) for v, ax in zip(values, axes)])
+    material = np.ravel(material)
+
+    days = np.full(material.size, np.nan)
+    hd = np.full(material.size, np.nan)
+
+    for i, m in enumerate(surrogate.materials):
+        idx = np.flatnonzero(material == m)
+        if idx.size == 0:
+            continue
+
+        logDays = np.log10(np.maximum(surrogate.daysToDetection[i], MIN_DAYS))
+        days[idx] = 10**RegularGridInterpolator(axes[:-1], logDays)(points[idx, :-1])
+        hd[idx] = RegularGridInterpolator(axes, surrogate.strengthIndex[i])(points[idx])
+
+    return days.reshape(values[0].shape), hd.reshape(values[0].shape)
+
+def scorePipes(surrogate:CrackSurrogate, pipes:pd.DataFrame, thickness:dict[str, float], N:float=2)->pd.DataFrame:
+    """
+        Days to detection and strength index of every pipe of the GIS pipe table joined with the pressures
+        (MATERIAL, NOM_DIA_MM, MOD_MAXPRE, Press_fluc and Age Today).
+    Args:
+        surrogate (CrackSurrogate): Tables of the grid.
+        pipes (pd.DataFrame): Pipes with pressures.
+        thickness (dict[str, float]): Wall thickness in m per material.
+        N (float): Cycles per day.
+    Returns:
+        pd.DataFrame: Days to detection and strength index (m) per pipe.
+    """
+    days, hd = lookup(surrogate, pipes[WC.MATERIAL].astype('str').to_numpy(), pipes[WC.NOM_DIA_MM].to_numpy() / 1000,
+                      pipes[WC.MATERIAL].map(thickness).to_numpy(dtype='float64'), pipes['MOD_MAXPRE'].to_numpy(),
+                      pipes['Press_fluc'].to_numpy(), N, pipes[DAC.CURRENT_AGE].to_numpy())
+
+    return pd.DataFrame({cs.DAYS_DETECTION: days, 'Strength index (m)': hd}, index=pipes.index)
+
+def getSurrogateError(surrogate:CrackSurrogate, n:int=1000, seed:int=0, rtol:float=1e-6)->pd.DataFrame:
+    """
+        Interpolation error of the surrogate against the direct simulation of random pipes inside the grid.
+    Args:
+        surrogate (CrackSurrogate): Tables of the grid.
+        n (int): Number of random pipes per material.
+        seed (int): Seed of the random pipes.
+        rtol (float): Relative tolerance of the crack model.
+    Returns:
+        pd.DataFrame: Median, 95th percentile and max of the relative error per material and output (NaN if no pipe has
+            a finite error, e.g. the strength index of a material whose cracks are all critical).
+    """
+    rng = np.random.default_rng(seed)
+    consts = getMaterialCrackConstants().loc[surrogate.materials]
+    params = surrogate.crackParams
+    names = ('Dint', 'thickness', 'PMax', 'deltaP', 'N', 'age')
+    errors = []
+
+    for material, c in consts.iterrows():
+        D, t, PMax, dP, N, age = [rng.uniform(surrogate.axes[k][0], surrogate.axes[k][-1], n) for k in names]
+
+        days, hd = lookup(surrogate, np.full(n, material), D, t, PMax, dP, N, age)
+
+        with np.errstate(all='ignore'):
+            res = cc.createCurvesUntilDetectableBatch(params['widthC'], params['Cd'], c['E'], c['Cparis'], c['mParis'],
+                                                      t, D, params['cLenght'], N, PMax, cc.convertmToMPa(dP),
+                                                      params['nonLeakingL'], method='analytic', rtol=rtol)
+            hdSim = cc.getStrengthIndexAfterDays(age*365, params['widthC'], params['Cd'], c['E'], c['Cparis'],
+                                                 c['mParis'], t, D, params['cLenght'], N, cc.convertmToMPa(dP),
+                                                 params['nonLeakingL'], rtol)
+        daysSim = np.maximum(np.where(np.isnan(res.daysToDetection), cc.MAX_DAYS, res.daysToDetection), MIN_DAYS)
+
+        for output, sim, sur in ((cs.DAYS_DETECTION, daysSim, np.maximum(days, MIN_DAYS)), ('Strength index (m)', hdSim, hd)):
+            err = np.abs(sur - sim) / np.abs(sim)
+            err = err[np.isfinite(err)]
+            if err.size == 0:
+                errors.append([material, output, np.nan, np.nan, np.nan])
+            else:
+                errors.append([material, output, np.median(err), np.quantile(err, 0.95), err.max()])
+
+    return pd.DataFrame(errors, columns=[WC.MATERIAL, 'Output', 'Median', 'P95', 'Max']).set_index([WC.MATERIAL, 'Output'])
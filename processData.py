@@ -12,13 +12,13 @@ MAX_PERCEN_TOSHOW = 2
 # and assings the color values of each material 
 def groupByMaterial(df, colors):
     
-	groupMat = df.groupby([WC.MATERIAL]).agg({WC.LENG: 'sum'}).copy()
+	groupMat = df.groupby([WC.MATERIAL], observed=True).agg({WC.LENG: 'sum'}).copy()
 
 	#Creates the otherMaterials table to create the material "other" and updates the table
 	groupMat[DAC.LEN_PERC] = groupMat[WC.LENG]/ groupMat[WC.LENG].sum() *100
 	otherMaterials = groupMat[(groupMat[DAC.LEN_PERC] < MAX_PERCEN_TOSHOW)]
 	groupMat = groupMat.reset_index()
-	groupMat[WC.MATERIAL].replace(otherMaterials.index, DAC.OTHER, inplace=True)
+	groupMat[WC.MATERIAL] = groupMat[WC.MATERIAL].astype('object').replace(otherMaterials.index, DAC.OTHER)
 	groupMat = groupMat.groupby([WC.MATERIAL]).agg({WC.LENG: 'sum' }).copy()
 
     #Once the other materials have been merged it calculates the percentages again 
@@ -29,3 +29,12 @@ def groupByMaterial(df, colors):
    
 	return groupMat
 
+
+#Calculates the number of failures, the length (km) and the failure rate of each material 
+#from the pipes table with the number of failures per pipe, for the given number of years of failure records
+def getFailureRatesByMaterial(pipes, years):
+
+	groupMat = pipes.groupby([WC.MATERIAL], observed=True).agg({DAC.NUM_FAILURES: 'sum', WC.LENG: 'sum'})
+	groupMat[DAC.FAILURE_RATE] = groupMat[DAC.NUM_FAILURES]/groupMat[WC.LENG]/years
+
+	return groupMat
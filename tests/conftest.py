@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+#the modules of the repo are imported from its root, as in the notebooks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import SyntheticData as SD
+
+
+@pytest.fixture(scope='session')
+def syntheticRoot(tmp_path_factory):
+    """
+        Directory of a small synthetic dataset (same relative paths as Files).
+    """
+    root = str(tmp_path_factory.mktemp('synthetic'))
+    SD.generateDataset(root, 20000, seed=1)
+
+    return root
+
+@pytest.fixture
+def inSynthetic(syntheticRoot, monkeypatch):
+    """
+        Runs the test with the synthetic dataset as working directory (the paths of Files are relative).
+    """
+    monkeypatch.chdir(syntheticRoot)
+
+    return syntheticRoot
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import WatercareConstants as WC
+import AddressIndex as AI
+import GetFailures as gf
+
+
+#Addresses of 3 assets, and of 6 failures (WONO) of them
+ASSETS = pd.DataFrame({WC.STR_TYPE: ['Road', 'ST', 'Avenue'], WC.STR_NAME: ['Great North', 'Queen', 'Dominion'],
+                       WC.SUBURB: ['Mt Albert', 'Auckland Central', 'Newmarket']},
+                      index=pd.Index([1, 2, 3], name=WC.COMPKEY))
+FAILURES = pd.DataFrame({WC.COMPKEY: [1, 1, 2, 2, 3, 3]}, index=pd.Index([10, 11, 12, 13, 14, 15], name=WC.WONO))
+ADDRESSES = pd.DataFrame({WC.STR_TYPE: ['rd', 'RD.', 'st', 'Rd', 'Ave', None],
+                          WC.STR_NAME: ['GREAT NORTH', 'Great Nrth', 'Queen', 'Queen', 'Dominion', 'Dominion'],
+                          WC.SUBURB: ['Mount Albert', 'MT. ALBERT', 'Auckland Centrl', 'Ponsonby', None, 'Newmarket']},
+                         index=FAILURES.index)
+
+
+def test_normalise():
+    values = pd.Series(['Mt. Albert', 'mount  albert', ' ', None, 'Pt Chevalier', 'Mt Albert'])
+
+    codes, uniques = AI.normalise(values, WC.SUBURB)
+
+    #empty values are missing (code -1 or a NaN unique)
+    normalised = [uniques[c] if c >= 0 and pd.notna(uniques[c]) else None for c in codes]
+    assert list(normalised) == ['MOUNT ALBERT', 'MOUNT ALBERT', None, None, 'POINT CHEVALIER', 'MOUNT ALBERT']
+
+    codes, uniques = AI.normalise(pd.Series(['Road', 'rd', 'Crescent', 'Lane', 'Broadway']), WC.STR_TYPE)
+    assert list(uniques[codes]) == ['RD', 'RD', 'CRES', 'LANE', 'BROADWAY']
+
+def test_matchAddresses():
+    index = AI.buildAddressIndex(ASSETS)
+
+    matches = AI.matchAddresses(FAILURES.join(ADDRESSES), index)
+
+    assert list(matches[WC.STR_TYPE + ' match']) == [AI.EXACT, AI.EXACT, AI.EXACT, AI.MISMATCH, AI.EXACT, AI.MISSING]
+    assert list(matches[WC.STR_NAME + ' match']) == [AI.EXACT, AI.FUZZY, AI.EXACT, AI.EXACT, AI.EXACT, AI.EXACT]
+    assert list(matches[WC.SUBURB + ' match']) == [AI.EXACT, AI.EXACT, AI.FUZZY, AI.MISMATCH, AI.MISSING, AI.EXACT]
+    assert list(matches[WC.STR_NAME + ' distance']) == [0, 1, 0, 0, 0, 0]
+    assert list(matches[WC.SUBURB + ' distance']) == [0, 0, 1, 3, -1, 0]
+    assert list(matches[AI.ADDRESS_MATCH]) == [AI.EXACT, AI.FUZZY, AI.FUZZY, AI.MISMATCH, AI.MISSING, AI.MISSING]
+
+def test_shortCodesOnlyMatchExactly():
+    #ST and RD are 2 edits apart, as GREAT NORTH and GRAET NORTH
+    a = np.array(['ST', 'AVE', 'CRES', 'GREAT NORTH', 'GREAT NORTH'])
+    b = np.array(['RD', 'AV', 'CRESS', 'GRAET NORTH', 'GREAT WEST'])
+
+    distances = AI.getEditDistances(a, b)
+
+    assert list(distances) == [2, 1, 1, 2, 3]
+    assert list(distances <= AI.getMaxDistances(a, b)) == [False, False, True, True, False]
+
+def test_filterDropsMismatchedSuburbs():
+    index = AI.buildAddressIndex(ASSETS)
+
+    #the failure 11 has no address record
+    failures = gf.filterFailuresbyInconsistentAddress(FAILURES.copy(), ADDRESSES.drop(index=11), ASSETS, index)
+
+    #13 is in another suburb and 14 has no suburb, the street type of 13 and 15 is not compared
+    assert list(failures.index) == [10, 12, 15]
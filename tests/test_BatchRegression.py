@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+import BatchRegression as BR
+import DataAnalysisConstants as DAC
+import WatercareConstants as WC
+
+
+X = 'Max pressure (m)'
+
+
+@pytest.fixture
+def table():
+    """
+        Grouped table of 4 materials (the last one with less than MIN_POINTS bins) with some missing values.
+    """
+    rng = np.random.default_rng(0)
+    materials = np.repeat([WC.AC, WC.PVC, WC.CI, WC.PE], [12, 8, 5, 2])
+    df = pd.DataFrame({WC.MATERIAL: materials, X: rng.uniform(20, 100, materials.size),
+                       WC.LENG: rng.uniform(1, 50, materials.size)})
+    df[DAC.FAILURE_RATE] = 0.002*df[X] + rng.normal(0, 0.05, materials.size)
+    df.loc[[3, 14], DAC.FAILURE_RATE] = np.nan
+
+    return df.set_index([WC.MATERIAL, X], drop=False).rename_axis([None, None])
+
+def test_sameRegressionsAsStatsmodels(table):
+    regres = BR.fitSegments(table, X)
+
+    #one WLS per segment, as the loops of the notebooks
+    data = table[table[[X, DAC.FAILURE_RATE, WC.LENG]].notna().all(axis=1)]
+    for segment, group in data.groupby(WC.MATERIAL):
+        found = regres.loc[segment, ['Slope', 'Intercept', 'Std dev', 'Slope P-value', 'Rsquared']]
+        if group.shape[0] < BR.MIN_POINTS:
+            assert found.isna().all()
+            continue
+        model = sm.WLS(group[DAC.FAILURE_RATE], sm.add_constant(group[X]), weights=group[WC.LENG]).fit()
+        expected = [model.params[X], model.params['const'], model.bse[X], model.pvalues[X], model.rsquared]
+        np.testing.assert_allclose(found.to_numpy(dtype='float64'), expected, rtol=1e-6, atol=1e-12)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import CostAttribution as CA
+import DataAnalysisConstants as DAC
+import FailureRateCube as FRC
+import GetFailures as gf
+import Pipeline as PL
+import WatercareConstants as WC
+
+
+@pytest.fixture
+def tables(inSynthetic, tmp_path):
+    """
+        Work orders, main failures and binned pipes of the synthetic dataset.
+    """
+    PL.clearMemory()
+    cacheDir = str(tmp_path / 'pipeline')
+    failureRecords, _, failureCosts = PL.run('workOrders', cacheDir=cacheDir, workers=1)
+    tables = {'failureRecords': failureRecords, 'failureCosts': failureCosts,
+              'mainFailures': PL.run('mainFailures', cacheDir=cacheDir, workers=1),
+              'pipes': PL.run('binned', cacheDir=cacheDir, workers=1)}
+    PL.clearMemory()
+
+    return tables
+
+def test_sameCostsAsTheJoins(tables):
+    index = CA.buildCostIndex(**tables)
+
+    #join with the costs and groupby of the notebook (getCostRatePerMaterial and getCostRatePerMaterialDiam)
+    failures = tables['mainFailures'][[WC.SERVNO, WC.COMPKEY]].join(tables['pipes'], on=WC.COMPKEY, how='inner')
+    failures[WC.MATERIAL] = pd.Categorical.from_codes(*FRC.getCodes(failures, WC.MATERIAL))
+    failures[DAC.LBL_DIAMETER] = pd.Categorical.from_codes(*FRC.getCodes(failures, DAC.LBL_DIAMETER))
+    failNCost = failures.join(tables['failureCosts'], on=WC.SERVNO)
+
+    for dims in [[WC.MATERIAL], [WC.MATERIAL, DAC.LBL_DIAMETER]]:
+        expected = failNCost.dropna(subset=dims).groupby(dims, observed=True).agg(
+            {WC.WO_COST: 'sum', WC.SERVNO: 'count'})
+        expected[CA.COST_RATE] = expected[WC.WO_COST] / expected[WC.SERVNO]
+        found = CA.rollup(index, dims, where={CA.PIPE: [CA.MAIN]})
+
+        assert found.shape[0] == expected.shape[0] > 1
+        np.testing.assert_allclose(found[[WC.WO_COST, CA.COST_RATE]].to_numpy(dtype='float64'),
+                                   expected[[WC.WO_COST, CA.COST_RATE]].to_numpy(dtype='float64'))
+
+def test_serviceLineRepairsAreFound(tables):
+    index = CA.buildCostIndex(**tables, serviceLines=gf.getAssetsSERVRecords())
+
+    services = tables['failureRecords'][tables['failureRecords'][WC.ACTCODE].isin(CA.SERVICE_CODES)]
+    assert (index.codes[CA.PIPE] == 1).sum() == services.shape[0] > 0
+
+    #all the repairs are on service lines in the assets, so they have a material
+    assert (index.codes[WC.MATERIAL][index.codes[CA.PIPE] == 1] >= 0).all()
+    found = CA.rollup(index, [CA.PIPE])
+    assert found.loc[[CA.SERVICE_LINE], DAC.NUM_FAILURES].item() == services.shape[0]
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+import FailureEvents as FE
+import Pipeline as PL
+import WatercareConstants as WC
+
+
+@pytest.fixture
+def tables(inSynthetic, tmp_path):
+    """
+        Main failures and binned pipes of the synthetic dataset.
+    """
+    PL.clearMemory()
+    cacheDir = str(tmp_path / 'pipeline')
+    tables = PL.run('mainFailures', cacheDir=cacheDir, workers=1), PL.run('binned', cacheDir=cacheDir, workers=1)
+    PL.clearMemory()
+
+    return tables
+
+def test_sameMonthlyCountsAsTheGroupby(tables):
+    mainFailures, pipes = tables
+    events = FE.buildEvents(mainFailures, pipes)
+
+    #groupby of the notebook (getNumFailuresPerMonth) with the failures joined with the material of their pipes
+    failures = mainFailures.join(pipes[[WC.MATERIAL]], on=WC.COMPKEY)
+    months = pd.to_datetime(failures[WC.ADDDTTM]).dt.tz_localize(None).dt.to_period('M').rename('month')
+    expected = failures.groupby([WC.MATERIAL, months], observed=True).size()
+    expected.index = expected.index.set_levels(expected.index.levels[0].astype('str'), level=0)
+
+    found = FE.getCounts(events, 'month').drop(columns=WC.UNKNOWN, level=WC.MATERIAL).T.stack()
+    found = found[found > 0]
+
+    assert found.sum() == expected.sum() > 0
+    pd.testing.assert_series_equal(found.reindex(expected.index), expected, check_dtype=False, check_names=False)
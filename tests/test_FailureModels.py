@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from sklearn.dummy import DummyClassifier
+
+import FailureModels as FM
+import WatercareConstants as WC
+
+
+def test_scoresOfAllTheGISPipes():
+    #feature matrix of 5 of the 7 GIS pipes (the PE one without a model)
+    compkeys = pd.Index([11, 12, 13, 14, 16], name=WC.COMPKEY)
+    features = pd.DataFrame({c: np.arange(5, dtype='float32') for c in FM.NUMERIC_FEATURES}, index=compkeys)
+    features['Material'] = pd.Categorical([WC.AC, WC.AC, WC.PVC, WC.PVC, WC.PE])
+    features['SoilMainRock'] = pd.Categorical(['Basalt'] * 5)
+    features['Suburb'] = pd.Categorical(['Onehunga'] * 5)
+    features[FM.TARGET] = np.array([0, 1, 1, 0, 1], dtype='int8')
+    features[FM.WEIGHT] = np.ones(5, dtype='float32')
+    pipes = pd.DataFrame({WC.MATERIAL: [WC.AC, WC.AC, WC.PVC, WC.PVC, WC.CI, WC.PE, WC.AC]},
+                         index=pd.Index([11, 12, 13, 14, 15, 16, 17], name=WC.COMPKEY))
+
+    models = {m: DummyClassifier(strategy='prior').fit(*FM.toArrays(features[features['Material'] == m])[:2])
+              for m in [WC.AC, WC.PVC]}
+
+    scores = FM.scorePipes(models, features, pipes, chunkSize=1)
+
+    #the pipes out of the feature matrix or without a model are not scored
+    pd.testing.assert_index_equal(scores.index, pipes.index)
+    assert scores.name == FM.PROBABILITY
+    np.testing.assert_allclose(scores.to_numpy(), [0.5, 0.5, 0.5, 0.5, np.nan, np.nan, np.nan])
+
+    #without the GIS pipes only the ones of the feature matrix
+    pd.testing.assert_index_equal(FM.scorePipes(models, features).index, compkeys)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import DataAnalysisConstants as DAC
+import FailureRateIntervals as FRI
+import WatercareConstants as WC
+
+
+YEARS = 6
+
+
+def test_poissonIntervalsAreTheExactPercentiles():
+    dfGroup = pd.DataFrame({WC.LENG: [120.0, 35.0, 800.0, 10.0, 2500.0, 0.0],
+                            DAC.NUM_FAILURES: [0, 3, 20, 150, 1000, 0]}, index=list('abcdef'))
+
+    dfCI = FRI.getPoissonIntervals(dfGroup, YEARS, chunkElements=20000)
+
+    #limits in number of failures, against the percentiles of the Poisson distribution of each bin
+    exposure = dfCI[WC.LENG] * YEARS
+    low = stats.poisson.ppf(0.025, dfCI[DAC.NUM_FAILURES])
+    high = stats.poisson.ppf(0.975, dfCI[DAC.NUM_FAILURES])
+    diff = np.maximum(np.abs(dfCI[DAC.FAILURE_RATE_LOW] * exposure - low),
+                      np.abs(dfCI[DAC.FAILURE_RATE_HIGH] * exposure - high))
+
+    #small compared with the sqrt of the failures, and NaN for the bin without length
+    assert (diff.iloc[:-1] <= np.maximum(1, 0.1*np.sqrt(dfGroup[DAC.NUM_FAILURES].iloc[:-1]))).all()
+    assert dfCI.iloc[-1][[DAC.FAILURE_RATE_LOW, DAC.FAILURE_RATE_HIGH]].isna().all()
@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+
+import DataAnalysisConstants as DAC
+import FailuresCache as fc
+import Files as FILES
+
+
+def test_cachedAgesAreCalculatedAgain(inSynthetic, tmp_path):
+    cacheDir = str(tmp_path / 'cache')
+    pipes, mainFailures = fc.getFailuresCached(cacheDir=cacheDir)
+
+    #ages of a cache built 10 years ago
+    key = fc.getInputsKey(fc.getFailuresInputs(FILES.WORK_ORDERS), cacheDir)
+    fPipes = os.path.join(cacheDir, key, fc.TABLES[0] + '.parquet')
+    stale = fc.loadTable(fPipes)
+    stale[DAC.CURRENT_AGE] -= 10
+    fc.saveTable(stale, fPipes)
+
+    cachedPipes, cachedFailures = fc.getFailuresCached(cacheDir=cacheDir)
+
+    pd.testing.assert_frame_equal(cachedPipes, pipes)
+    pd.testing.assert_frame_equal(cachedFailures, mainFailures)
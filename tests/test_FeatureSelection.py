@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import FeatureSelection as FS
+
+
+K = 5
+FEATURES = ['a', 'b', 'c', 'd']
+
+
+@pytest.fixture(scope='module')
+def table():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(400, 5)), columns=FEATURES + ['extra'])
+    df['y'] = 2*df['a'] - df['c'] + 0.5*df['d'] + rng.normal(0, 0.5, 400)
+    df['w'] = rng.uniform(0.5, 2, 400)
+
+    return df
+
+def select(df:pd.DataFrame, features:list[str], cacheDir:str, **kwargs)->pd.DataFrame:
+    return FS.sequentialSelection(df, features, target='y', weight='w', k=K, workers=1, cacheDir=cacheDir, **kwargs)
+
+def test_forwardSelectionFindsTheModel(table, tmp_path):
+    trace = select(table, FEATURES, str(tmp_path))
+
+    assert sorted(FS.getSelectedFeatures(trace)) == ['a', 'c', 'd']
+    assert trace.loc[0, 'Feature'] == 'a'
+    pd.testing.assert_frame_equal(FS.loadTrace('forward', str(tmp_path)), trace, check_dtype=False)
+
+def test_repeatedSearchIsCached(table, tmp_path):
+    first = select(table, FEATURES, str(tmp_path))
+    again = select(table, FEATURES, str(tmp_path))
+
+    assert (again['Evaluated'] == 0).all()
+    pd.testing.assert_frame_equal(again.drop(columns='Evaluated'), first.drop(columns='Evaluated'))
+
+def test_newCandidateKeepsTheScores(table, tmp_path):
+    select(table, FEATURES, str(tmp_path))
+    extended = select(table, FEATURES + ['extra'], str(tmp_path))
+
+    #only the subsets with the new candidate are evaluated
+    assert extended.loc[0, 'Evaluated'] == K
+    assert (extended['Evaluated'].iloc[1:] <= K).all()
+
+def test_otherRowsAreNotReused(table, tmp_path):
+    select(table, FEATURES, str(tmp_path))
+    withNaN = table.assign(extra=table['extra'].where(table.index >= 10))
+    extended = select(withNaN, FEATURES + ['extra'], str(tmp_path), maxFeatures=1)
+
+    assert extended.loc[0, 'Evaluated'] == K * 5
+
+def test_sameFoldScoresAsSklearn(table):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.model_selection import PredefinedSplit, cross_val_score
+
+    #subset of all the features without weights, with the same folds
+    folds = FS.getFolds(table.shape[0], K, 0)
+    expected = cross_val_score(LinearRegression(), table[FEATURES], table['y'], cv=PredefinedSplit(folds), scoring='r2')
+
+    FS.setData(table[FEATURES].to_numpy(dtype='float64'), table['y'].to_numpy(dtype='float64'),
+               np.ones(table.shape[0]), folds, FEATURES)
+    found = [FS.scoreSubset((tuple(FEATURES), f)) for f in range(K)]
+
+    np.testing.assert_allclose(found, expected)
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+import GetFailures as gf
+import IncrementalFailures as IF
+import StageMetrics as SM
+import WatercareConstants as WC
+import Files as FILES
+
+
+def writeDateCut(fname:str, cutDate:str)->str:
+    """
+        Extract with the work orders before the date (an older extract of the same file).
+    """
+    orders = pd.read_csv(FILES.WORK_ORDERS, dtype='str', keep_default_na=False)
+    orders[orders[WC.ADDDTTM] < cutDate].to_csv(fname, index=False)
+
+    return fname
+
+def assertSameIngestion(stateDir:str, fullDir:str):
+    incremental, full = IF.loadState(stateDir), IF.loadState(fullDir)
+
+    pd.testing.assert_frame_equal(incremental['failureCounts'].sort_index(), full['failureCounts'].sort_index())
+    assert incremental['mainFailures'].index.sort_values().equals(full['mainFailures'].index.sort_values())
+    assert incremental['watermark'] == full['watermark']
+    pd.testing.assert_frame_equal(IF.getFailureRates(stateDir), IF.getFailureRates(fullDir))
+
+@pytest.mark.parametrize('chunksize', [500000, 200])
+def test_refreshEqualsFullIngestion(inSynthetic, tmp_path, chunksize):
+    cut = writeDateCut(str(tmp_path / 'cut.csv'), '2016-01-01')
+    stateDir, fullDir = str(tmp_path / 'incremental'), str(tmp_path / 'full')
+
+    with SM.collect(verbose=False):
+        IF.ingestWorkOrders(cut, stateDir, chunksize=chunksize)
+        pipes, mainFailures = IF.ingestWorkOrders(FILES.WORK_ORDERS, stateDir, chunksize=chunksize)
+        fullPipes, fullFailures = IF.ingestWorkOrders(FILES.WORK_ORDERS, fullDir, chunksize=500000)
+
+    assertSameIngestion(stateDir, fullDir)
+    pd.testing.assert_frame_equal(pipes.sort_index(), fullPipes.sort_index())
+    assert mainFailures.index.sort_values().equals(fullFailures.index.sort_values())
+
+@pytest.mark.parametrize('chunksize', [500000, 200])
+def test_fullIngestionEqualsGetFailures(inSynthetic, tmp_path, chunksize):
+    with SM.collect(verbose=False):
+        pipes, mainFailures = IF.ingestWorkOrders(FILES.WORK_ORDERS, str(tmp_path / 'state'), chunksize=chunksize)
+        expectedPipes, expectedFailures = gf.getFailures(FILES.WORK_ORDERS)
+
+    assert mainFailures.index.sort_values().equals(expectedFailures.index.sort_values())
+    pd.testing.assert_series_equal(pipes[WC.LENG].sort_index(), expectedPipes[WC.LENG].sort_index())
+    assert pipes['Num of failures'].sum() == expectedPipes['Num of failures'].sum()
+
+def test_readWorkOrdersDoesNotDependOnChunksize(inSynthetic):
+    ACTCODERepair, SR_ToFilter = gf.getFilterCodesAndSR()
+    with SM.collect(verbose=False):
+        whole = gf.readWorkOrders(FILES.WORK_ORDERS, SR_ToFilter, ACTCODERepair, chunksize=10**9)
+        chunked = gf.readWorkOrders(FILES.WORK_ORDERS, SR_ToFilter, ACTCODERepair, chunksize=200)
+        failures, _ = gf.getFailureRecords(FILES.WORK_ORDERS)
+        baseline = gf.filters3PandNotRepairs(failures, SR_ToFilter, ACTCODERepair, failures.shape[0])
+
+    assert whole[0].index.sort_values().equals(chunked[0].index.sort_values())
+    assert whole[0].index.sort_values().equals(baseline.index.sort_values())
+    pd.testing.assert_frame_equal(whole[2].sort_index(), chunked[2].sort_index())
@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+import pytest
+
+import DataAnalysisConstants as DAC
+import FailuresCache as fc
+import GetFailures as gf
+import Pipeline as PL
+
+
+@pytest.fixture
+def cacheDir(inSynthetic, tmp_path):
+    PL.clearMemory()
+    yield str(tmp_path / 'pipeline')
+    PL.clearMemory()
+
+def test_pipesEqualGetFailures(cacheDir):
+    pipes, mainFailures = gf.getFailures(PL.FILES.WORK_ORDERS)
+
+    pd.testing.assert_frame_equal(PL.run('pipes', cacheDir=cacheDir), pipes)
+    pd.testing.assert_frame_equal(PL.run('mainFailures', cacheDir=cacheDir), mainFailures)
+
+def test_interruptedSaveIsBuiltAgain(cacheDir):
+    orders = PL.run('workOrders', cacheDir=cacheDir)
+    key = PL.getKeys(PL.getStages(), 'workOrders', cacheDir)['workOrders']
+    assert len(PL.getOutputFiles(cacheDir, 'workOrders', key)) == len(orders) == 3
+
+    #save interrupted after the first table
+    versionDir = os.path.join(cacheDir, 'workOrders', key)
+    for f in [PL.META_FILE, PL.OUTPUT_FILE.format(1), PL.OUTPUT_FILE.format(2)]:
+        os.remove(os.path.join(versionDir, f))
+    assert PL.getOutputFiles(cacheDir, 'workOrders', key) == []
+
+    PL.clearMemory()
+    rebuilt = PL.run('workOrders', cacheDir=cacheDir)
+    assert isinstance(rebuilt, tuple) and len(rebuilt) == 3
+    pd.testing.assert_frame_equal(rebuilt[0], orders[0])
+
+def test_datedStagesChangeKeyWithTheDate(cacheDir, monkeypatch):
+    stages = PL.getStages()
+    keys = PL.getKeys(stages, 'binned', cacheDir)
+
+    monkeypatch.setattr(PL, 'getDate', lambda: '2100-01-01')
+    later = PL.getKeys(stages, 'binned', cacheDir)
+
+    changed = {name for name in keys if keys[name] != later[name]}
+    assert changed == {'pipes', 'base', 'binned'}
+
+def test_constantsArePartOfTheKeys(cacheDir, monkeypatch):
+    stages = PL.getStages()
+    keys = PL.getKeys(stages, 'binned', cacheDir)
+
+    getFileHash = fc.getFileHash
+    monkeypatch.setattr(fc, 'getFileHash', lambda fname, known=None: 'changed' if fname == DAC.__file__
+                        else getFileHash(fname, known))
+    changed = PL.getKeys(stages, 'binned', cacheDir)
+
+    assert all(keys[name] != changed[name] for name in keys)
+
+def test_pipesAreBuiltAgainOnAnotherDay(cacheDir, monkeypatch):
+    pipes = PL.run('pipes', cacheDir=cacheDir)
+    PL.clearMemory()
+
+    #the output saved on another day is not used
+    monkeypatch.setattr(PL, 'getDate', lambda: '2100-01-01')
+    plan = PL.getPlan('pipes', cacheDir=cacheDir)
+    assert plan.loc['pipes', 'Output'] == 'none' and plan.loc['mainFailures', 'Output'] == 'disk'
+    pd.testing.assert_frame_equal(PL.run('pipes', cacheDir=cacheDir)[[DAC.CURRENT_AGE]], pipes[[DAC.CURRENT_AGE]])
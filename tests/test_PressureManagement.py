@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import crackGrowthCalculations as cc
+import DataAnalysisConstants as DAC
+import PressureManagement as PM
+import SpatialJoins as SJ
+import WatercareConstants as WC
+
+
+#Burst rate = slope*age + intercept at the low (40 m) and high (80 m) pressure of each material
+EQUATIONS = pd.DataFrame({'Slope low': [0.010, 0.004], 'Intercept low': [-0.10, 0.02], 'Pressure low': [40, 40],
+                          'Slope high': [0.020, 0.006], 'Intercept high': [-0.20, 0.01], 'Pressure high': [80, 80]},
+                         index=pd.Index([WC.AC, WC.PVC], name=WC.MATERIAL))
+CRACK = {'crackWidth': 1e-4, 'crackLength': 0.02}
+
+
+@pytest.fixture
+def pipes():
+    return pd.DataFrame({WC.MATERIAL: [WC.AC, WC.PVC, WC.AC, WC.PE, WC.PVC],
+                         WC.LENG: [1.0, 2.0, 0.5, 1.0, 1.5], DAC.CURRENT_AGE: [50, 30, 70, 20, np.nan],
+                         PM.PRESSURE: [60, 45, 90, 50, 70], SJ.MODEL_NAME: ['Z2', 'Z1', 'Z1', 'Z1', 'Z2'],
+                         WC.NOM_DIA_MM: [150, 100, 200, 100, 150]}, index=pd.Index([11, 12, 13, 14, 15], name=WC.COMPKEY))
+
+def test_buildNetwork(pipes):
+    network = PM.buildNetwork(pipes, EQUATIONS, **CRACK)
+
+    #pipes without an equation or age are not included, the rest are sorted by zone
+    assert network.zones == ['Z1', 'Z2']
+    np.testing.assert_array_equal(network.compkeys, [12, 13, 11])
+    np.testing.assert_array_equal(network.zoneStarts, [0, 2])
+    assert network.leakArea == pytest.approx(CRACK['crackWidth'] * CRACK['crackLength'])
+
+    #at the pressures of the categories the rates are the ones of the equations
+    rates = PM.getBurstRates(network, np.array([40, 80, 40]))
+    np.testing.assert_allclose(rates, [0.004*30 + 0.02, 0.020*70 - 0.20, 0.010*50 - 0.10])
+
+def test_leakageUsesTheCrack(pipes):
+    network = PM.buildNetwork(pipes, EQUATIONS, **CRACK)
+    failures, leakage = PM.evaluateScenarios(network, np.zeros((1, 2)))
+
+    rates = PM.getBurstRates(network, network.pressure) * network.length
+    flow = cc.calculateQWithFAVAD(network.leakCd, network.pressure, 2e-6, 0) * 86400
+    np.testing.assert_allclose(leakage[0], np.add.reduceat(rates * flow * PM.LEAK_RUN_DAYS / 365, [0, 2]))
+    np.testing.assert_allclose(failures[0], np.add.reduceat(rates, [0, 2]))
+
+@pytest.mark.parametrize('col, value', [('Slope low', 0), ('Slope high', 0), ('Pressure high', 40),
+                                        ('Intercept low', np.nan)])
+def test_invalidEquationsAreRejected(pipes, col, value):
+    equations = EQUATIONS.copy()
+    equations.loc[WC.PVC, col] = value
+
+    with pytest.raises(ValueError, match=WC.PVC):
+        PM.buildNetwork(pipes, equations, **CRACK)
+
+def test_denominatorChangingSignIsRejected(pipes):
+    #1/slope goes from 100 at 40 m to -100 at 80 m, so it is zero at 60 m
+    equations = EQUATIONS.copy()
+    equations.loc[WC.AC, 'Slope high'] = -0.010
+
+    with pytest.raises(ValueError, match=WC.AC):
+        PM.buildNetwork(pipes, equations, **CRACK)
+    #under 60 m the denominator keeps its sign
+    PM.checkEquations(equations, (0, 50))
+    network = PM.buildNetwork(pipes, equations, pressureRange=(0, 50), **CRACK)
+    assert np.isfinite(PM.getBurstRates(network, np.full(3, 90))).all()
+
+def test_ratesAreFiniteInTheRange(pipes):
+    #the default range goes up to the maximum pressure of the pipes, higher pressures are taken at it
+    network = PM.buildNetwork(pipes, EQUATIONS, **CRACK)
+    assert network.pressureRange == (0, 90)
+    deltas = np.linspace(-100, 200, 61)[:, None].repeat(2, axis=1)
+
+    failures, leakage = PM.evaluateScenarios(network, deltas)
+    assert np.isfinite(failures).all() and np.isfinite(leakage).all()
+    np.testing.assert_allclose(PM.getBurstRates(network, np.full(3, 200)), PM.getBurstRates(network, np.full(3, 90)))
+
+def test_unusedEquationsAreNotChecked(pipes):
+    equations = EQUATIONS.copy()
+    equations.loc[WC.CI] = [0, 0, 40, 0, 0, 80]
+
+    PM.buildNetwork(pipes, equations, **CRACK)
+
+def test_sameRatesAsTheContourLines():
+    kmPerPipe, hMin, hMax = 40, 20, 100
+    for mat, eq in EQUATIONS.iterrows():
+        sL, bL, hL, sH, bH, hH = eq[PM.EQUATION_COLS].to_numpy(dtype='float64')
+        rates = np.arange(1, 80) / kmPerPipe
+
+        #points of the contour lines of failure rate i/kmPerPipe, as getFailureRateCountourLines of the notebook
+        ageL, ageH = (rates - bL) / sL, (rates - bH) / sH
+        m = (hH - hL) / (ageH - ageL)
+        b = hL - m * ageL
+        ages = np.concatenate([ageL, ageH, (hMin - b) / m, (hMax - b) / m])
+        pressures = np.repeat([hL, hH, hMin, hMax], rates.size).astype('float64')
+
+        n = ages.size
+        network = PM.PressureNetwork([mat], np.array([0]), np.arange(n), np.ones(n), ages, pressures, np.full(n, hL),
+                                     np.full(n, hH), np.full(n, bL/sL), np.full(n, bH/sH), np.full(n, 1/sL),
+                                     np.full(n, 1/sH), 0, 0, np.zeros(n), PM.LEAK_RUN_DAYS, (hMin, hMax))
+        np.testing.assert_allclose(PM.getBurstRates(network, pressures), np.tile(rates, 4), rtol=1e-9)
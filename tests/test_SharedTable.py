@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import SharedTable as ST
+
+
+@pytest.fixture
+def table():
+    """
+        Table with numeric, categorical, text, datetime and nullable columns.
+    """
+    rng = np.random.default_rng(0)
+    n = 1000
+    return pd.DataFrame({'length': rng.uniform(0, 1, n), 'failures': rng.poisson(1, n),
+                         'material': pd.Categorical(rng.choice(['AC', 'PVC', 'PE'], n)),
+                         'zone': rng.choice(['Z1', 'Z2'], n).astype('object'),
+                         'installed': pd.Timestamp('1950-01-01') + pd.to_timedelta(rng.integers(0, 20000, n), 'D'),
+                         'pressure': pd.array(np.where(rng.uniform(size=n) < 0.1, None, rng.integers(20, 100, n)),
+                                              dtype='Int64')},
+                        index=pd.Index(rng.permutation(n) + 10, name='COMPKEY'))
+
+def test_attachedTableIsTheSame(table):
+    with ST.sharedTable(table) as shared:
+        attached = ST.attachTable(shared)
+
+        #text columns are categorical and nullable ones float64 with NaN
+        expected = table.copy()
+        for col in expected.columns:
+            if shared.columns[col]['kind'] == 'categorical' and not isinstance(expected[col].dtype, pd.CategoricalDtype):
+                expected[col] = expected[col].astype('category')
+            elif shared.columns[col]['kind'] == 'numeric' and not isinstance(expected[col].dtype, np.dtype):
+                expected[col] = expected[col].astype('float64')
+        pd.testing.assert_frame_equal(attached, expected, check_categorical=False)
+
+        #the columns are views of the shared buffer
+        arrays = ST.getArrays(shared)
+        for c in attached.columns:
+            kind = shared.columns[c]['kind']
+            values = attached[c].array.codes if kind == 'categorical' else \
+                attached[c].array._ndarray if kind == 'datetime' else attached[c].to_numpy()
+            assert np.shares_memory(np.asarray(values), arrays[c])
+
+def test_workersReadTheWholeTable(table):
+    with ST.sharedTable(table) as shared:
+        results = ST.mapChunks(ST.getChunkMemory, shared, chunks=2, workers=2)
+
+    assert len(results) == 2
+    assert sum(r[0] for r in results) == pytest.approx(ST.getChunkMemory(table.select_dtypes('number'))[0])
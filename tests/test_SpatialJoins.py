@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+import WatercareConstants as WC
+import SpatialJoins as SJ
+import SyntheticData as SD
+
+
+#Network of 4 pipes (COMPKEY 3 has two features) over 3 square geounits of 100 m (the third without rock) and 5 nodes
+PIPES = pd.DataFrame({WC.COMPKEY: [1, 2, 3, 3, 4],
+                      SJ.WKT: ['LINESTRING (10 10, 90 10)', 'LINESTRING (80 50, 180 50)', 'LINESTRING (150 90, 190 90)',
+                               'LINESTRING (195 20, 260 20)', 'LINESTRING (400 400, 450 400)']})
+GEOUNITS = pd.DataFrame({SJ.MAIN_ROCK: ['Sandstone', 'Basalt', ' '],
+                         SJ.WKT: ['POLYGON ((0 0, 100 0, 100 100, 0 100, 0 0))',
+                                  'POLYGON ((100 0, 200 0, 200 100, 100 100, 100 0))',
+                                  'POLYGON ((200 0, 300 0, 300 100, 200 100, 200 0))']})
+NODES = pd.DataFrame({'X': [50, 130, 170, 300, 425], 'Y': [0, 60, 95, 20, 410],
+                      'MOD_MAXPRE': [60, 70, 80, 90, 50], 'MOD_MINPRE': [40, 50, 55, 60, 30],
+                      'Press_fluc': [20, 20, 25, 30, 20], SJ.MODEL_NAME: ['A', 'A', 'C', 'B', 'A']})
+
+#Nearest node of each feature and its distance, and length of each feature inside each geounit
+NEAREST = [(0, 0, 10.0), (1, 1, 10.0), (2, 2, 5.0), (3, 3, 40.0), (4, 4, 10.0)]
+INTERSECTIONS = pd.DataFrame({'FID_Water_': [0, 1, 1, 2, 3, 3], 'FID_250KGe': [0, 0, 1, 1, 1, 2],
+                              WC.LENG: [80.0, 20.0, 80.0, 40.0, 5.0, 60.0]})
+
+
+@pytest.fixture
+def network(tmp_path):
+    """
+        Geometry files of the network and the GIS joins that match them, in the layout of the Watercare files.
+    """
+    files = {'pipes': tmp_path / 'pipes.csv', 'geounits': tmp_path / 'geounits.csv', 'nodes': tmp_path / 'nodes.csv',
+             'pressureJoin': tmp_path / 'pressureJoin.csv', 'geounitsTable': tmp_path / 'Geounits.csv',
+             'pipesIDs': tmp_path / 'pipesIDs.csv', 'intersections': tmp_path / 'intersections.csv'}
+    PIPES.to_csv(files['pipes'], index=False)
+    GEOUNITS.to_csv(files['geounits'], index=False)
+    NODES.to_csv(files['nodes'], index=False)
+
+    features, nodes, distances = map(list, zip(*NEAREST))
+    join = pd.DataFrame('', index=range(len(NEAREST)), columns=SD.PRESSURE_COLUMNS)
+    join[WC.COMPKEY] = PIPES[WC.COMPKEY].to_numpy()[features]
+    for col in SJ.PRESSURE_COLS + [SJ.MODEL_NAME]:
+        join[col] = NODES[col].to_numpy()[nodes]
+    join[SJ.DISTANCE] = distances
+    join.to_csv(files['pressureJoin'], index=False)
+
+    pd.DataFrame({'FID': range(3), SJ.MAIN_ROCK: GEOUNITS[SJ.MAIN_ROCK]}).to_csv(files['geounitsTable'], index=False)
+    PIPES[[WC.COMPKEY]].to_csv(files['pipesIDs'], index=False)
+    INTERSECTIONS.rename_axis('FID').reset_index().to_csv(files['intersections'], index=False)
+
+    return {k: str(v) for k, v in files.items()}
+
+def test_nearestPressures(network):
+    pressures = SJ.getNearestPressures(SJ.readPipeGeometries(network['pipes']), SJ.readPressureNodes(network['nodes']))
+
+    expected = pd.DataFrame({'MOD_MAXPRE': [60.0, 70.0, 85.0, 50.0], 'MOD_MINPRE': [40.0, 50.0, 57.5, 30.0],
+                             'Press_fluc': [20.0, 20.0, 27.5, 20.0], SJ.DISTANCE: [10.0, 10.0, 22.5, 10.0],
+                             SJ.MODEL_NAME: ['A', 'A', 'C', 'A']}, index=pd.Index([1, 2, 3, 4], name=WC.COMPKEY))
+    pd.testing.assert_frame_equal(pressures, expected, check_dtype=False)
+
+    GISPressures = SJ.readPressureJoin(network['pressureJoin'])
+    pd.testing.assert_frame_equal(pressures[GISPressures.columns], GISPressures, check_dtype=False)
+
+def test_geounitIntersections(network):
+    pipes = SJ.readPipeGeometries(network['pipes'])
+    geounits = SJ.readGeounitPolygons(network['geounits'])
+
+    intersections = SJ.getGeounitIntersections(pipes, geounits)
+    intersections = intersections.sort_values(['FID_Water_', 'FID_250KGe']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(intersections, INTERSECTIONS, check_dtype=False)
+
+    rocks = SJ.getGeounits(pipes, geounits)
+    expected = pd.DataFrame({SJ.MAIN_ROCK: ['Sandstone', 'Basalt', np.nan, np.nan]},
+                            index=pd.Index([1, 2, 3, 4], name=WC.COMPKEY))
+    pd.testing.assert_frame_equal(rocks, expected, check_dtype=False)
+
+    GISGeounits = SJ.readGeounitsJoin(network['geounitsTable'], network['pipesIDs'], network['intersections'])
+    pd.testing.assert_frame_equal(rocks, GISGeounits, check_dtype=False)
+
+def test_compareWithGISJoins(network):
+    pipes = SJ.readPipeGeometries(network['pipes'])
+    pressures = SJ.getNearestPressures(pipes, SJ.readPressureNodes(network['nodes']))
+    rocks = SJ.getGeounits(pipes, SJ.readGeounitPolygons(network['geounits']))
+    GISPressures = SJ.readPressureJoin(network['pressureJoin'])
+    GISGeounits = SJ.readGeounitsJoin(network['geounitsTable'], network['pipesIDs'], network['intersections'])
+
+    assert SJ.compareWithGISJoins(pressures, rocks, GISPressures, GISGeounits)
+
+    #a moved node changes the nearest pressures of the pipe 1
+    nodes = SJ.readPressureNodes(network['nodes'])
+    nodes['geometry'] = shapely.points(nodes['X'] + np.where(nodes.index == 0, 500, 0), nodes['Y'])
+    assert not SJ.compareWithGISJoins(SJ.getNearestPressures(pipes, nodes), rocks, GISPressures, GISGeounits)
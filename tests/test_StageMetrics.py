@@ -0,0 +1,39 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import StageMetrics as SM
+
+
+def runStage(name:str, rows:int, barrier:threading.Barrier):
+    with SM.stage(name):
+        SM.logRows(rows, '{rows}')
+        with SM.stage(name + ' child'):
+            #both threads are inside their stages at the same time
+            barrier.wait()
+            SM.logRows(rows - 1, '{rows}', 1, 'child')
+        SM.logRows(rows - 2, '{rows}', 1, 'parent')
+
+def test_stagesOfConcurrentThreads():
+    barrier = threading.Barrier(2)
+    with SM.collect(verbose=False) as records:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(lambda args: runStage(*args, barrier), [('a', 100), ('b', 10)]))
+
+    byStage = {r['Stage']: r for r in records}
+    assert set(byStage) == {'a', 'a child', 'b', 'b child'}
+    for name, rows in [('a', 100), ('b', 10)]:
+        assert byStage[name]['Parent'] is None
+        assert byStage[name + ' child']['Parent'] == name
+        assert (byStage[name]['Rows in'], byStage[name]['Rows out']) == (rows, rows - 2)
+        assert (byStage[name + ' child']['Rows in'], byStage[name + ' child']['Rows out']) == (rows, rows - 1)
+        assert byStage[name]['Concurrent'] and byStage[name + ' child']['Concurrent']
+
+def test_stagesOfOneThreadAreNotConcurrent():
+    with SM.collect(verbose=False) as records:
+        with SM.stage('parent'):
+            with SM.stage('child'):
+                SM.logRows(5, '{rows}')
+
+    assert [r['Stage'] for r in records] == ['child', 'parent']
+    assert not any(r['Concurrent'] for r in records)
+    assert records[0]['Parent'] == 'parent'
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import crackGrowthCalculations as cc
+import SyntheticData as SD
+
+
+#Fixed set of cracks (most of them reach detection in MAX_YEARS, the rest are censored by both methods)
+N_CRACKS = 200
+MAX_YEARS = 30
+
+
+def getLagDays(inputs:dict)->np.ndarray:
+    return cc.getEulerLagDays(inputs['Mparis'], inputs['Wthickness'], inputs['Dint'], inputs['iniCrackLength'])
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+@pytest.mark.parametrize('stopFlow', [cc.DETECTABLE_FLOW_M3S, np.inf])
+def test_eulerAndAnalyticAgree(seed, stopFlow):
+    inputs = SD.getCrackInputs(N_CRACKS, seed)
+
+    with np.errstate(all='ignore'):
+        agree, euler, analytic = cc.compareIntegrationMethods(**inputs, stopFlow=stopFlow, maxDays=MAX_YEARS*365)
+    assert agree
+
+    #the set has detected and censored cracks, and with an infinite stop flow the cracks grow until critical
+    detected = np.isfinite(analytic.daysToDetection)
+    assert 0.5 < detected.mean() < 1
+    np.testing.assert_array_equal(np.isnan(euler.daysToDetection), ~detected)
+    np.testing.assert_array_equal(euler.critical, analytic.critical)
+    assert analytic.critical.any() == np.isinf(stopFlow)
+
+    #the euler steps lag behind the exact times, by less than the bound without the relative tolerance
+    lag = getLagDays(inputs)
+    for e, a in ((euler.daysToDetection, analytic.daysToDetection), (euler.daysToCritical, analytic.daysToCritical)):
+        finite = np.isfinite(a)
+        assert np.all(e[finite] - a[finite] >= -1)
+        assert np.all(e[finite] - a[finite] <= lag[finite])
+
+def test_positionalArgumentsUseTheLagBound():
+    inputs = SD.getCrackInputs(N_CRACKS, 0)
+
+    with np.errstate(all='ignore'):
+        agree, _, _ = cc.compareIntegrationMethods(*inputs.values(), maxDays=MAX_YEARS*365)
+    assert agree
+
+def test_toleranceCatchesWrongTimes():
+    inputs = SD.getCrackInputs(N_CRACKS, 0)
+    faster = dict(inputs, Cparis=np.where(np.arange(N_CRACKS) < 10, 2, 1) * inputs['Cparis'])
+
+    with np.errstate(all='ignore'):
+        euler = cc.createCurvesUntilDetectableBatch(**faster, maxDays=MAX_YEARS*365, method='euler')
+        analytic = cc.createCurvesUntilDetectableBatch(**inputs, maxDays=MAX_YEARS*365, method='analytic')
+
+    #only the cracks that grow twice as fast are out of the default tolerances
+    e, a = euler.daysToDetection, analytic.daysToDetection
+    differ = (np.isnan(e) != np.isnan(a)) | (np.abs(e - a) > getLagDays(inputs) + 0.01*a)
+    assert differ[:10].any() and not differ[10:].any()
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+import crackGrowthSensitivity as cs
+
+
+N_SAMPLES = 200
+
+
+@pytest.fixture(scope='module')
+def samples():
+    return cs.createSamples(cs.getSensitivityRanges(), N_SAMPLES, seed=1)
+
+def getChunkTimes(outDir:str)->dict:
+    return {f: os.stat(os.path.join(outDir, f)).st_mtime_ns for f in os.listdir(outDir) if f.startswith('chunk_')}
+
+def test_resumeReusesTheChunks(samples, tmp_path):
+    results = cs.runSamples(samples, str(tmp_path), chunkSize=64, workers=1)
+    times = getChunkTimes(str(tmp_path))
+    #the same settings do not evaluate the chunks again
+
+    np.testing.assert_array_equal(cs.runSamples(samples, str(tmp_path), chunkSize=64, workers=1), results)
+    assert getChunkTimes(str(tmp_path)) == times
+    np.testing.assert_allclose(results, cs.evaluateCrackModel(samples), rtol=1e-12)
+
+@pytest.mark.parametrize('chunkSize', [40, 128])
+def test_otherChunkSizeClearsTheChunks(samples, tmp_path, chunkSize):
+    cs.runSamples(samples, str(tmp_path), chunkSize=64, workers=1)
+    results = cs.runSamples(samples, str(tmp_path), chunkSize=chunkSize, workers=1)
+
+    assert len(getChunkTimes(str(tmp_path))) == -(-N_SAMPLES // chunkSize)
+    np.testing.assert_allclose(results, cs.evaluateCrackModel(samples), rtol=1e-12)
+
+def test_otherMaxDaysClearsTheChunks(samples, tmp_path):
+    cs.runSamples(samples, str(tmp_path), chunkSize=64, workers=1)
+    results = cs.runSamples(samples, str(tmp_path), chunkSize=64, workers=1, maxDays=365)
+
+    assert results.max() <= 365
+    np.testing.assert_allclose(results, cs.evaluateCrackModel(samples, 365), rtol=1e-12)
+
+def test_runWithoutSettingsIsCleared(samples, tmp_path):
+    cs.runSamples(samples, str(tmp_path), chunkSize=64, workers=1)
+    os.remove(os.path.join(str(tmp_path), cs.SETTINGS_FILE))
+    np.save(os.path.join(str(tmp_path), cs.CHUNK_FILE.format(0)), np.zeros((64, 2)))
+
+    np.testing.assert_allclose(cs.runSamples(samples, str(tmp_path), chunkSize=64, workers=1),
+                               cs.evaluateCrackModel(samples), rtol=1e-12)
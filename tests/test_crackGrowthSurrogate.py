@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import crackGrowthSensitivity as cs
+import crackGrowthSurrogate as CGS
+
+
+#Small grid inside the ranges of AXES
+AXES = {'Dint': np.array([0.05, 0.15, 0.45]), 'thickness': np.array([0.004, 0.011]), 'PMax': np.array([40, 100]),
+        'deltaP': np.array([3, 15, 35]), 'N': np.array([1, 5]), 'age': np.array([0, 20, 60])}
+STRENGTH = 'Strength index (m)'
+
+
+@pytest.fixture
+def surrogate(inSynthetic):
+    return CGS.buildSurrogate(axes=AXES)
+
+def test_surrogateIsNotDegenerate(surrogate):
+    assert surrogate.daysToDetection.shape == (4, 3, 2, 2, 3, 2)
+    assert surrogate.strengthIndex.shape == (4, 3, 2, 2, 3, 2, 3)
+    for i in range(len(surrogate.materials)):
+        assert np.unique(surrogate.daysToDetection[i]).size > 1
+        assert np.isfinite(surrogate.strengthIndex[i]).any()
+
+def test_typicalCrackIsRejected(inSynthetic):
+    typical = cs.getSensitivityRanges()['Typical']
+    crackParams = {'widthC': typical['widthC'], 'Cd': typical['Cd'], 'cLenght': typical['cLenght'], 'nonLeakingL': 0}
+
+    with pytest.raises(ValueError, match='Constant days to detection'):
+        CGS.buildSurrogate(axes=AXES, crackParams=crackParams)
+
+def test_surrogateError(surrogate):
+    errors = CGS.getSurrogateError(surrogate, n=200)
+
+    assert list(errors.index.get_level_values(0).unique()) == surrogate.materials
+    assert errors.shape == (2*len(surrogate.materials), 3)
+    assert np.isfinite(errors.loc[(slice(None), cs.DAYS_DETECTION), :].to_numpy()).all()
+    #the outputs without finite pairs are NaN (the strength index of this coarse grid)
+    finite = errors.dropna()
+    assert (finite['Median'] <= finite['P95']).all() and (finite['P95'] <= finite['Max']).all()
+
+def test_surrogateErrorWithoutFinitePairs(surrogate):
+    noStrength = surrogate._replace(strengthIndex=np.full_like(surrogate.strengthIndex, np.nan))
+
+    errors = CGS.getSurrogateError(noStrength, n=50)
+
+    assert errors.loc[(slice(None), STRENGTH), :].isna().all(axis=None)
+    assert errors.loc[(slice(None), cs.DAYS_DETECTION), :].notna().all(axis=None)